@@ -0,0 +1,162 @@
+import numpy as np
+import bitboard
+
+# Batched Quixo environment: N games are stored in a single NumPy array of bitboards (one row per game, one column per
+# player, see bitboard.py) and are played in lockstep, one move for every game at each step.
+# Legality checks, take/slide and winner detection are vectorized over the whole batch using the same precomputed tables
+# of the 44 legal moves and 12 winning lines used by Game, so thousands of games cost a few NumPy operations per step.
+# Finished games are automatically reset, so a batch of fixed size can keep playing until enough games are completed;
+# with max_games the batch stops starting new games once that many have been started, so no extra game is played.
+# Moves are given as indices in the move table of bitboard.py (movegen.BORDER_MOVES[i] is the corresponding ((x, y), Move)).
+
+NUM_MOVES = len(bitboard.MOVES)
+
+_FROM = np.array(bitboard.FROM_MASKS, dtype=np.int64)
+_KEEP = np.array([bitboard.FULL_MASK ^ span for span in bitboard.SPAN_MASKS], dtype=np.int64)
+_SEGMENT = np.array(bitboard.SEGMENT_MASKS, dtype=np.int64)
+_DEST = np.array(bitboard.DEST_MASKS, dtype=np.int64)
+# every move shifts its segment in a single direction, so one of the two shifts is always 0
+_SHIFT_LEFT = np.array([max(shift, 0) for shift in bitboard.SHIFTS], dtype=np.int64)
+_SHIFT_RIGHT = np.array([max(-shift, 0) for shift in bitboard.SHIFTS], dtype=np.int64)
+_LINES = np.array(bitboard.LINE_MASKS, dtype=np.int64)
+_CELL_SHIFTS = np.arange(bitboard.BOARD_SIZE * bitboard.BOARD_SIZE, dtype=np.int64)
+
+
+class BatchGame(object):
+    def __init__(self, num_games, auto_reset=True, max_moves=None, max_games=None) -> None:
+        '''
+        num_games: number of games played in lockstep
+        auto_reset: finished games are immediately replaced by new ones
+        max_moves: games longer than this are stopped and counted as draws (None means no limit)
+        max_games: with auto_reset, total number of games to start (None means no limit)
+        '''
+        self.num_games = num_games
+        self.auto_reset = auto_reset
+        self.max_moves = max_moves
+        self.max_games = max_games
+        self.boards = np.zeros((num_games, 2), dtype=np.int64)
+        # as in Game.play, player 0 makes the first move
+        self.current_player = np.zeros(num_games, dtype=np.int64)
+        self.moves_played = np.zeros(num_games, dtype=np.int64)
+        self.done = np.zeros(num_games, dtype=bool)
+        self.winners = np.full(num_games, -1, dtype=np.int64)
+        # statistics of the completed games
+        self.games_started = num_games
+        self.games_completed = 0
+        self.wins = np.zeros(2, dtype=np.int64)
+        self.draws = 0
+        self.total_moves = 0
+
+    def reset(self, mask=None) -> None:
+        '''Resets the games selected by the boolean mask (all of them by default)'''
+        if mask is None:
+            mask = np.ones(self.num_games, dtype=bool)
+        self.boards[mask] = 0
+        self.current_player[mask] = 0
+        self.moves_played[mask] = 0
+        self.done[mask] = False
+        self.winners[mask] = -1
+
+    def legal_moves(self) -> np.ndarray:
+        '''Returns a (num_games, 44) boolean mask of the legal moves of the current player of every game'''
+        opponent = self.boards[np.arange(self.num_games), 1 - self.current_player]
+        return (opponent[:, None] & _FROM[None, :]) == 0
+
+    def step(self, moves: np.ndarray) -> np.ndarray:
+        '''
+        Plays one move (index in the move table) for the current player of every game that is not finished.
+        Returns a boolean array telling which moves were acceptable: as in Game.play, a game in which the move was
+        not acceptable is left unchanged and its player has to move again.
+        '''
+        moves = np.asarray(moves, dtype=np.int64)
+        games = np.arange(self.num_games)
+        players = self.current_player
+        opponent = self.boards[games, 1 - players]
+        ok = ((moves >= 0) & (moves < NUM_MOVES)) & ~self.done
+        moves = np.where(ok, moves, 0)
+        ok &= (opponent & _FROM[moves]) == 0
+
+        # take and slide, for both the players' bitboards at the same time
+        segment = (self.boards & _SEGMENT[moves][:, None])
+        shifted = (segment << _SHIFT_LEFT[moves][:, None]) >> _SHIFT_RIGHT[moves][:, None]
+        new_boards = (self.boards & _KEEP[moves][:, None]) | shifted
+        new_boards[games, players] |= _DEST[moves]
+        self.boards = np.where(ok[:, None], new_boards, self.boards)
+
+        self.moves_played += ok
+        self.total_moves += int(ok.sum())
+        winners = self.check_winners()
+        finished = ok & (winners >= 0)
+        if self.max_moves is not None:
+            finished |= ok & (self.moves_played >= self.max_moves)
+        self.winners = np.where(finished, winners, self.winners)
+        self.done |= finished
+        # the turn passes to the other player only after an acceptable move
+        self.current_player = np.where(ok & ~finished, 1 - players, players)
+
+        if finished.any():
+            self.games_completed += int(finished.sum())
+            finished_winners = self.winners[finished]
+            self.wins += np.bincount(finished_winners[finished_winners >= 0], minlength=2)
+            self.draws += int((finished_winners < 0).sum())
+            if self.auto_reset:
+                if self.max_games is not None:
+                    # only the first finished games are replaced, up to the number of games still to start
+                    restart = max(0, min(int(finished.sum()), self.max_games - self.games_started))
+                    finished &= np.cumsum(finished) <= restart
+                self.games_started += int(finished.sum())
+                self.reset(finished)
+        return ok
+
+    def check_winners(self) -> np.ndarray:
+        '''Returns the winner of every game (-1 if none), with the same scanning order of Game.check_winner'''
+        full = (self.boards[:, :, None] & _LINES[None, None, :]) == _LINES[None, None, :]
+        completed = full.any(axis=1)
+        first_line = completed.argmax(axis=1)
+        games = np.arange(self.num_games)
+        return np.where(completed[games, first_line], np.where(full[games, 0, first_line], 0, 1), -1)
+
+    def get_boards(self) -> np.ndarray:
+        '''Returns the (num_games, 5, 5) NumPy boards (-1 neutral, 0 and 1 pieces of the players)'''
+        bits0 = (self.boards[:, 0:1] >> _CELL_SHIFTS) & 1
+        bits1 = (self.boards[:, 1:2] >> _CELL_SHIFTS) & 1
+        return (bits0 + 2 * bits1 - 1).astype(np.int16).reshape(self.num_games, bitboard.BOARD_SIZE, bitboard.BOARD_SIZE)
+
+
+def random_moves(legal: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    '''Chooses a uniformly random legal move for every game'''
+    return np.argmax(rng.random(legal.shape) * legal, axis=1)
+
+
+def table_moves(legal: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    '''
+    Chooses for every game the legal move with the highest weight.
+    weights has one weight for each of the 44 moves, either shared (44,) or one row per game (num_games, 44)
+    '''
+    return np.argmax(np.where(legal, weights, -np.inf), axis=1)
+
+
+def play(policy0, policy1, num_games, batch_size=4096, max_moves=1000, seed=None) -> dict:
+    '''
+    Plays num_games games between two policies and returns the statistics of the results.
+    A policy is a function (legal moves mask, batch, rng) -> move indices, or None for a random player.
+    '''
+    rng = np.random.default_rng(seed)
+    batch = BatchGame(min(batch_size, num_games), auto_reset=True, max_moves=max_moves, max_games=num_games)
+    policies = [policy0, policy1]
+    while batch.games_completed < num_games:
+        legal = batch.legal_moves()
+        moves = random_moves(legal, rng)
+        for player, policy in enumerate(policies):
+            if policy is not None:
+                players_games = batch.current_player == player
+                if players_games.any():
+                    moves = np.where(players_games, policy(legal, batch, rng), moves)
+        batch.step(moves)
+    return {
+        "games": batch.games_completed,
+        "wins_player1": int(batch.wins[0]),
+        "wins_player2": int(batch.wins[1]),
+        "draws": batch.draws,
+        "moves": batch.total_moves,
+    }
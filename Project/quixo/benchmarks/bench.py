@@ -0,0 +1,224 @@
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+import numpy as np
+import movegen
+from game import Game
+from observers import GameTooLong, PlyLimitObserver
+from simulatedgame import SimulatedGame
+from players.randomPlayer import RandomPlayer
+from players.minMaxPlayer import MinMaxPlayer
+from players.optimalPlayer import OptimalPlayer
+from players.geneticPlayer import GeneticPlayer
+from players.reinforcedPlayer import ReinforcedPlayer
+
+"""
+Performance benchmarks of the Quixo engine and players.
+Run from Project/quixo with:    python -m benchmarks.bench [--quick] [--output results.json] [--only NAME ...]
+Every benchmark is seeded and the results are emitted as JSON (to stdout or to --output), together with the git revision
+and the versions of Python and NumPy, so that two revisions can be compared by diffing or loading the two files.
+Benchmarks on positions use the same set of mid-game positions, obtained by playing random moves from the empty board.
+The training of GeneticPlayer and ReinforcedPlayer is not measured: they play with an untrained genotype/Q-table.
+"""
+
+
+def _measure(function, min_time):
+    # calls function until min_time seconds have passed, returns (calls, seconds)
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        function()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return calls, elapsed
+
+
+def _positions(count, seed, min_plies=4, max_plies=16):
+    # random mid-game positions (bitboards, player to move) without a winner
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        simgame = SimulatedGame.from_bitboards((0, 0), 0)
+        player_id = 0
+        for _ in range(rng.randint(min_plies, max_plies)):
+            from_pos, slide = rng.choice(movegen.get_possible_moves(simgame, player_id))
+            simgame.move(from_pos, slide, player_id)
+            if simgame.check_winner() != -1:
+                break
+            player_id = 1 - player_id
+        if simgame.check_winner() == -1:
+            positions.append((simgame.get_bitboards(), player_id))
+    return positions
+
+
+def _game_at(position):
+    game = Game()
+    game._bitboards, game.current_player_idx = position
+    return game
+
+
+def _result(name, value, unit, calls, seconds, **extra):
+    result = {"name": name, "value": value, "unit": unit, "calls": calls, "seconds": round(seconds, 6)}
+    result.update(extra)
+    return result
+
+
+def bench_movegen(positions, min_time):
+    games = [SimulatedGame.from_bitboards(*position) for position in positions]
+    calls, seconds = _measure(lambda: [movegen.get_possible_moves(simgame) for simgame in games], min_time)
+    calls *= len(games)
+    return [_result("movegen.get_possible_moves", calls / seconds, "calls/s", calls, seconds)]
+
+
+def bench_check_winner(positions, min_time):
+    games = [SimulatedGame.from_bitboards(*position) for position in positions]
+    calls, seconds = _measure(lambda: [simgame.check_winner() for simgame in games], min_time)
+    calls *= len(games)
+    return [_result("SimulatedGame.check_winner", calls / seconds, "calls/s", calls, seconds)]
+
+
+def bench_simulated_move(positions, min_time):
+    games = [SimulatedGame.from_bitboards(*position) for position in positions]
+    moves = [movegen.get_possible_moves(simgame) for simgame in games]
+
+    def run():
+        for simgame, possible_moves in zip(games, moves):
+            state = simgame.snapshot()
+            for from_pos, slide in possible_moves:
+                simgame.move(from_pos, slide, simgame.current_player_idx)
+                simgame.undo_move(state)
+
+    calls, seconds = _measure(run, min_time)
+    calls *= sum(len(possible_moves) for possible_moves in moves)
+    return [_result("SimulatedGame.move", calls / seconds, "moves/s", calls, seconds)]
+
+
+def bench_minmax(positions, min_time, depths):
+    results = []
+    for depth in depths:
+        nodes, calls, seconds = 0, 0, 0.0
+        # every position is searched by a new player, so that the transposition table starts empty
+        for position in positions:
+            player = MinMaxPlayer(depth=depth, opening_book=None)
+            start = time.perf_counter()
+            player.make_move(_game_at(position))
+            seconds += time.perf_counter() - start
+            nodes += player.last_search["nodes"]
+            calls += 1
+            if seconds >= min_time * depth:
+                break
+        results.append(_result(f"MinMaxPlayer.nodes_per_second[depth={depth}]", nodes / seconds, "nodes/s", calls, seconds,
+                               nodes=nodes, ms_per_move=1000 * seconds / calls))
+    return results
+
+
+def bench_optimal(positions, min_time):
+    player = OptimalPlayer(opening_book=None)
+    games = [_game_at(position) for position in positions]
+    calls, seconds = _measure(lambda: [player.make_move(game) for game in games], min_time)
+    calls *= len(games)
+    return [_result("OptimalPlayer.make_move", 1000 * seconds / calls, "ms/move", calls, seconds)]
+
+
+PLAYERS = {
+    "random": lambda: RandomPlayer(),
+    "minmax": lambda: MinMaxPlayer(depth=2, opening_book=None),
+    "optimal": lambda: OptimalPlayer(opening_book=None),
+    "genetic": lambda: GeneticPlayer(training=False),
+    "reinforcement": lambda: ReinforcedPlayer(trained=True),
+}
+
+
+def bench_games(games_per_pairing, seed, max_plies=500):
+    results = []
+    for name1, factory1 in PLAYERS.items():
+        for name2, factory2 in PLAYERS.items():
+            random.seed(seed)
+            np.random.seed(seed)
+            player1, player2 = factory1(), factory2()
+            plies, draws, seconds = 0, 0, 0.0
+            for _ in range(games_per_pairing):
+                limit = PlyLimitObserver(max_plies)
+                start = time.perf_counter()
+                try:
+                    Game([limit]).play(player1, player2)
+                except GameTooLong:
+                    # two deterministic players can repeat the same positions forever
+                    draws += 1
+                seconds += time.perf_counter() - start
+                plies += limit.plies
+            results.append(_result(f"games_per_second[{name1} vs {name2}]", games_per_pairing / seconds, "games/s",
+                                   games_per_pairing, seconds, plies=plies, draws=draws))
+    return results
+
+
+BENCHMARKS = ("movegen", "check_winner", "simulated_move", "minmax", "optimal", "games")
+
+
+def run(only=None, quick=False, seed=0):
+    '''Runs the selected benchmarks (all by default) and returns the report as a dict'''
+    random.seed(seed)
+    np.random.seed(seed)
+    min_time = 0.2 if quick else 1.0
+    positions = _positions(20 if quick else 50, seed)
+    selected = BENCHMARKS if not only else only
+    results = []
+    for name in selected:
+        if name == "movegen":
+            results += bench_movegen(positions, min_time)
+        elif name == "check_winner":
+            results += bench_check_winner(positions, min_time)
+        elif name == "simulated_move":
+            results += bench_simulated_move(positions, min_time)
+        elif name == "minmax":
+            results += bench_minmax(positions, min_time, (1, 2, 3) if quick else (1, 2, 3, 4))
+        elif name == "optimal":
+            results += bench_optimal(positions, min_time)
+        elif name == "games":
+            results += bench_games(1 if quick else 3, seed)
+        else:
+            raise ValueError(f"Unknown benchmark: {name}")
+    return {
+        "revision": _git_revision(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "seed": seed,
+        "quick": quick,
+        "results": results,
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quixo engine and players benchmarks")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, help="benchmarks to run (all by default)")
+    parser.add_argument("--quick", action="store_true", help="shorter runs, for a quick check")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file in which the JSON report is written (stdout by default)")
+    args = parser.parse_args(argv)
+    report = run(args.only, args.quick, args.seed)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        for result in report["results"]:
+            print(f"{result['name']:<55} {result['value']:>14.2f} {result['unit']}", file=sys.stderr)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+import numpy as np
+
+# Bitboard representation of the Quixo board shared by Game and SimulatedGame.
+# Every player owns a 25 bit integer in which the bit (y * 5 + x) is set if the player has a piece in the cell (x, y),
+# where X goes from left to right and Y goes from top to bottom as in the rest of the project. A neutral cell has no bit set
+# in either of the two integers, so a whole position is just the tuple (bitboard of player 0, bitboard of player 1).
+# Since only 44 (position, direction) pairs are legal in Quixo, the effect of every one of them on the board is precomputed
+# once in a table of masks: a move is then reduced to a handful of bitwise operations instead of shifting cells one at a time.
+
+BOARD_SIZE = 5
+FULL_MASK = (1 << (BOARD_SIZE * BOARD_SIZE)) - 1
+
+# Directions as in the Move enum (TOP = 0, BOTTOM = 1, LEFT = 2, RIGHT = 3). game.py and simulatedgame.py define two
+# different Move enums, so the tables below are keyed by the value of the direction instead of the enum itself
+TOP, BOTTOM, LEFT, RIGHT = 0, 1, 2, 3
+
+
+def cell_mask(x, y):
+    '''Returns the bit associated to the cell (x, y)'''
+    return 1 << (y * BOARD_SIZE + x)
+
+
+def _line_mask(cells):
+    mask = 0
+    for x, y in cells:
+        mask |= cell_mask(x, y)
+    return mask
+
+
+# Winning lines in the same order in which Game.check_winner scans them: rows, columns, principal and secondary diagonal
+LINE_MASKS = tuple(
+    [_line_mask([(x, y) for x in range(BOARD_SIZE)]) for y in range(BOARD_SIZE)]
+    + [_line_mask([(x, y) for y in range(BOARD_SIZE)]) for x in range(BOARD_SIZE)]
+    + [_line_mask([(i, i) for i in range(BOARD_SIZE)])]
+    + [_line_mask([(BOARD_SIZE - 1 - i, i) for i in range(BOARD_SIZE)])]
+)
+
+_ROW_PATTERN_MASK = (1 << BOARD_SIZE) - 1
+
+BORDER_MASK = _line_mask([(x, y) for x in range(BOARD_SIZE) for y in range(BOARD_SIZE)
+                          if x in (0, BOARD_SIZE - 1) or y in (0, BOARD_SIZE - 1)])
+
+
+# Per-line piece counts of a player packed in a single int, with 4 bits for each of the 12 lines in the LINE_MASKS order
+# (a count is at most 5, so the fields never overflow and whole counters can be added and subtracted as plain ints).
+# The contribution of each row of the board is precomputed for every 5 bit pattern: the counters of a board are the sum of
+# 5 lookups, and after a move only the rows that changed have to be updated
+LINE_COUNT_BITS = 4
+_LINE_COUNT_FIELD = (1 << LINE_COUNT_BITS) - 1
+_LINE_FIELDS_3 = sum(3 << (LINE_COUNT_BITS * i) for i in range(len(LINE_MASKS)))
+_LINE_FIELDS_8 = sum(8 << (LINE_COUNT_BITS * i) for i in range(len(LINE_MASKS)))
+
+
+def _build_line_count_rows():
+    rows = []
+    for y in range(BOARD_SIZE):
+        row = []
+        for pattern in range(1 << BOARD_SIZE):
+            cells = pattern << (y * BOARD_SIZE)
+            row.append(sum((cells & line).bit_count() << (LINE_COUNT_BITS * i) for i, line in enumerate(LINE_MASKS)))
+        rows.append(tuple(row))
+    return tuple(rows)
+
+
+_LINE_COUNT_ROWS = _build_line_count_rows()
+
+
+def line_counts(board) -> int:
+    '''Returns the packed per-line counts of the pieces of a single player bitboard'''
+    counts = 0
+    for y in range(BOARD_SIZE):
+        counts += _LINE_COUNT_ROWS[y][(board >> (y * BOARD_SIZE)) & _ROW_PATTERN_MASK]
+    return counts
+
+
+def update_line_counts(counts, old_board, new_board) -> int:
+    '''Incrementally updates the packed per-line counts of a player bitboard, looking only at the rows that changed'''
+    changed = old_board ^ new_board
+    for y in range(BOARD_SIZE):
+        shift = y * BOARD_SIZE
+        if (changed >> shift) & _ROW_PATTERN_MASK:
+            counts += _LINE_COUNT_ROWS[y][(new_board >> shift) & _ROW_PATTERN_MASK] \
+                - _LINE_COUNT_ROWS[y][(old_board >> shift) & _ROW_PATTERN_MASK]
+    return counts
+
+
+def has_full_line(counts) -> bool:
+    '''Checks in a single operation if one of the packed counters is 5 (5 + 3 is the only count that reaches bit 3)'''
+    return bool((counts + _LINE_FIELDS_3) & _LINE_FIELDS_8)
+
+
+def unpack_line_counts(counts):
+    '''Unpacks the counters into (rows, columns, principal diagonal, secondary diagonal): rows and columns are lists of
+    BOARD_SIZE counts indexed by y and by x, the diagonals are single counts'''
+    values = [(counts >> (LINE_COUNT_BITS * i)) & _LINE_COUNT_FIELD for i in range(len(LINE_MASKS))]
+    return values[0:BOARD_SIZE], values[BOARD_SIZE:2 * BOARD_SIZE], values[2 * BOARD_SIZE], values[2 * BOARD_SIZE + 1]
+
+
+def _build_move_table():
+    # For each legal move we store:
+    # - from: the cell of the taken piece
+    # - span: every cell that changes value (from the taken piece up to the side on which it is inserted)
+    # - segment: the cells that are shifted by one position towards the taken piece
+    # - shift: how many bits the segment is shifted (positive to the left, negative to the right)
+    # - dest: the cell in which the taken piece is inserted
+    last = BOARD_SIZE - 1
+    moves, from_masks, span_masks, segment_masks, shifts, dest_masks = [], [], [], [], [], []
+    # same raster order used by the players to enumerate the moves (x, then y, then direction)
+    for x in range(BOARD_SIZE):
+        for y in range(BOARD_SIZE):
+            if x not in (0, last) and y not in (0, last):
+                continue
+            for direction in (TOP, BOTTOM, LEFT, RIGHT):
+                # a piece can be inserted on every side except the one it has been taken from
+                if (direction == TOP and y == 0) or (direction == BOTTOM and y == last) \
+                        or (direction == LEFT and x == 0) or (direction == RIGHT and x == last):
+                    continue
+                if direction == TOP:
+                    segment = _line_mask([(x, j) for j in range(0, y)])
+                    span = segment | cell_mask(x, y)
+                    shift, dest = BOARD_SIZE, cell_mask(x, 0)
+                elif direction == BOTTOM:
+                    segment = _line_mask([(x, j) for j in range(y + 1, BOARD_SIZE)])
+                    span = segment | cell_mask(x, y)
+                    shift, dest = -BOARD_SIZE, cell_mask(x, last)
+                elif direction == LEFT:
+                    segment = _line_mask([(i, y) for i in range(0, x)])
+                    span = segment | cell_mask(x, y)
+                    shift, dest = 1, cell_mask(0, y)
+                else:
+                    segment = _line_mask([(i, y) for i in range(x + 1, BOARD_SIZE)])
+                    span = segment | cell_mask(x, y)
+                    shift, dest = -1, cell_mask(last, y)
+                moves.append(((x, y), direction))
+                from_masks.append(cell_mask(x, y))
+                span_masks.append(span)
+                segment_masks.append(segment)
+                shifts.append(shift)
+                dest_masks.append(dest)
+    return tuple(moves), tuple(from_masks), tuple(span_masks), tuple(segment_masks), tuple(shifts), tuple(dest_masks)
+
+
+MOVES, FROM_MASKS, SPAN_MASKS, SEGMENT_MASKS, SHIFTS, DEST_MASKS = _build_move_table()
+
+# ((x, y), direction value) -> index in the move table
+MOVE_INDEX = {move: index for index, move in enumerate(MOVES)}
+
+EMPTY = (0, 0)
+
+# The 8 symmetries of the square (dihedral group D4) as transformations of the cell (x, y): identity, the three rotations,
+# the horizontal and vertical reflections and the reflections over the two diagonals. The rules of Quixo are invariant
+# under all of them, so two positions that are one the symmetric of the other have the same value
+_LAST = BOARD_SIZE - 1
+SYMMETRIES = (
+    lambda x, y: (x, y),
+    lambda x, y: (_LAST - y, x),
+    lambda x, y: (_LAST - x, _LAST - y),
+    lambda x, y: (y, _LAST - x),
+    lambda x, y: (_LAST - x, y),
+    lambda x, y: (x, _LAST - y),
+    lambda x, y: (y, x),
+    lambda x, y: (_LAST - y, _LAST - x),
+)
+
+
+def _build_symmetry_tables():
+    # cell permutations: the bit of the cell (x, y) goes to the bit of the transformed cell
+    cell_permutations = tuple(
+        tuple(y * BOARD_SIZE + x for x, y in (symmetry(i % BOARD_SIZE, i // BOARD_SIZE) for i in range(BOARD_SIZE ** 2)))
+        for symmetry in SYMMETRIES
+    )
+    # move permutations: a move is identified by the taken cell and by the cell in which the piece is inserted,
+    # both cells are transformed and the new direction is the side on which the transformed insertion cell lies
+    move_permutations = []
+    for symmetry in SYMMETRIES:
+        permutation = []
+        for index, ((x, y), _) in enumerate(MOVES):
+            dest = DEST_MASKS[index].bit_length() - 1
+            new_from = symmetry(x, y)
+            new_dest = symmetry(dest % BOARD_SIZE, dest // BOARD_SIZE)
+            if new_from[0] == new_dest[0]:
+                direction = TOP if new_dest[1] == 0 else BOTTOM
+            else:
+                direction = LEFT if new_dest[0] == 0 else RIGHT
+            permutation.append(MOVE_INDEX[(new_from, direction)])
+        move_permutations.append(tuple(permutation))
+    # inverse move permutations, to bring a move expressed on the transformed board back to the original one
+    inverse_move_permutations = []
+    for permutation in move_permutations:
+        inverse = [0] * len(permutation)
+        for index, transformed in enumerate(permutation):
+            inverse[transformed] = index
+        inverse_move_permutations.append(tuple(inverse))
+    return cell_permutations, tuple(move_permutations), tuple(inverse_move_permutations)
+
+
+CELL_PERMUTATIONS, MOVE_PERMUTATIONS, INVERSE_MOVE_PERMUTATIONS = _build_symmetry_tables()
+
+# Integer key of a position: the bitboard of player 1 next to the one of player 0, 50 bits in total
+_CELL_COUNT = BOARD_SIZE * BOARD_SIZE
+KEY_BITS = 2 * _CELL_COUNT
+_KEY_STRIDE = 64
+_KEY_MASK = (1 << KEY_BITS) - 1
+_KEY_SHIFTS = tuple(range(0, _KEY_STRIDE * len(SYMMETRIES), _KEY_STRIDE))
+_KEY_ROW_SHIFTS = tuple(range(0, _CELL_COUNT, BOARD_SIZE))
+
+
+def _build_symmetric_key_rows():
+    # for every row and every pair of 5 bit patterns (cells of player 0, cells of player 1) in that row, the keys of those
+    # cells in the 8 symmetric boards packed in one int (64 bits each): the 8 keys of a position are the OR of 5 lookups
+    rows = []
+    for row in range(BOARD_SIZE):
+        row_keys = []
+        for pattern in range(1 << (2 * BOARD_SIZE)):
+            patterns = (pattern >> BOARD_SIZE, pattern & _ROW_PATTERN_MASK)
+            packed = 0
+            for shift, permutation in zip(_KEY_SHIFTS, CELL_PERMUTATIONS):
+                key = 0
+                for player in (0, 1):
+                    for column in range(BOARD_SIZE):
+                        if patterns[player] >> column & 1:
+                            key |= 1 << (permutation[row * BOARD_SIZE + column] + player * _CELL_COUNT)
+                packed |= key << shift
+            row_keys.append(packed)
+        rows.append(tuple(row_keys))
+    return tuple(rows)
+
+
+_SYMMETRIC_KEY_ROWS = _build_symmetric_key_rows()
+
+
+def position_key(bitboards) -> int:
+    '''Returns the 50 bit integer key of the position'''
+    return bitboards[0] | bitboards[1] << _CELL_COUNT
+
+
+def _symmetric_keys(bitboards) -> int:
+    # the keys of the 8 symmetric versions of the position, packed in one int
+    board0, board1 = bitboards
+    packed = 0
+    for row, shift in enumerate(_KEY_ROW_SHIFTS):
+        pattern = (((board0 >> shift) & _ROW_PATTERN_MASK) << BOARD_SIZE) | ((board1 >> shift) & _ROW_PATTERN_MASK)
+        if pattern:
+            packed |= _SYMMETRIC_KEY_ROWS[row][pattern]
+    return packed
+
+
+def canonical_position_key(bitboards) -> int:
+    '''Returns the smallest of the keys of the 8 symmetric versions of the position, which is the same for all of them'''
+    packed = _symmetric_keys(bitboards)
+    return min((packed >> shift) & _KEY_MASK for shift in _KEY_SHIFTS)
+
+
+def canonical_position(bitboards):
+    '''
+    Returns the canonical key of the position and the symmetry that produced it: a move of the position corresponds to
+    the move MOVE_PERMUTATIONS[symmetry][move] of the canonical position (INVERSE_MOVE_PERMUTATIONS brings it back)
+    '''
+    packed = _symmetric_keys(bitboards)
+    keys = [(packed >> shift) & _KEY_MASK for shift in _KEY_SHIFTS]
+    key = min(keys)
+    return key, keys.index(key)
+
+
+def move_index(from_pos, slide) -> int:
+    '''Returns the index of the move in the move table, or -1 if the (position, direction) pair can never be played'''
+    try:
+        return MOVE_INDEX.get(((from_pos[0], from_pos[1]), slide.value), -1)
+    except TypeError:
+        # unhashable or malformed positions can't be legal moves
+        return -1
+
+
+def is_legal(bitboards, index, player_id) -> bool:
+    '''A move is legal if the taken piece is neutral or belongs to the player'''
+    return not bitboards[1 - player_id] & FROM_MASKS[index]
+
+
+def apply_move(bitboards, index, player_id):
+    '''
+    Returns the bitboards after player_id plays the move with the given index (the move has to be legal).
+    A player_id of -1 slides a neutral piece, as SimulatedGame.slideF does when it is called without taking the piece first
+    '''
+    keep = FULL_MASK ^ SPAN_MASKS[index]
+    segment = SEGMENT_MASKS[index]
+    shift = SHIFTS[index]
+    board0, board1 = bitboards
+    # the cells in the span are cleared and the segment is shifted by one cell towards the taken piece
+    if shift > 0:
+        board0 = (board0 & keep) | ((board0 & segment) << shift)
+        board1 = (board1 & keep) | ((board1 & segment) << shift)
+    else:
+        board0 = (board0 & keep) | ((board0 & segment) >> -shift)
+        board1 = (board1 & keep) | ((board1 & segment) >> -shift)
+    # the taken piece, that now belongs to the player, is inserted on the chosen side
+    if player_id == 0:
+        board0 |= DEST_MASKS[index]
+    elif player_id == 1:
+        board1 |= DEST_MASKS[index]
+    return board0, board1
+
+
+def check_winner(bitboards) -> int:
+    '''Returns the player ID that completed the first line in the scanning order of Game.check_winner, otherwise -1'''
+    board0, board1 = bitboards
+    for line in LINE_MASKS:
+        if board0 & line == line:
+            return 0
+        if board1 & line == line:
+            return 1
+    return -1
+
+
+# Row of the NumPy board (-1 neutral, 0 and 1 pieces of the players) for every pair of 5 bit row masks, used to convert
+# the bitboards without touching the 25 cells one at a time
+_ROW_VALUES = [[[0 if bits0 >> i & 1 else 1 if bits1 >> i & 1 else -1 for i in range(BOARD_SIZE)]
+                for bits1 in range(1 << BOARD_SIZE)] for bits0 in range(1 << BOARD_SIZE)]
+_ROW_MASK = (1 << BOARD_SIZE) - 1
+_ROW_SHIFTS = tuple(range(0, BOARD_SIZE * BOARD_SIZE, BOARD_SIZE))
+
+
+def from_array(board: np.ndarray):
+    '''Converts a 5x5 board (-1 neutral, 0 and 1 pieces of the players) into the pair of bitboards'''
+    board0, board1 = 0, 0
+    # a Python loop over the 25 cells is faster than any NumPy reduction on such a small array
+    for i, value in enumerate(np.asarray(board).reshape(-1).tolist()):
+        if value == 0:
+            board0 |= 1 << i
+        elif value == 1:
+            board1 |= 1 << i
+    return board0, board1
+
+
+def to_array(bitboards) -> np.ndarray:
+    '''Converts the pair of bitboards into a 5x5 board with the same dtype used by Game'''
+    board0, board1 = bitboards
+    return np.array([_ROW_VALUES[(board0 >> shift) & _ROW_MASK][(board1 >> shift) & _ROW_MASK] for shift in _ROW_SHIFTS],
+                    dtype=np.int16)
@@ -1,7 +1,8 @@
+import time
 from abc import ABC, abstractmethod
-from copy import deepcopy
 from enum import Enum
 import numpy as np
+import bitboard
 
 # Rules on PDF
 
@@ -16,11 +17,82 @@ class Move(Enum):
     RIGHT = 3
 
 
+class PlayerStats(object):
+    '''
+    Measures of an instrumented player: the number of moves, the time spent in make_move and, for every counter of the
+    player (see Player.counters), how much it grew during the moves. Counters named <cache>_hits and <cache>_misses
+    also give the hit rate of that cache
+    '''
+
+    def __init__(self, counters: dict = None) -> None:
+        self.moves = 0
+        self.time = 0.0
+        self.max_time = 0.0
+        self.totals = {}
+        # counters of the player at the end of the previous move, to measure only the work made by make_move
+        self._last_counters = dict(counters) if counters else {}
+
+    def timed_move(self, player: 'Player', game: 'Game') -> "tuple['tuple[int, int]', Move]":
+        '''Calls make_move of the player and records its time and the growth of its counters'''
+        start = time.perf_counter()
+        move = player.make_move(game)
+        elapsed = time.perf_counter() - start
+        self.moves += 1
+        self.time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        counters = player.counters()
+        for name, value in counters.items():
+            self.totals[name] = self.totals.get(name, 0) + value - self._last_counters.get(name, 0)
+        self._last_counters = counters
+        return move
+
+    def merge(self, other: 'PlayerStats') -> None:
+        '''Adds the measures of other (e.g. of the same player in another game) to these ones'''
+        self.moves += other.moves
+        self.time += other.time
+        self.max_time = max(self.max_time, other.max_time)
+        for name, value in other.totals.items():
+            self.totals[name] = self.totals.get(name, 0) + value
+
+    def summary(self) -> dict:
+        '''Returns the measures: totals, averages per move and hit rates of the caches'''
+        moves = max(self.moves, 1)
+        summary = {"moves": self.moves, "time": self.time, "time_per_move": self.time / moves, "max_time_per_move": self.max_time}
+        for name, value in sorted(self.totals.items()):
+            summary[name] = value
+            summary[name + "_per_move"] = value / moves
+            if name.endswith("_hits"):
+                cache = name[:-len("_hits")]
+                lookups = value + self.totals.get(cache + "_misses", 0)
+                summary[cache + "_hit_rate"] = value / lookups if lookups else 0.0
+        return summary
+
+
 class Player(ABC):
+    # measures of the player (see PlayerStats), None when the instrumentation is disabled: then Game.play calls make_move
+    # directly and nothing is measured
+    instrumentation = None
+
     def __init__(self) -> None:
         '''You can change this for your player if you need to handle state/have memory'''
         pass
 
+    def enable_instrumentation(self) -> PlayerStats:
+        '''Starts measuring the moves of the player in Game.play and returns the measures'''
+        self.instrumentation = PlayerStats(self.counters())
+        return self.instrumentation
+
+    def disable_instrumentation(self) -> None:
+        self.instrumentation = None
+
+    def counters(self) -> 'dict[str, int]':
+        '''
+        Returns the counters of the work made by the player since it was created, e.g. nodes searched, candidate moves
+        evaluated, simulated moves, board copies and the hits and misses of its caches. Players that count something
+        override it: counting is done by incrementing ints they keep anyway, so it costs nearly nothing
+        '''
+        return {}
+
     @abstractmethod
     def make_move(self, game: 'Game') -> "tuple['tuple[int, int]', Move]":
         '''
@@ -33,22 +105,64 @@ class Player(ABC):
         pass
 
 
+class GameObserver(object):
+    '''
+    Receives the events of Game.play. Override only the methods you need: printing, logging and recording
+    of the games are implemented as observers (see observers.py), so a game without observers does no I/O.
+    '''
+
+    def on_game_start(self, game: 'Game', players: 'list[Player]') -> None:
+        pass
+
+    def on_move(self, game: 'Game', player_id: int, from_pos: 'tuple[int, int]', slide: Move) -> None:
+        pass
+
+    def on_illegal_move(self, game: 'Game', player_id: int, from_pos: 'tuple[int, int]', slide: Move) -> None:
+        pass
+
+    def on_game_end(self, game: 'Game', winner: int) -> None:
+        pass
+
+
 class Game(object):
-    def __init__(self) -> None:
-        self._board = np.ones((5, 5), dtype=np.uint8) * -1
+    def __init__(self, observers: 'list[GameObserver]' = None) -> None:
+        # the board is stored as a pair of bitboards (see bitboard.py), one 25 bit integer for each player
+        self._bitboards = bitboard.EMPTY
         self.current_player_idx = 1
+        self._observers = list(observers) if observers else []
+
+    def add_observer(self, observer: GameObserver) -> None:
+        '''Registers an observer of the events of play'''
+        self._observers.append(observer)
+
+    @property
+    def _board(self) -> np.ndarray:
+        '''5x5 NumPy version of the board, built from the bitboards'''
+        return bitboard.to_array(self._bitboards)
+
+    @_board.setter
+    def _board(self, board: np.ndarray) -> None:
+        self._bitboards = bitboard.from_array(board)
 
     def get_board(self) -> np.ndarray:
         '''
         Returns the board
         '''
-        return deepcopy(self._board)
+        # the NumPy board is built from the bitboards on every call, so it is already a copy that can be freely modified
+        return self._board
+
+    def get_bitboards(self) -> 'tuple[int, int]':
+        '''
+        Returns the board as the pair of bitboards of player 0 and player 1
+        '''
+        return self._bitboards
 
     def get_current_player(self) -> int:
         '''
         Returns the current player
         '''
-        return deepcopy(self.current_player_idx)
+        # the index is an immutable int, there is no need to copy it
+        return self.current_player_idx
 
     def print(self):
         '''Prints the board. -1 are neutral pieces, 0 are pieces of player 0, 1 pieces of player 1'''
@@ -56,157 +170,47 @@ class Game(object):
 
     def check_winner(self) -> int:
         '''Check the winner. Returns the player ID of the winner if any, otherwise returns -1'''
-        # for each row
-        for x in range(self._board.shape[0]):
-            # if a player has completed an entire row
-            if self._board[x, 0] != -1 and all(self._board[x, :] == self._board[x, 0]):
-                # return the relative id
-                return self._board[x, 0]
-        # for each column
-        for y in range(self._board.shape[1]):
-            # if a player has completed an entire column
-            if self._board[0, y] != -1 and all(self._board[:, y] == self._board[0, y]):
-                # return the relative id
-                return self._board[0, y]
-        # if a player has completed the principal diagonal
-        if self._board[0, 0] != -1 and all(
-            [self._board[x, x]
-                for x in range(self._board.shape[0])] == self._board[0, 0]
-        ):
-            # return the relative id
-            return self._board[0, 0]
-        # if a player has completed the secondary diagonal
-        if self._board[0, -1] != -1 and all(
-            [self._board[x, -(x + 1)]
-             for x in range(self._board.shape[0])] == self._board[0, -1]
-        ):
-            # return the relative id
-            return self._board[0, -1]
-        return -1
+        # rows, columns, principal and secondary diagonal are checked (in this order) with one mask for each line
+        return bitboard.check_winner(self._bitboards)
 
     def play(self, player1: Player, player2: Player) -> int:
         '''Play the game. Returns the winning player'''
         players = [player1, player2]
+        observers = self._observers
+        for observer in observers:
+            observer.on_game_start(self, players)
         winner = -1
         while winner < 0:
             self.current_player_idx += 1
             self.current_player_idx %= len(players)
             ok = False
             while not ok:
-                from_pos, slide = players[self.current_player_idx].make_move(
-                    self)
+                player = players[self.current_player_idx]
+                if player.instrumentation is None:
+                    from_pos, slide = player.make_move(self)
+                else:
+                    from_pos, slide = player.instrumentation.timed_move(player, self)
                 ok = self.__move(from_pos, slide, self.current_player_idx)
+                # without observers nothing is done here, so the game loop does no I/O
+                for observer in observers:
+                    if ok:
+                        observer.on_move(self, self.current_player_idx, from_pos, slide)
+                    else:
+                        observer.on_illegal_move(self, self.current_player_idx, from_pos, slide)
             winner = self.check_winner()
-            self.print()
+        for observer in observers:
+            observer.on_game_end(self, winner)
         return winner
 
     def __move(self, from_pos: 'tuple[int, int]', slide: Move, player_id: int) -> bool:
         '''Perform a move'''
-        if player_id > 2:
+        if player_id not in (0, 1):
+            return False
+        # the move is acceptable only if the piece is on the border, it can be inserted on the chosen side
+        # (i.e. the pair is in the table of the 44 legal moves) and it is neutral or belongs to the current player
+        index = bitboard.move_index(from_pos, slide)
+        if index < 0 or not bitboard.is_legal(self._bitboards, index, player_id):
             return False
-        # Oh God, Numpy arrays
-        prev_value = deepcopy(self._board[(from_pos[1], from_pos[0])])
-        acceptable = self.__take((from_pos[1], from_pos[0]), player_id)
-        if acceptable:
-            acceptable = self.__slide((from_pos[1], from_pos[0]), slide)
-            if not acceptable:
-                self._board[(from_pos[1], from_pos[0])] = deepcopy(prev_value)
-        return acceptable
-
-    def __take(self, from_pos: 'tuple[int, int]', player_id: int) -> bool:
-        '''Take piece'''
-        # acceptable only if in border
-        acceptable: bool = (
-            # check if it is in the first row
-            (from_pos[0] == 0 and from_pos[1] < 5)
-            # check if it is in the last row
-            or (from_pos[0] == 4 and from_pos[1] < 5)
-            # check if it is in the first column
-            or (from_pos[1] == 0 and from_pos[0] < 5)
-            # check if it is in the last column
-            or (from_pos[1] == 4 and from_pos[0] < 5)
-            # and check if the piece can be moved by the current player
-        ) and (self._board[from_pos] < 0 or self._board[from_pos] == player_id)
-        if acceptable:
-            self._board[from_pos] = player_id
-        return acceptable
-
-    def __slide(self, from_pos: 'tuple[int, int]', slide: Move) -> bool:
-        '''Slide the other pieces'''
-        # define the corners
-        SIDES = [(0, 0), (0, 4), (4, 0), (4, 4)]
-        # if the piece position is not in a corner
-        if from_pos not in SIDES:
-            # if it is at the TOP, it can be moved down, left or right
-            acceptable_top: bool = from_pos[0] == 0 and (
-                slide == Move.BOTTOM or slide == Move.LEFT or slide == Move.RIGHT
-            )
-            # if it is at the BOTTOM, it can be moved up, left or right
-            acceptable_bottom: bool = from_pos[0] == 4 and (
-                slide == Move.TOP or slide == Move.LEFT or slide == Move.RIGHT
-            )
-            # if it is on the LEFT, it can be moved up, down or right
-            acceptable_left: bool = from_pos[1] == 0 and (
-                slide == Move.BOTTOM or slide == Move.TOP or slide == Move.RIGHT
-            )
-            # if it is on the RIGHT, it can be moved up, down or left
-            acceptable_right: bool = from_pos[1] == 4 and (
-                slide == Move.BOTTOM or slide == Move.TOP or slide == Move.LEFT
-            )
-        # if the piece position is in a corner
-        else:
-            # if it is in the upper left corner, it can be moved to the right and down
-            acceptable_top: bool = from_pos == (0, 0) and (
-                slide == Move.BOTTOM or slide == Move.RIGHT)
-            # if it is in the lower left corner, it can be moved to the right and up
-            acceptable_left: bool = from_pos == (4, 0) and (
-                slide == Move.TOP or slide == Move.RIGHT)
-            # if it is in the upper right corner, it can be moved to the left and down
-            acceptable_right: bool = from_pos == (0, 4) and (
-                slide == Move.BOTTOM or slide == Move.LEFT)
-            # if it is in the lower right corner, it can be moved to the left and up
-            acceptable_bottom: bool = from_pos == (4, 4) and (
-                slide == Move.TOP or slide == Move.LEFT)
-        # check if the move is acceptable
-        acceptable: bool = acceptable_top or acceptable_bottom or acceptable_left or acceptable_right
-        # if it is
-        if acceptable:
-            # take the piece
-            piece = self._board[from_pos]
-            # if the player wants to slide it to the left
-            if slide == Move.LEFT:
-                # for each column starting from the column of the piece and moving to the left
-                for i in range(from_pos[1], 0, -1):
-                    # copy the value contained in the same row and the previous column
-                    self._board[(from_pos[0], i)] = self._board[(
-                        from_pos[0], i - 1)]
-                # move the piece to the left
-                self._board[(from_pos[0], 0)] = piece
-            # if the player wants to slide it to the right
-            elif slide == Move.RIGHT:
-                # for each column starting from the column of the piece and moving to the right
-                for i in range(from_pos[1], self._board.shape[1] - 1, 1):
-                    # copy the value contained in the same row and the following column
-                    self._board[(from_pos[0], i)] = self._board[(
-                        from_pos[0], i + 1)]
-                # move the piece to the right
-                self._board[(from_pos[0], self._board.shape[1] - 1)] = piece
-            # if the player wants to slide it upward
-            elif slide == Move.TOP:
-                # for each row starting from the row of the piece and going upward
-                for i in range(from_pos[0], 0, -1):
-                    # copy the value contained in the same column and the previous row
-                    self._board[(i, from_pos[1])] = self._board[(
-                        i - 1, from_pos[1])]
-                # move the piece up
-                self._board[(0, from_pos[1])] = piece
-            # if the player wants to slide it downward
-            elif slide == Move.BOTTOM:
-                # for each row starting from the row of the piece and going downward
-                for i in range(from_pos[0], self._board.shape[0] - 1, 1):
-                    # copy the value contained in the same column and the following row
-                    self._board[(i, from_pos[1])] = self._board[(
-                        i + 1, from_pos[1])]
-                # move the piece down
-                self._board[(self._board.shape[0] - 1, from_pos[1])] = piece
-        return acceptable
\ No newline at end of file
+        # take the piece and slide the other ones
+        self._bitboards = bitboard.apply_move(self._bitboards, index, player_id)
+        return True
@@ -1,36 +1,56 @@
+import argparse
 from game import Game, Player
 from players.minMaxPlayer import MinMaxPlayer
 from players.geneticPlayer import GeneticPlayer
 from players.randomPlayer import RandomPlayer
 from players.optimalPlayer import OptimalPlayer
 from players.reinforcedPlayer import ReinforcedPlayer
+from players.mctsPlayer import MCTSPlayer
 from tournament.genetic_tournament import run_genetic_tournament
-from tournament.final_tournament import run_final_tournament
+from tournament.final_tournament import run_final_tournament, run_final_round_robin
+from tournament.parallel import PlayerSpec, player_spec, run_matches, schedule
 
 # Define a dictionary of players so that it can be selected in this part of the code as global variable
 # Player type selection
+PLAYER_TYPES = {
+    "random": RandomPlayer,
+    "genetic": GeneticPlayer,
+    "minmax": MinMaxPlayer,
+    "reinforcement": ReinforcedPlayer,
+    "optimal": OptimalPlayer,
+    "mcts": MCTSPlayer,
+}
 
 def create_player(player_type, game: 'Game' = None) -> 'Player':
     """
     Create and return a player instance based on the player type.
     """
-    if player_type == "random":
-        return RandomPlayer()
-    elif player_type == "genetic":
-        return GeneticPlayer()
-    elif player_type == "minmax":
-        return MinMaxPlayer()
-    elif player_type == "reinforcement":
-        return ReinforcedPlayer()
-    elif player_type == "optimal":
-        return OptimalPlayer()
-    else:
+    if player_type not in PLAYER_TYPES:
+        raise ValueError(f"Unknown player type: {player_type}")
+    return PLAYER_TYPES[player_type]()
+
+def create_player_spec(player_type, name) -> 'PlayerSpec':
+    """
+    Create the specification used by the parallel match runner to build the player in each worker.
+    """
+    if player_type not in PLAYER_TYPES:
         raise ValueError(f"Unknown player type: {player_type}")
+    return player_spec(name, PLAYER_TYPES[player_type])
 
 ############################################################## EXECUTION ############################################################################################
 
 if __name__ == '__main__':
-    
+
+    # --round-robin replaces the fixed 25+25 games below with the round robin of all the players, which stops every
+    # pairing as soon as the SPRT tells which player is stronger and prints the Elo ratings (see tournament/round_robin.py)
+    parser = argparse.ArgumentParser(description="Quixo games between two players")
+    parser.add_argument("--round-robin", action="store_true", help="run the round robin of all the players with Elo ratings")
+    parser.add_argument("--max-games", type=int, default=50, help="games of an undecided pairing of the round robin")
+    args = parser.parse_args()
+    if args.round_robin:
+        run_final_round_robin(max_games=args.max_games)
+        raise SystemExit
+
     # run_genetic_tournament()
     
     # run_final_tournament()
@@ -43,80 +63,51 @@ if __name__ == '__main__':
     player1_type = "random"
     player2_type = "minmax"
 
-    player1 = create_player(player1_type, game)
-    player2 = create_player(player2_type, game)
-    num_wins_player1 = 0
-    num_wins_player2 = 0
-
-    # tournament between player1 and player2
-    first_tournament_winner, second_tournament_winner = 0 , 0
-    draw = False
-    for i in range(25):
-        game = Game()
-        winner = game.play(player1, player2)    # Play the game
-        print(f'\nWinner: {winner}')
-        if winner == 0:
-            num_wins_player1 += 1
-        else:
-            num_wins_player2 += 1
-    
-    print( f"Player1: {num_wins_player1} - Player2: {num_wins_player2}")
-
-    if num_wins_player1 > num_wins_player2:
-        first_tournament_winner = 0
-    elif num_wins_player2 > num_wins_player1:
-        first_tournament_winner = 1
-
-    first_tournament_wins_p1 = num_wins_player1
-    first_tournament_wins_p2 = num_wins_player2
-
-    num_wins_player1 = 0
-    num_wins_player2 = 0
-    # switch the two players
-    for i in range(25):
-        game = Game()
-        winner = game.play(player2, player1)        # Play the game
-        print(f'\nWinner: {winner}')
-        if winner == 0:
-            num_wins_player1 += 1
-        else:
-            num_wins_player2 += 1
-    
-    print( f"Player1: {num_wins_player1} - Player2: {num_wins_player2}")
+    player1 = create_player_spec(player1_type, "Player1")
+    player2 = create_player_spec(player2_type, "Player2")
+
+    # Number of games for each tournament, the games are played in parallel by a pool of workers (None = one per CPU)
+    num_games = 25
+    workers = None
+    seed = 0
+
+    # tournament between player1 and player2 (first tournament: player1 moves first, second tournament: player2 moves first)
+    matches = schedule(player1, player2, num_games) + schedule(player2, player1, num_games, num_games)
+    wins = {("first", "Player1"): 0, ("first", "Player2"): 0, ("second", "Player1"): 0, ("second", "Player2"): 0}
+    for result in run_matches(matches, workers, seed):
+        tournament = "first" if result.match_id < num_games else "second"
+        winner_name = result.first if result.winner == 0 else result.second
+        print(f'\nWinner: {winner_name}')
+        wins[(tournament, winner_name)] += 1
 
-    if num_wins_player1 > num_wins_player2:
-        second_tournament_winner = 0
-    elif num_wins_player2 > num_wins_player1:
-        second_tournament_winner = 1
+    first_tournament_wins_p1 = wins[("first", "Player1")]
+    first_tournament_wins_p2 = wins[("first", "Player2")]
+    second_tournament_wins_p1 = wins[("second", "Player1")]
+    second_tournament_wins_p2 = wins[("second", "Player2")]
+
+    print( f"Player1: {first_tournament_wins_p1} - Player2: {first_tournament_wins_p2}")
+    print( f"Player1: {second_tournament_wins_p1} - Player2: {second_tournament_wins_p2}")
 
     # Print the result of the tournament
     print("Result of the first tournament: ")
-    if first_tournament_winner == 0:
-        print("Winner Player1 with", first_tournament_wins_p1, "wins out of 25 games")
+    if first_tournament_wins_p1 > first_tournament_wins_p2:
+        print("Winner Player1 with", first_tournament_wins_p1, f"wins out of {num_games} games")
     else:
-        print("Winner Player2 with", first_tournament_wins_p2, "wins out of 25 games")
+        print("Winner Player2 with", first_tournament_wins_p2, f"wins out of {num_games} games")
 
     print("Result of the second tournament: ")
-    if second_tournament_winner == 0:
-        print("Winner Player1 with", num_wins_player1, "wins out of 25 games")
+    if second_tournament_wins_p1 > second_tournament_wins_p2:
+        print("Winner Player1 with", second_tournament_wins_p1, f"wins out of {num_games} games")
     else:
-        print("Winner Player2 with", first_tournament_wins_p2, "wins out of 25 games")
-
-    wins_player1 = first_tournament_wins_p1 + num_wins_player1
-    wins_player2 = first_tournament_wins_p2 + num_wins_player2
+        print("Winner Player2 with", second_tournament_wins_p2, f"wins out of {num_games} games")
 
-    if wins_player1 > wins_player2:
-        winner = 0
-    elif wins_player2 > wins_player1:
-        winner = 1
-    else:
-        draw = True
+    wins_player1 = first_tournament_wins_p1 + second_tournament_wins_p1
+    wins_player2 = first_tournament_wins_p2 + second_tournament_wins_p2
 
     print("Final result:")
-    if draw:
-        print("Draw with:\n Player1 -> ", wins_player1, " wins out of 50 games \n Player2 -> ", wins_player2, " wins out of 50 games")
+    if wins_player1 == wins_player2:
+        print("Draw with:\n Player1 -> ", wins_player1, f" wins out of {2 * num_games} games \n Player2 -> ", wins_player2, f" wins out of {2 * num_games} games")
     elif wins_player1 > wins_player2:
-        print("Player1 wins with ", wins_player1, " wins out of 50 games")
+        print("Player1 wins with ", wins_player1, f" wins out of {2 * num_games} games")
     else:
-        print("Player2 wins with ", wins_player2, " wins out of 50 games")
-    
\ No newline at end of file
+        print("Player2 wins with ", wins_player2, f" wins out of {2 * num_games} games")
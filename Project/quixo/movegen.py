@@ -0,0 +1,51 @@
+from game import Move
+import bitboard
+
+# Legal move generation shared by all the players.
+# Only 44 (position, direction) pairs can ever be played, and whether one of them is legal depends just on the owner of the
+# taken piece, so the moves are filtered in a single pass over the precomputed table of border moves without copying or
+# simulating the board. The legal moves only depend on which border cells belong to the opponent: the result is memoized
+# on that 16 bit pattern, so after a warm up generating the moves of a position costs a dictionary lookup.
+
+# The 44 border moves in the same raster order (x, then y, then direction) used by the players to enumerate the moves
+BORDER_MOVES = tuple(((x, y), Move(direction)) for (x, y), direction in bitboard.MOVES)
+
+_legal_indices_cache = {}
+
+
+def legal_move_indices(bitboards, player_id) -> 'tuple[int, ...]':
+    '''Returns the indices (in the move table of bitboard.py) of the legal moves of player_id'''
+    opponent_border = bitboards[1 - player_id] & bitboard.BORDER_MASK
+    indices = _legal_indices_cache.get(opponent_border)
+    if indices is None:
+        # a move is legal if the taken piece is neutral or belongs to the player, i.e. not to the opponent
+        indices = tuple(i for i, mask in enumerate(bitboard.FROM_MASKS) if not opponent_border & mask)
+        _legal_indices_cache[opponent_border] = indices
+    return indices
+
+
+def iter_possible_moves(game, player_id=None):
+    '''
+    Lazily yields the legal moves ((x, y), Move) of player_id (by default the current player of the game).
+    game can be a Game, a SimulatedGame or directly a pair of bitboards
+    '''
+    bitboards, player_id = _unpack(game, player_id)
+    for i in legal_move_indices(bitboards, player_id):
+        yield BORDER_MOVES[i]
+
+
+def get_possible_moves(game, player_id=None) -> 'list[tuple[tuple[int, int], Move]]':
+    '''
+    Returns the list of the legal moves ((x, y), Move) of player_id (by default the current player of the game).
+    game can be a Game, a SimulatedGame or directly a pair of bitboards
+    '''
+    bitboards, player_id = _unpack(game, player_id)
+    return [BORDER_MOVES[i] for i in legal_move_indices(bitboards, player_id)]
+
+
+def _unpack(game, player_id):
+    if isinstance(game, tuple):
+        if player_id is None:
+            raise ValueError("player_id is required when the moves are generated from bitboards")
+        return game, player_id
+    return game.get_bitboards(), game.get_current_player() if player_id is None else player_id
@@ -0,0 +1,79 @@
+import logging
+from game import Game, GameObserver, Move, Player
+
+# Observers of Game.play. By default a game has no observers and does no I/O: pass them to Game to print the board,
+# log the moves or record the games, e.g. Game([PrintObserver()]).play(player1, player2)
+
+
+class PrintObserver(GameObserver):
+    '''Prints the board after every move, as Game.play used to do'''
+
+    def on_move(self, game: 'Game', player_id: int, from_pos: 'tuple[int, int]', slide: Move) -> None:
+        game.print()
+
+
+class LoggingObserver(GameObserver):
+    '''Sends the events of the game to a logger'''
+
+    def __init__(self, logger: logging.Logger = None, level=logging.INFO) -> None:
+        self.logger = logger if logger is not None else logging.getLogger("quixo.game")
+        self.level = level
+
+    def on_game_start(self, game: 'Game', players: 'list[Player]') -> None:
+        self.logger.log(self.level, "Game started: %s vs %s", type(players[0]).__name__, type(players[1]).__name__)
+
+    def on_move(self, game: 'Game', player_id: int, from_pos: 'tuple[int, int]', slide: Move) -> None:
+        # the board is formatted only if the message is going to be emitted
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, "Player %d: %s %s\n%s", player_id, from_pos, slide.name, game.get_board())
+
+    def on_illegal_move(self, game: 'Game', player_id: int, from_pos: 'tuple[int, int]', slide: Move) -> None:
+        self.logger.warning("Player %d tried the illegal move %s %s", player_id, from_pos, getattr(slide, "name", slide))
+
+    def on_game_end(self, game: 'Game', winner: int) -> None:
+        self.logger.log(self.level, "Game over, winner: %d", winner)
+
+
+class RecordingObserver(GameObserver):
+    '''Records the moves of every observed game, e.g. to replay or analyze them later'''
+
+    def __init__(self) -> None:
+        # one dict for each game, with its moves [(player_id, (x, y), Move)], illegal moves and winner
+        self.games = []
+
+    def on_game_start(self, game: 'Game', players: 'list[Player]') -> None:
+        self.games.append({"moves": [], "illegal_moves": 0, "winner": -1})
+
+    def on_move(self, game: 'Game', player_id: int, from_pos: 'tuple[int, int]', slide: Move) -> None:
+        self.games[-1]["moves"].append((player_id, tuple(from_pos), slide))
+
+    def on_illegal_move(self, game: 'Game', player_id: int, from_pos: 'tuple[int, int]', slide: Move) -> None:
+        self.games[-1]["illegal_moves"] += 1
+
+    def on_game_end(self, game: 'Game', winner: int) -> None:
+        self.games[-1]["winner"] = int(winner)
+
+
+class GameTooLong(Exception):
+    '''Raised by PlyLimitObserver when a game reaches its limit of plies'''
+    pass
+
+
+class PlyLimitObserver(GameObserver):
+    '''
+    Stops the game after max_plies plies by raising GameTooLong from Game.play: two deterministic players can repeat the
+    same positions forever, so the callers count such games as draws
+    '''
+
+    def __init__(self, max_plies) -> None:
+        self.max_plies = max_plies
+        self.plies = 0
+
+    def on_game_start(self, game: 'Game', players: 'list[Player]') -> None:
+        # the same observer can watch several games, each with its own limit
+        self.plies = 0
+
+    def on_move(self, game: 'Game', player_id: int, from_pos: 'tuple[int, int]', slide: Move) -> None:
+        self.plies += 1
+        if self.plies >= self.max_plies:
+            raise GameTooLong()
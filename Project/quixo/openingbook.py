@@ -0,0 +1,154 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import bitboard
+import movegen
+from game import Game
+
+"""
+Opening book of the first plies of Quixo.
+Every game starts from the empty board, so the positions of the first plies are always the same few hundred: the book
+builder searches all of them once, offline and deeply, with MinMaxPlayer and stores the best move of each one.
+Positions are reduced by symmetry: the book is keyed by the canonical key of the position (see
+bitboard.canonical_position) and the player to move, and the stored move is the one of the canonical position, which is
+brought back to the actual board with the symmetry of the key.
+The book is a binary .npy file of (key, move, depth, value) records sorted by key: players load it lazily, memory-mapped,
+and look positions up by binary search. Players use a book only if they are given its file (opening_book=BOOK_PATH), and
+MinMaxPlayer ignores the positions searched less deeply than its own depth.
+Build it from Project/quixo with:    python openingbook.py [--plies N] [--depth D] [--workers W]
+"""
+
+# Default file of the opening book
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'opening_book.npy')
+
+# Record of a position of the book
+RECORD_DTYPE = np.dtype([('key', '<u8'), ('move', 'i1'), ('depth', 'i1'), ('value', '<f4')])
+
+
+def book_key(bitboards, player_id):
+    '''Returns the key of the position in the book and the symmetry that maps it to its canonical version'''
+    key, symmetry = bitboard.canonical_position(bitboards)
+    return key << 1 | player_id, symmetry
+
+
+class OpeningBook(object):
+    def __init__(self, records) -> None:
+        self._records = records
+        self._keys = records['key']
+        self._moves = records['move']
+        self._depths = records['depth']
+
+    def lookup(self, bitboards, player_id, min_depth=0) -> int:
+        '''
+        Returns the index (in the move table of bitboard.py) of the book move of the position, or -1 if it isn't in the book
+        or it has been searched less deeply than min_depth
+        '''
+        key, symmetry = book_key(bitboards, player_id)
+        index = int(np.searchsorted(self._keys, key))
+        if index < len(self._keys) and self._keys.item(index) == key and self._depths.item(index) >= min_depth:
+            return bitboard.INVERSE_MOVE_PERMUTATIONS[symmetry][self._moves.item(index)]
+        return -1
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+# books already loaded by this process, by path (None if the file doesn't exist)
+_books = {}
+
+
+def load_book(path=BOOK_PATH):
+    '''Returns the opening book saved in path (memory-mapped and loaded only once per process), or None if there is none'''
+    if path not in _books:
+        _books[path] = OpeningBook(np.load(path, mmap_mode='r')) if os.path.exists(path) else None
+    return _books[path]
+
+
+def lookup(bitboards, player_id, path=BOOK_PATH, min_depth=0) -> int:
+    '''Returns the book move of the position, or -1 if there is no book or the position isn't in it (see OpeningBook.lookup)'''
+    book = load_book(path)
+    return book.lookup(bitboards, player_id, min_depth) if book is not None else -1
+
+
+def opening_positions(plies):
+    '''Returns one position (bitboards, player to move) for each canonical position reachable in less than plies plies'''
+    positions = []
+    level = {book_key(bitboard.EMPTY, 0)[0]: (bitboard.EMPTY, 0)}
+    for _ in range(plies):
+        positions.extend(level.values())
+        next_level = {}
+        for bitboards, player_id in level.values():
+            for move in movegen.legal_move_indices(bitboards, player_id):
+                new_bitboards = bitboard.apply_move(bitboards, move, player_id)
+                # finished games don't need a move
+                if bitboard.check_winner(new_bitboards) < 0:
+                    next_level.setdefault(book_key(new_bitboards, 1 - player_id)[0], (new_bitboards, 1 - player_id))
+        level = next_level
+    return positions
+
+
+def _search_position(position, depth):
+    # best move (in the canonical position) and value of a position, searched by MinMaxPlayer
+    from players.minMaxPlayer import MinMaxPlayer
+    bitboards, player_id = position
+    game = Game()
+    game._bitboards, game.current_player_idx = bitboards, player_id
+    player = MinMaxPlayer(depth=depth, opening_book=None)
+    from_pos, slide = player.make_move(game)
+    key, symmetry = book_key(bitboards, player_id)
+    move = bitboard.MOVE_PERMUTATIONS[symmetry][bitboard.move_index(from_pos, slide)]
+    return key, move, player.last_search.get("value", 0.0)
+
+
+def build_book(plies=4, depth=5, path=BOOK_PATH, workers=1, progress=None):
+    '''Searches the positions of the first plies with MinMaxPlayer of the given depth and saves the book in path'''
+    positions = opening_positions(plies)
+    records = np.zeros(len(positions), dtype=RECORD_DTYPE)
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            results = executor.map(_search_position, positions, [depth] * len(positions), chunksize=4)
+            for i, result in enumerate(results):
+                records[i] = (result[0], result[1], depth, result[2])
+                if progress is not None:
+                    progress(i + 1, len(positions))
+    else:
+        for i, position in enumerate(positions):
+            key, move, value = _search_position(position, depth)
+            records[i] = (key, move, depth, value)
+            if progress is not None:
+                progress(i + 1, len(positions))
+    records.sort(order='key')
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # the file is written next to the final one and then renamed, so that readers never see a partial book
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as file:
+        np.save(file, records)
+    os.replace(temporary, path)
+    _books.pop(path, None)
+    return len(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Builds the opening book of Quixo")
+    parser.add_argument("--plies", type=int, default=4, help="the book covers the positions of the first plies")
+    parser.add_argument("--depth", type=int, default=5, help="depth of the MinMax search of every position")
+    parser.add_argument("--workers", type=int, default=1, help="processes that search the positions")
+    parser.add_argument("--output", default=BOOK_PATH)
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+
+    def progress(done, total):
+        if done % 50 == 0 or done == total:
+            print(f"{done}/{total} positions searched, {time.perf_counter() - start:.1f}s")
+
+    count = build_book(args.plies, args.depth, args.output, args.workers, progress)
+    print(f"{count} positions saved in {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,15 @@
 #################### Genetic Player #################### Genetic Player #################### Genetic Player #################### Genetic Player #################### Genetic Player  
 from game import Player
 from simulatedgame import SimulatedGame
+import movegen
 import random
+import os
 from game import Game, Move, Player
 import numpy as np
 from players.randomPlayer import RandomPlayer
 from tqdm import tqdm  # Import tqdm
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 # The GeneticPlayer is a player in a game that evolves its strategy using a genetic algorithm. 
 # It begins with a randomly generated strategy (genotype) and improves it over multiple generations. 
@@ -15,10 +19,106 @@ from tqdm import tqdm  # Import tqdm
 # representing an effective and evolved strategy for playing the game.
 # Once the player with the best genotype is obtained, the make_move function, to perform a move, will choose the one among 
 # the possible moves that has the highest value of the product between the move's score and the move's count.
+# The fitness of the population can be evaluated in parallel by a pool of fitness_workers processes, averaging fitness_games
+# seeded games for each individual. The seeds are drawn again from the generator of the training at every generation, so
+# the population isn't tuned on a few fixed games, but in a generation all the individuals play the same games: the
+# fitness only depends on the genotype, and the individuals with the same weights are evaluated only once.
+# A genotype is stored as three parallel NumPy arrays (index of the move in the move table, weight and count of each gene)
+# and a population as 2-D arrays with one row per individual, so selection, crossover and mutation of a whole generation
+# are a few array operations.
+# Training with a seed is reproducible, so the evolved genotype is saved in a cache on disk, keyed by the hyperparameters
+# and the seed, and the next players built with the same ones load it instead of running the genetic algorithm again.
+# While training, the population is checkpointed after every generation, so that an interrupted run resumes from there.
+
+# Number of genes of a genotype: one for each of the 44 moves that can be played
+NUM_GENES = len(movegen.BORDER_MOVES)
+
+# Default directory of the cache of the trained genotypes
+GENOTYPE_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'genotypes')
+
+# Version of the training algorithm in the names of the cached genotypes, increased whenever a change of the algorithm
+# changes the genotype trained with the same seed, so that the genotypes trained by older versions are not loaded
+_CACHE_VERSION = 4
+
+
+class Genotype(object):
+    '''Genes of a GeneticPlayer: the move (index in movegen.BORDER_MOVES), the weight and the count of each gene'''
+
+    def __init__(self, moves, weights, counts=None) -> None:
+        self.moves = np.asarray(moves, dtype=np.int64)
+        self.weights = np.asarray(weights, dtype=np.int64)
+        self.counts = np.zeros(len(self.moves), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64)
+        # index of the gene of each of the 44 moves (-1 if the genotype has no gene for it), so that the legal moves
+        # given by movegen.legal_move_indices can be mapped to their genes without searching the genotype
+        self.gene_of_move = np.full(NUM_GENES, -1, dtype=np.int64)
+        self.gene_of_move[self.moves] = np.arange(len(self.moves))
+
+    @classmethod
+    def random(cls) -> 'Genotype':
+        # one gene for each move, in the raster order of the moves, with a random weight between 0 and 100
+        return cls(np.arange(NUM_GENES), np.random.randint(0, 101, size=NUM_GENES))
+
+    @classmethod
+    def from_list(cls, genotype) -> 'Genotype':
+        '''Builds a genotype from a list of ((x, y), Move), weight, count) tuples'''
+        moves = [movegen.BORDER_MOVES.index(((tuple(from_pos), Move(slide.value)))) for (from_pos, slide), _, _ in genotype]
+        return cls(moves, [weight for _, weight, _ in genotype], [count for _, _, count in genotype])
+
+    def to_list(self) -> 'list[tuple[tuple[tuple[int, int], Move], int, int]]':
+        '''Returns the genes as a list of ((x, y), Move), weight, count) tuples'''
+        return [(movegen.BORDER_MOVES[move], int(weight), int(count)) for move, weight, count in zip(self.moves, self.weights, self.counts)]
+
+    def best_gene(self, legal_moves, scores) -> int:
+        '''
+        Returns the gene with the highest score among the ones of the legal moves (indices in the move table),
+        the first one in the genotype in case of a tie, or -1 if none of the moves has a gene
+        '''
+        genes = self.gene_of_move[list(legal_moves)]
+        legal = np.zeros(len(self.moves), dtype=bool)
+        legal[genes[genes >= 0]] = True
+        if not legal.any():
+            return -1
+        # the scores of the genes whose move is not legal are replaced by a value lower than any score
+        return int(np.argmax(np.where(legal, scores, np.iinfo(np.int64).min)))
+
+    def copy(self) -> 'Genotype':
+        return Genotype(self.moves.copy(), self.weights.copy(), self.counts.copy())
+
+    def __len__(self) -> int:
+        return len(self.moves)
+
+
+def _save_arrays(path, **arrays):
+    # the file is written next to the final one and then renamed, so that an interrupted write never leaves a corrupted file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as file:
+        np.savez_compressed(file, **arrays)
+    os.replace(temporary, path)
+
+
+def save_genotype(path, genotype: Genotype) -> None:
+    '''Saves a genotype to a compressed .npz file'''
+    _save_arrays(path, moves=genotype.moves.astype(np.int8), weights=genotype.weights.astype(np.int32),
+                 counts=genotype.counts.astype(np.int32))
+
+
+def load_genotype(path) -> Genotype:
+    '''Loads a genotype saved by save_genotype'''
+    with np.load(path) as data:
+        return Genotype(data['moves'], data['weights'], data['counts'])
+
+
+# Evaluates a genotype in a worker process, returns its fitness and the genotype with the updated move counts
+def _evaluate_genotype(genotype, seeds, factor=1.2):
+    player = GeneticPlayer(genotype=genotype, training=False)
+    fitness = player.calculate_fitness(factor, seeds)
+    return fitness, player.genotype
 
 class GeneticPlayer(Player):
     def __init__(self, genotype=None, training = True, population_size=10, generations=10, mutation_rate=0.1,
-                selection_strategy='tournament_selection', crossover_strategy='two_points', mutation_strategy='shift'):
+                selection_strategy='tournament_selection', crossover_strategy='two_points', mutation_strategy='shift',
+                fitness_games=1, fitness_workers=1, seed=None, cache_dir=GENOTYPE_CACHE_DIR):
         super().__init__()
         self.fitness_score = 0
         self.population_size = population_size
@@ -27,80 +127,72 @@ class GeneticPlayer(Player):
         self.selection_strategy = selection_strategy
         self.crossover_strategy = crossover_strategy
         self.mutation_strategy = mutation_strategy
-
-        # Initialize genotype randomly or with a provided one
-        if genotype:
+        self.fitness_games = fitness_games          # number of games averaged to compute the fitness of an individual
+        self.fitness_workers = fitness_workers      # number of processes used to evaluate the population
+        self.seed = seed                            # seed of the training (random and not cached if None)
+        self.cache_dir = cache_dir                  # directory of the cache of the trained genotypes (None disables it)
+        self.candidates = 0                         # legal moves compared by make_move
+
+        # Initialize genotype randomly or with a provided one (a Genotype or a list of (move, weight, count) tuples)
+        if isinstance(genotype, Genotype):
             self.genotype = genotype
+        elif genotype:
+            self.genotype = Genotype.from_list(genotype)
         else:
             self.genotype = self.generate_random_genotype()
         if training: 
-            self.genotype = self.genetic_algorithm()
+            self.genotype = self.train()
 
 
     def make_move(self, game: 'Game') -> 'tuple[tuple[int, int], Move]':
-        # List to store possible moves with their weights
-        possible_moves = []
-        
-        # Iterate over each element in the genotype
-        for element in self.genotype:
-            # Create a simulated game based on the current game state
-            simulated = SimulatedGame(game.get_board(), game.get_current_player())
-            
-            # Extract move, weight, and count from the genotype element
-            _move, weight, count = element
-
-            # Check if the move is valid in the simulated game
-            if simulated.move(_move[0], _move[1], game.current_player_idx):
-                # If valid, add the move and its weighted count to the list
-                possible_moves.append((_move, weight * count))
-
-        # Sort possible moves based on their weighted counts in descending order
-        sorted_possible_moves = sorted(possible_moves, key=lambda x: x[1], reverse=True)
-
-        # Extract the top move and its weight from the sorted list
-        top_move, top_weight = sorted_possible_moves[0]
+        # The legal moves are read from the bitboards, without copying or simulating the board
+        legal_moves = movegen.legal_move_indices(game.get_bitboards(), game.current_player_idx)
+        self.candidates += len(legal_moves)
+
+        # Choose the legal move with the highest product between its weight and its count
+        # (the first one in the genotype in case of a tie)
+        gene = self.genotype.best_gene(legal_moves, self.genotype.weights * self.genotype.counts)
 
         # Return the top move
-        return top_move
+        return movegen.BORDER_MOVES[self.genotype.moves[gene]]
+
 
+    def counters(self):
+        return {"candidates": self.candidates}
 
     def get_possible_moves(self, simgame: 'SimulatedGame'):
-        possible_moves = []
-        for x in range(5):
-            for y in range(5):
-                for direction in [Move.TOP, Move.BOTTOM, Move.LEFT, Move.RIGHT]:
-                    simulated = SimulatedGame(simgame.get_board(),simgame.get_current_player())
-                    ok = simulated.move((x, y), direction, simgame.get_current_player())
-                    if ok:
-                        possible_moves.append(((x, y), direction))
-        return possible_moves
-
-    # Generate a random genotype: a list of (move, weight, countMove)
+        return movegen.get_possible_moves(simgame)
+
+    # Generate a random genotype: a weight (between 0 and 100) and a count (initialized to 0) for each of the 44 moves
     def generate_random_genotype(self):
-        # Create a simulated game with an initial board
-        initialBoard = SimulatedGame(np.ones((5, 5), dtype=np.uint8) * -1, 0)
-        
-        # Get a list of possible moves on the initial board (should return 44 possible moves)
-        moves = self.get_possible_moves(initialBoard)
+        return Genotype.random()
 
-        random_genotype = []
-        for move in moves:
-            # Generate a random weight for the move (between 0 and 100)
-            random_weight = np.random.randint(0, 101)
 
-            # Append the move, random weight, and count (initialized to 0)
-            random_genotype.append((move, random_weight, 0))
+    def calculate_fitness(self, factor = 1.2, seeds = None):
+        # Without seeds a single unseeded game is played, otherwise the score is averaged over one game for each seed
+        if seeds is None:
+            self.fitness_score += self.play_fitness_game(factor)
+            return self.fitness_score
 
-        # Return the generated random genotype
-        return random_genotype
+        # the state of the random module is restored afterwards, so that seeding the games doesn't affect the rest of the algorithm
+        state = random.getstate()
+        scores = []
+        for seed in seeds:
+            random.seed(int(seed))
+            scores.append(self.play_fitness_game(factor))
+        random.setstate(state)
 
+        # Update fitness score with the average result
+        self.fitness_score += sum(scores) / len(scores)
+        return self.fitness_score
 
-    def calculate_fitness(self, factor = 1.2):
+    def play_fitness_game(self, factor = 1.2):
         # Create a new game instance for each fitness calculation
         game = SimulatedGame(np.ones((5, 5), dtype=np.uint8) * -1, 1)
         winner = -1
         opponent = RandomPlayer() 
         count_moves = 0
+        genotype = self.genotype
 
         # Continue the game until a winner is determined
         while winner < 0:
@@ -115,197 +207,291 @@ class GeneticPlayer(Player):
                     from_pos, slide = opponent.make_move(game)
                     ok = game.move(from_pos, slide, 0)
                 else: 
-                    # If the current player is the genetic player, select a move based on the genotype
-                    possible_moves = self.get_possible_moves(game)
-                    returned = []
-
-                    # Filter possible moves based on the genotype
-                    for _move, _weight, _count in self.genotype:
-                        if _move in possible_moves:
-                            returned.append((_move,_weight,_count))
-                    
-                    # Sort the filtered moves based on weights in descending order
-                    returned.sort(key=lambda x: x[1],reverse=True)
-
-                    # If a move is selected from the genotype, update the genotype counts
-                    if returned:
-                        selected_move, selected_weight, selected_count = returned[0]
-                        self.genotype = [(move, weight, count + 1) if move == selected_move else (move, weight, count) for move, weight, count in self.genotype]
-                    
+                    # If the current player is the genetic player, select the legal move with the highest weight
+                    # (the first one in the genotype in case of a tie) and update its count
+                    gene = genotype.best_gene(movegen.legal_move_indices(game.get_bitboards(), 1), genotype.weights)
+                    genotype.counts[gene] += 1
+
                     # Move the genetic player
-                    ok = game.move(selected_move[0],selected_move[1],1)
+                    game.apply_move_index(int(genotype.moves[gene]), 1)
+                    ok = True
                     count_moves += 1
             winner = game.check_winner()
 
-        # Update fitness score based on the game result
+        # Return the score of the game based on its result
         if winner:
-            self.fitness_score += 1 + (1/count_moves) * factor 
-
-        # Return the updated fitness score
-        return self.fitness_score
+            return 1 + (1/count_moves) * factor 
+        return 0
 
     @staticmethod 
-    def crossover(parent1, parent2, crossover_strategy='single_point'):
-        # Get the length of the genotype
-        len_gen = len(parent1)
+    def crossover(parents1, parents2, crossover_strategy='single_point'):
+        # Crosses the rows of the two 2-D arrays of weights (one row for each pair of parents), returns the children's weights
+        return np.where(GeneticPlayer.crossover_mask(parents1.shape, crossover_strategy), parents2, parents1)
+
+    @staticmethod
+    def crossover_mask(shape, crossover_strategy='single_point'):
+        # Returns a boolean array of the given (children, genes) shape telling which genes each child takes from its
+        # second parent, so that the weights and the counts of the parents can be crossed at the same points
+        num_children, len_gen = shape
+        genes = np.arange(len_gen)[None, :]
 
         # Check the crossover strategy
         if crossover_strategy == 'single_point':
-            # Choose a random crossover point
-            crossover_point = random.randint(0, len_gen - 1)
+            # Choose a random crossover point for each child
+            crossover_point = np.random.randint(0, len_gen, size=(num_children, 1))
 
             # Perform single-point crossover
-            cross = parent1[:crossover_point] + parent2[crossover_point:]
-            return cross
-        
-        if crossover_strategy == 'two_points':
-            # Choose two distinct random crossover points
-            point1 = random.randint(0, len_gen - 1)
-            point2 = random.randint(0, len_gen - 1)
+            return genes >= crossover_point
 
-            # Ensure the two points are distinct
-            while point1 == point2:
-                point2 = random.randint(0, len_gen - 1)
+        if crossover_strategy == 'two_points':
+            # Choose two distinct random crossover points for each child
+            point1 = np.random.randint(0, len_gen, size=num_children)
+            point2 = (point1 + np.random.randint(1, len_gen, size=num_children)) % len_gen
 
             # Determine the start and end points for two-point crossover
-            start, end = sorted([point1, point2])
-            
+            start = np.minimum(point1, point2)[:, None]
+            end = np.maximum(point1, point2)[:, None]
+
             # Perform two-point crossover
-            cross = parent1[:start] + parent2[start:end] + parent1[end:]
-            return cross 
+            return (genes >= start) & (genes < end)
 
     @staticmethod 
-    def mutate(child, mutation_rate=0.1, mutation_strategy='swap'):
-        # Get the length of the genotype
-        len_gen = len(child)
-                
+    def mutate(children, mutation_rate=0.1, mutation_strategy='swap'):
+        # Mutates in place the 2-D array of weights (one row for each child) and returns it
+        num_children, len_gen = children.shape
+        rows = np.arange(num_children)
 
         # Check the mutation strategy
         if mutation_strategy == 'random_reset':
             # Randomly reset weights in the genotype with a certain probability
-            for i in range(len_gen):
-                if random.random() < mutation_rate:
-                    _move, _weight, _count = child[i]
-                    _weight += np.random.randint(-19, 20)
-                    child[i] = (_move,_weight,_count)
-            return child
-                
+            mutated = np.random.random(children.shape) < mutation_rate
+            children += mutated * np.random.randint(-19, 20, size=children.shape)
+            return children
+
         if mutation_strategy == 'swap':
-            # Swap the weights of pairs of elements in the genotype with a certain probability
+            # Swap the weights of pairs of genes with a certain probability: the swaps of gene i are done for all the children at once
             for i in range(len_gen - 1):
-                if np.random.rand() < mutation_rate:
-                    j = np.random.randint(i + 1, len_gen)
-                    _move_i, _weight_i, _count_i = child[i]
-                    _move_j, _weight_j, _count_j = child[j]
-                    _weight_i, _weight_j = _weight_j, _weight_i
-                    child[i] = (_move_i, _weight_i, _count_i)
-                    child[j] = (_move_j, _weight_j, _count_j)
-            return child
-        
+                swapped = rows[np.random.random(num_children) < mutation_rate]
+                if len(swapped):
+                    j = np.random.randint(i + 1, len_gen, size=len(swapped))
+                    children[swapped, i], children[swapped, j] = children[swapped, j], children[swapped, i]
+            return children
+
         if mutation_strategy == 'shift':
-            # Shift a portion of weights in the genotype with a certain probability
-            for i in range(len_gen - 1):
-                if np.random.rand() < mutation_rate:
-                    # Randomly select start and end indices for the shifted portion
-                    start_index = np.random.randint(1, len_gen - 3)
-                    end_index = np.random.randint(start_index + 1, len_gen - 2)
-                    selected_weight = []
-                    
-                    # Extract weights from portions before and after the selected portion
-                    portion2_weight = []
-                    for i in range(start_index, end_index + 1):
-                        move, weight, count = child[i]
-                        portion2_weight.append(weight)
-
-                    portion1_weight = []
-                    for i in range(0, start_index):
-                        move, weight, count = child[i]
-                        portion1_weight.append(weight)
-
-                    portion3_weight = []
-                    for i in range(end_index + 1, len_gen):
-                        move, weight, count = child[i]
-                        portion3_weight.append(weight)
-
-                    # Combine and shuffle the weights to form the shifted portion
-                    selected_weight = portion2_weight + portion3_weight + portion1_weight
-
-                    # Update the weights in the genotype
-                    for i in range(len_gen):
-                        move, weight, count = child[i]
-                        weight = selected_weight[i]
-                        child[i] = move, weight, count
-
-            return child
-      
-    def genetic_algorithm(self, population_size=100, generations=10, mutation_rate=0.1):
-        # Initialize the population with randomly generated players
-        population = [GeneticPlayer(training=False) for _ in range(population_size)]
-
-        # Evolve the population over a specified number of generations
-        for generation in tqdm(range(generations), desc="Evolving Generations"):
-            
-            # Calculate fitness scores for each player in the population
-            fitness_scores = [s.calculate_fitness() for s in tqdm(population, desc=f"Gen {generation+1} Fitness Eval", leave=False)]
-            
-            # Select individuals for the mating pool based on fitness scores
-            mating_pool = [population[i] for i in self.select_based_on_fitness(self, fitness_scores)]
-           
-            # Create next generation using crossover and mutation
-            new_population = []
-            while len(new_population) < population_size:
-                # Select two parents randomly from the mating pool
-                parents = random.sample(mating_pool, 2)
-
-                # Perform crossover on the parents' genotypes
-                child_genotype = GeneticPlayer.crossover(parents[0].genotype, parents[1].genotype, self.crossover_strategy)
-                
-                # Perform mutation on the child genotype
-                child_genotype = GeneticPlayer.mutate(child_genotype, self.mutation_rate, self.mutation_strategy)
-                
-                # Add the child with the new genotype to the new population
-                new_population.append(GeneticPlayer(genotype=child_genotype,training=False))
-            
-            # Update the population with the new generation
-            population = new_population
-        
+            # Shift a portion of the weights with a certain probability: the portion from start_index to end_index is moved
+            # to the front, followed by the weights after it and then by the ones before it, i.e. the weights are rotated
+            # to the left by start_index positions (whatever end_index is). Rotations compose, so the shifts of each child
+            # add up to a single rotation.
+            shifted = np.random.random((num_children, len_gen - 1)) < mutation_rate
+            start_index = np.random.randint(1, len_gen - 3, size=shifted.shape)
+            rotation = (shifted * start_index).sum(axis=1) % len_gen
+
+            # Update the weights in the genotype
+            children[:] = children[rows[:, None], (np.arange(len_gen)[None, :] + rotation[:, None]) % len_gen]
+            return children
+
+    def cache_path(self):
+        '''Returns the file of the cache in which the trained genotype is saved, or None if it can't be cached'''
+        if self.cache_dir is None or self.seed is None:
+            return None
+        name = f"genotype_v{_CACHE_VERSION}_p{self.population_size}_g{self.generations}_m{float(self.mutation_rate)!r}_{self.selection_strategy}_" \
+               f"{self.crossover_strategy}_{self.mutation_strategy}_f{self.fitness_games}_s{self.seed}.npz"
+        return os.path.join(self.cache_dir, name)
+
+    def train(self):
+        # Load the genotype trained by a previous player with the same hyperparameters and seed, if there is one
+        path = self.cache_path()
+        if path is not None and os.path.exists(path):
+            return load_genotype(path)
+
+        checkpoint_path = path[:-len('.npz')] + '.checkpoint.npz' if path is not None else None
+        genotype = self.genetic_algorithm(self.population_size, self.generations, self.mutation_rate, checkpoint_path)
+
+        # Save the result and remove the checkpoint, which isn't needed anymore
+        if path is not None:
+            save_genotype(path, genotype)
+            if os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+        return genotype
+
+    def genetic_algorithm(self, population_size=100, generations=10, mutation_rate=0.1, checkpoint_path=None):
+        # With a seed the whole training is reproducible: the NumPy generator used by the genetic operators is seeded
+        # from it, and its previous state is restored at the end so that the rest of the program isn't affected
+        state = np.random.get_state()
+        if self.seed is not None:
+            np.random.seed(int(np.random.SeedSequence(self.seed, spawn_key=(1,)).generate_state(1)[0]))
+        try:
+            return self.run_genetic_algorithm(population_size, generations, mutation_rate, checkpoint_path)
+        finally:
+            if self.seed is not None:
+                np.random.set_state(state)
+
+    def run_genetic_algorithm(self, population_size, generations, mutation_rate, checkpoint_path=None):
+        # Initialize the population with random weights: one row of weights and counts for each individual
+        # (all the genotypes have their genes in the same order, given by the moves of a random genotype)
+        moves = Genotype.random().moves
+        weights = np.random.randint(0, 101, size=(population_size, len(moves)))
+        counts = np.zeros_like(weights)
+        start_generation = 0
+        # running mean of the fitness and number of fitness games of the genotypes of the last evaluated generation
+        fitness_history = {}
+
+        # Resume an interrupted training from its last checkpoint
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            start_generation, moves, weights, counts, fitness_history = self.load_checkpoint(checkpoint_path)
+
+        executor = ProcessPoolExecutor(self.fitness_workers) if self.fitness_workers > 1 else None
+        try:
+            weights, counts = self.evolve(moves, weights, counts, population_size, generations, mutation_rate, executor,
+                                          start_generation, checkpoint_path, fitness_history)
+
+            # Evaluate the final population, so that the best genotype can be chosen
+            fitness_scores, played = self.evaluate_population(moves, weights, self.get_fitness_seeds(), executor,
+                                                              fitness_history)
+            counts = counts + played
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
         # Return the best genotype found in the final population
-        best_player = max(population, key=lambda player: player.fitness_score)
-        return best_player.genotype
-    
+        best = np.argmax(fitness_scores)
+        return Genotype(moves.copy(), weights[best].copy(), counts[best].copy())
+
+    @staticmethod
+    def save_checkpoint(path, generation, moves, weights, counts, fitness_history):
+        # the state of the NumPy generator and the fitness history are saved too, so that the resumed training gives the
+        # same result
+        _, keys, position, has_gauss, cached_gaussian = np.random.get_state()
+        history_weights = np.array([np.frombuffer(key, dtype=np.int64) for key in fitness_history], dtype=np.int64).reshape(-1, len(moves))
+        history = np.array(list(fitness_history.values()), dtype=np.float64).reshape(-1, 2)
+        _save_arrays(path, generation=np.int64(generation), moves=moves.astype(np.int8), weights=weights, counts=counts,
+                     rng_keys=keys, rng_state=np.array([position, has_gauss]), rng_gaussian=np.float64(cached_gaussian),
+                     history_weights=history_weights, history=history)
+
     @staticmethod
+    def load_checkpoint(path):
+        # returns the number of generations already evolved, the moves, the weights and the counts of the population,
+        # and the fitness history
+        with np.load(path) as data:
+            position, has_gauss = data['rng_state']
+            np.random.set_state(('MT19937', data['rng_keys'], int(position), int(has_gauss), float(data['rng_gaussian'])))
+            fitness_history = {row.tobytes(): (float(fitness), int(games))
+                               for row, (fitness, games) in zip(data['history_weights'].astype(np.int64), data['history'])}
+            return int(data['generation']), data['moves'].astype(np.int64), data['weights'].astype(np.int64), \
+                data['counts'].astype(np.int64), fitness_history
+
+    def evolve(self, moves, weights, counts, population_size, generations, mutation_rate, executor=None, start_generation=0,
+               checkpoint_path=None, fitness_history=None):
+        # Evolve the population of weights over a specified number of generations. The counts of the moves played in the
+        # fitness games are added to the counts of the individuals, and the children inherit the counts of the genes they
+        # take from each parent, so the counts accumulate over the generations as in the list-based genotypes
+        for generation in tqdm(range(start_generation, generations), desc="Evolving Generations", initial=start_generation, total=generations):
+
+            # Calculate fitness scores for each individual in the population, on new games at every generation
+            fitness_scores, played = self.evaluate_population(moves, weights, self.get_fitness_seeds(), executor,
+                                                              fitness_history)
+            counts = counts + played
+
+            # Select individuals for the mating pool based on fitness scores
+            selected = np.asarray(self.select_based_on_fitness(self, fitness_scores))
+            mating_pool, mating_counts = weights[selected], counts[selected]
+
+            # Create next generation using crossover and mutation: two distinct parents are chosen randomly
+            # from the mating pool for each child
+            pool_size = len(mating_pool)
+            parents1 = np.random.randint(0, pool_size, size=population_size)
+            parents2 = (parents1 + np.random.randint(1, pool_size, size=population_size)) % pool_size
+
+            # Perform crossover on the parents' genotypes: the counts are crossed at the same points as the weights
+            second_parent = GeneticPlayer.crossover_mask(mating_pool.shape, self.crossover_strategy)
+            children = np.where(second_parent, mating_pool[parents2], mating_pool[parents1])
+            children_counts = np.where(second_parent, mating_counts[parents2], mating_counts[parents1])
+
+            # Perform mutation on the children genotypes (only the weights are mutated, the counts stay with their genes)
+            children = GeneticPlayer.mutate(children, mutation_rate, self.mutation_strategy)
+
+            # Update the population with the new generation
+            weights, counts = children, children_counts
+
+            # Checkpoint the new generation
+            if checkpoint_path is not None:
+                self.save_checkpoint(checkpoint_path, generation + 1, moves, weights, counts,
+                                     fitness_history if fitness_history is not None else {})
+
+        return weights, counts
+
+    def get_fitness_seeds(self):
+        # One seed for each fitness game, shared by all the individuals of a generation. They are drawn from the NumPy
+        # generator of the training, so they are reproducible with a seed and restored with a checkpoint
+        return [int(s) for s in np.random.randint(0, 2 ** 31, size=self.fitness_games)]
+
+    def evaluate_population(self, moves, weights, fitness_seeds, executor=None, fitness_history=None):
+        # Returns the fitness scores and the counts of the moves played in the fitness games by the population, given as a
+        # 2-D array of weights.
+        # The fitness only depends on the weights of the genotype (the counts are not used to choose the moves during
+        # the fitness games), so the individuals with the same weights are evaluated only once.
+        # fitness_history maps the weights of the genotypes of the previous generation to their running mean fitness and
+        # number of games: a genotype carried unchanged into this generation adds the games of fitness_seeds to its mean
+        # instead of starting again, so its fitness is measured on more games. The history is updated in place and keeps
+        # only the genotypes of this generation
+        keys = [row.astype(np.int64).tobytes() for row in weights]
+        to_evaluate = {}
+        for key, row in zip(keys, weights):
+            if key not in to_evaluate:
+                to_evaluate[key] = Genotype(moves, row)
+
+        genotypes = list(to_evaluate.values())
+        if executor is None:
+            results = [_evaluate_genotype(genotype, fitness_seeds) for genotype in tqdm(genotypes, desc="Fitness Eval", leave=False)]
+        else:
+            results = list(executor.map(_evaluate_genotype, genotypes, repeat(fitness_seeds)))
+
+        # the evaluated genotypes have the counts of the moves played in the games, their fitness is averaged with the
+        # fitness of their previous games
+        games = len(fitness_seeds)
+        previous = fitness_history if fitness_history is not None else {}
+        evaluated, history = {}, {}
+        for key, (fitness, genotype) in zip(to_evaluate, results):
+            mean, played = previous.get(key, (0.0, 0))
+            history[key] = ((mean * played + fitness * games) / (played + games), played + games)
+            evaluated[key] = (history[key][0], genotype.counts)
+        if fitness_history is not None:
+            fitness_history.clear()
+            fitness_history.update(history)
+
+        fitness_scores = np.array([evaluated[key][0] for key in keys])
+        counts = np.array([evaluated[key][1] for key in keys]).reshape(weights.shape)
+        return fitness_scores, counts
+
+    @staticmethod 
     def select_based_on_fitness(self, fitness_scores):
         # Check the selection strategy
         if self.selection_strategy == 'roulette_wheel':
             # Calculate total fitness and ensure it's not zero
-            total_fitness = sum(fitness_scores)
+            fitness_scores = np.asarray(fitness_scores, dtype=float)
+            total_fitness = fitness_scores.sum()
+
+            # Calculate selection probabilities based on fitness scores (uniform if no individual has won a game)
             if total_fitness == 0:
-                total_fitness = 1
-            
-            # Calculate selection probabilities based on fitness scores
-            selection_probs = [f / total_fitness for f in fitness_scores]
-            
+                selection_probs = np.full(len(fitness_scores), 1 / len(fitness_scores))
+            else:
+                selection_probs = fitness_scores / total_fitness
+
             # Select indices based on roulette wheel selection
             best_indices = np.random.choice(len(fitness_scores), size=len(fitness_scores), replace=True, p=selection_probs)
             return best_indices
-        
+
         if self.selection_strategy == 'tournament_selection':
-            # Initialize lists to store selected players and tournament winners
-            winners = []
+            fitness_scores = np.asarray(fitness_scores)
 
             # Set the tournament size as a percentage of the population size
-            tournament_size = int(self.population_size * 0.2)
-
-            # Perform tournament selection for the entire population
-            for _ in range(self.population_size):
-                # Randomly choose tournament indices without replacement
-                tournament_indices = np.random.choice(int(self.population_size/2), tournament_size, replace=False)
-
-                # Retrieve tournament fitness scores
-                tournament_scores = [fitness_scores[i] for i in tournament_indices]
+            tournament_size = max(1, int(self.population_size * 0.2))
 
-                # Determine the winner index based on the highest fitness score in the tournament
-                winner_index = tournament_indices[np.argmax(tournament_scores)]
-                winners.append(winner_index)
+            # Perform all the tournaments at once: the participants of each tournament are drawn without replacement
+            # by taking the first tournament_size indices of a random permutation of the candidates
+            candidates = int(self.population_size/2)
+            tournament_indices = np.argsort(np.random.random((self.population_size, candidates)), axis=1)[:, :tournament_size]
 
-            return winners
\ No newline at end of file
+            # Determine the winner index based on the highest fitness score in each tournament
+            winners = tournament_indices[np.arange(self.population_size), np.argmax(fitness_scores[tournament_indices], axis=1)]
+            return winners
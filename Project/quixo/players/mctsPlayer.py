@@ -0,0 +1,285 @@
+#################### MCTS Player #################### MCTS Player #################### MCTS Player #################### MCTS Player #################### MCTS Player
+import math
+import random
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from game import Game, Move, Player
+import bitboard
+import movegen
+import tactics
+
+# The MCTSPlayer chooses its moves with Monte Carlo Tree Search (UCT).
+# For every move it grows a search tree from the current position by repeating many playouts: starting from the root,
+# the children are selected with the UCB1 formula (balancing the win rate of a move and how little it has been tried)
+# until a node with untried moves is reached, one of them is expanded and the game is completed from there with a
+# rollout; the result of the rollout is then propagated back to all the nodes of the path.
+# Finally the move of the root that has been visited the most is played.
+# The whole search runs on the bitboards (see bitboard.py), so neither the tree nodes nor the rollouts copy a board.
+# A node whose player can win in one move only has that move to expand, so the search doesn't waste playouts on the
+# alternatives and proves won (and lost) positions quickly.
+# Rollouts can be random or heuristic: the heuristic policy samples a few legal moves and plays a winning one if there is
+# one among them, otherwise the one that maximizes the sum of the squared counts of the pieces of the player on every line
+# (as the score of MinMaxPlayer). Scoring every legal move would make a rollout several times slower than a random one.
+# The subtree of the move played is kept and reused for the next move, if the opponent's answer had been explored.
+# With workers > 1 the search is root-parallel: every worker process grows an independent tree from the same position,
+# the visits and wins of the root moves are summed over all the trees and the move with the most visits is chosen.
+# The search of a move stops after the given number of playouts (per tree) or when time_limit seconds have passed.
+
+ROLLOUT_POLICIES = ('random', 'heuristic')
+
+# Rollouts longer than this are stopped and counted as draws
+MAX_ROLLOUT_MOVES = 200
+
+# Legal moves scored at every move of a heuristic rollout
+HEURISTIC_SAMPLES = 6
+
+def _random_rollout(bitboards, player_id, rng, max_moves):
+    # plays random moves until the end of the game, returns the winner (-1 if the game was stopped)
+    for _ in range(max_moves):
+        bitboards = bitboard.apply_move(bitboards, rng.choice(movegen.legal_move_indices(bitboards, player_id)), player_id)
+        winner = bitboard.check_winner(bitboards)
+        if winner >= 0:
+            return winner
+        player_id = 1 - player_id
+    return -1
+
+
+def _heuristic_rollout(bitboards, player_id, rng, max_moves):
+    # among a few random legal moves, plays a winning one if there is one, otherwise the one that maximizes the line
+    # score of the player
+    for _ in range(max_moves):
+        best_score, best_bitboards = -1, None
+        legal = movegen.legal_move_indices(bitboards, player_id)
+        for index in rng.sample(legal, HEURISTIC_SAMPLES) if len(legal) > HEURISTIC_SAMPLES else legal:
+            new_bitboards = bitboard.apply_move(bitboards, index, player_id)
+            counts = bitboard.line_counts(new_bitboards[player_id])
+            if bitboard.has_full_line(counts) and bitboard.check_winner(new_bitboards) == player_id:
+                return player_id
+            # ties are broken randomly, so that the rollouts of the same position don't all follow the same game
+            score = tactics.line_score(counts) + rng.random()
+            if score > best_score:
+                best_score, best_bitboards = score, new_bitboards
+        bitboards = best_bitboards
+        winner = bitboard.check_winner(bitboards)
+        if winner >= 0:
+            return winner
+        player_id = 1 - player_id
+    return -1
+
+
+_ROLLOUTS = {'random': _random_rollout, 'heuristic': _heuristic_rollout}
+
+
+def _moves_to_expand(bitboards, player_id):
+    # the legal moves of the position, or only a winning one if the player can win in one move
+    legal = movegen.legal_move_indices(bitboards, player_id)
+    for index in legal:
+        new_bitboards = bitboard.apply_move(bitboards, index, player_id)
+        if bitboard.has_full_line(bitboard.line_counts(new_bitboards[player_id])) \
+                and bitboard.check_winner(new_bitboards) == player_id:
+            return [index]
+    return list(legal)
+
+
+class _Node(object):
+    __slots__ = ('bitboards', 'player_id', 'parent', 'move', 'children', 'untried', 'visits', 'wins', 'winner')
+
+    def __init__(self, bitboards, player_id, parent=None, move=-1):
+        self.bitboards = bitboards              # position of the node
+        self.player_id = player_id              # player to move in the position
+        self.parent = parent
+        self.move = move                        # index of the move that led from the parent to this node
+        self.children = {}                      # index of the move -> child node
+        self.winner = bitboard.check_winner(bitboards)
+        self.untried = _moves_to_expand(bitboards, player_id) if self.winner < 0 else []
+        self.visits = 0
+        self.wins = 0.0                         # wins of the player that made the move (1 - player_id), draws count 1/2
+
+
+def _search(root, rng, playouts, deadline, exploration, rollout, max_rollout_moves):
+    # grows the tree of root, returns the number of playouts done
+    done = 0
+    while done < playouts:
+        if deadline is not None and done % 16 == 0 and time.perf_counter() >= deadline:
+            break
+        node = root
+
+        # selection: descend through fully expanded nodes with UCB1
+        while not node.untried and node.children:
+            log_visits = math.log(node.visits)
+            best_value = -1.0
+            for child in node.children.values():
+                value = child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits)
+                if value > best_value:
+                    best_value, best_child = value, child
+            node = best_child
+
+        # expansion: add one of the untried moves
+        if node.untried:
+            move = node.untried.pop(rng.randrange(len(node.untried)))
+            child = _Node(bitboard.apply_move(node.bitboards, move, node.player_id), 1 - node.player_id, node, move)
+            node.children[move] = child
+            node = child
+
+        # simulation
+        winner = node.winner if node.winner >= 0 else rollout(node.bitboards, node.player_id, rng, max_rollout_moves)
+
+        # backpropagation: every node is credited from the point of view of the player that moved into it
+        while node is not None:
+            node.visits += 1
+            if winner < 0:
+                node.wins += 0.5
+            elif winner != node.player_id:
+                node.wins += 1
+            node = node.parent
+        done += 1
+    return done
+
+
+def _root_statistics(root):
+    return [(move, child.visits, child.wins) for move, child in root.children.items()]
+
+
+def _count_nodes(root):
+    count, stack = 0, [root]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children.values())
+    return count
+
+
+# Search of a worker process of the root-parallel search: an independent tree from the same position
+def _search_worker(bitboards, player_id, seed, playouts, time_limit, exploration, rollout_policy, max_rollout_moves):
+    deadline = time.perf_counter() + time_limit if time_limit is not None else None
+    root = _Node(bitboards, player_id)
+    done = _search(root, random.Random(seed), playouts, deadline, exploration, _ROLLOUTS[rollout_policy], max_rollout_moves)
+    return _root_statistics(root), done
+
+
+class MCTSPlayer(Player):
+    def __init__(self, playouts=1000, time_limit=None, exploration=1.4, rollout_policy='random', reuse_tree=True,
+                 workers=1, max_rollout_moves=MAX_ROLLOUT_MOVES, seed=None) -> None:
+        '''
+        playouts: playouts per move (for each tree), None for no limit
+        time_limit: seconds per move, None for no limit (at least one of the two budgets must be given)
+        exploration: constant of the exploration term of UCB1
+        rollout_policy: 'random' or 'heuristic'
+        reuse_tree: keep the subtree of the move played for the next move
+        workers: number of trees searched in parallel (the player's own tree and workers - 1 processes)
+        '''
+        super().__init__()
+        if rollout_policy not in ROLLOUT_POLICIES:
+            raise ValueError(f"Unknown rollout policy: {rollout_policy}")
+        if playouts is None and time_limit is None:
+            raise ValueError("MCTSPlayer needs a playout budget, a time limit or both")
+        self.playouts = playouts
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.rollout_policy = rollout_policy
+        self.reuse_tree = reuse_tree
+        self.workers = workers
+        self.max_rollout_moves = max_rollout_moves
+        # a private generator, seeded from the global one if no seed is given, so that seeding the random module
+        # (as the tournaments do) makes the player reproducible
+        self._rng = random.Random(seed if seed is not None else random.getrandbits(64))
+        self._root = None
+        self._executor = None
+        self._finalizer = None
+        self.last_search = {}
+        # counters of all the searches (see counters)
+        self.total_playouts = 0
+        self.tree_hits = 0
+        self.tree_misses = 0
+
+    def make_move(self, game: 'Game') -> 'tuple[tuple[int, int], Move]':
+        bitboards = game.get_bitboards()
+        player_id = game.get_current_player()
+        start = time.perf_counter()
+        deadline = start + self.time_limit if self.time_limit is not None else None
+        playouts = self.playouts if self.playouts is not None else math.inf
+
+        # reuse the subtree of the current position, if it was explored while searching the previous move
+        root = self.find_subtree(bitboards, player_id)
+        reused = root is not None
+        if root is None:
+            root = _Node(bitboards, player_id)
+        root.parent = None
+
+        # the workers start their searches first, then this process grows its own tree
+        futures = []
+        if self.workers > 1:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self.workers - 1)
+                # the workers are stopped when the player is garbage collected or at exit, if close() isn't called
+                self._finalizer = weakref.finalize(self, self._executor.shutdown)
+            futures = [self._executor.submit(_search_worker, bitboards, player_id, self._rng.getrandbits(64), playouts,
+                                             self.time_limit, self.exploration, self.rollout_policy, self.max_rollout_moves)
+                       for _ in range(self.workers - 1)]
+        done = _search(root, self._rng, playouts, deadline, self.exploration, _ROLLOUTS[self.rollout_policy], self.max_rollout_moves)
+
+        # merge the statistics of the root moves of all the trees
+        visits = {}
+        for move, child_visits, _ in _root_statistics(root):
+            visits[move] = visits.get(move, 0) + child_visits
+        for future in futures:
+            statistics, worker_done = future.result()
+            done += worker_done
+            for move, child_visits, _ in statistics:
+                visits[move] = visits.get(move, 0) + child_visits
+
+        # play the most visited move (any legal move if the budget didn't allow a single playout)
+        if visits:
+            move = max(visits, key=visits.get)
+        else:
+            move = movegen.legal_move_indices(bitboards, player_id)[0]
+
+        self.total_playouts += done
+        if reused:
+            self.tree_hits += 1
+        else:
+            self.tree_misses += 1
+        self.last_search = {"playouts": done, "nodes": _count_nodes(root), "reused": reused,
+                            "seconds": time.perf_counter() - start, "visits": visits.get(move, 0)}
+        self._root = root.children.get(move) if self.reuse_tree else None
+        return movegen.BORDER_MOVES[move]
+
+    def counters(self):
+        # playouts of this process and of the workers, and how often the tree of the previous move was reused
+        return {"playouts": self.total_playouts, "tree_hits": self.tree_hits, "tree_misses": self.tree_misses}
+
+    def find_subtree(self, bitboards, player_id):
+        # the tree kept after the previous move has the position reached by our move as root: the current position is
+        # one of its children (the answer of the opponent), if it has been expanded
+        root = self._root
+        self._root = None
+        if root is None:
+            return None
+        if root.bitboards == bitboards and root.player_id == player_id:
+            return root
+        for child in root.children.values():
+            if child.bitboards == bitboards and child.player_id == player_id:
+                return child
+        return None
+
+    def close(self) -> None:
+        '''Stops the worker processes of the root-parallel search'''
+        if self._executor is not None:
+            self._finalizer()
+            self._executor = None
+            self._finalizer = None
+
+    def __enter__(self) -> 'MCTSPlayer':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __getstate__(self):
+        # the pool of workers and the search tree are not sent to other processes (nor copied)
+        state = self.__dict__.copy()
+        state['_executor'] = None
+        state['_finalizer'] = None
+        state['_root'] = None
+        return state
@@ -1,67 +1,294 @@
 #################### MinMax Player #################### MinMax Player #################### MinMax Player #################### MinMax Player #################### MinMax Player 
 from game import Player, Game, Move
 from simulatedgame import SimulatedGame
+import movegen
+import bitboard
+from bitboard import BOARD_SIZE
+import transposition
+import openingbook
+import tactics
+from transposition import TranspositionTable
+import multiprocessing
 import random
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
 
 # The MinMaxPlayer is designed to make strategic decisions by intelligently exploring the game tree using the Minimax algorithm 
 # while incorporating a heuristic evaluation function to guide its decision-making process.
 # The heuristic evaluation function is based on the optimalPlayer strategy for the evaluation of the score
 # For each possible move a tree is generated alternating 
+# With a time_limit (seconds) or a node_limit the player works in anytime mode: the tree is searched with iterative deepening
+# (depth 1, 2, ... up to depth) and the best move of the last completed iteration is returned when the budget runs out
+# If the file of an opening book is given (see openingbook.py), in the first plies of the game the move is taken from it
+# With move_ordering the moves of every node are searched in the order that is most likely to cause an early cutoff: the
+# move of the transposition table and of the principal variation, the immediate wins, the moves that can break a line with
+# 4 pieces of the opponent, the killer moves of the ply (the last moves that caused a cutoff at the same depth of the
+# tree) and then all the others by their history score (how often and how deep they caused cutoffs). last_search reports
+# the cutoff ratio, the fraction of the cutoffs made by the first move searched (1.0 means a perfect ordering)
+# The tree is searched by negamax with principal variation search, and every iteration of iterative deepening starts with
+# an aspiration window of +/- aspiration_window around the value of the previous iteration
+# With workers > 1 the search is parallel (Lazy SMP): the transposition table is allocated in shared memory and workers - 1
+# helper processes search the same position at the same time as the player, each one breaking the ties of the move
+# ordering in its own random order. The helpers don't return moves: what they store in the shared table lets the search of
+# the player skip or cut the subtrees they have already searched. They stop as soon as the player's search is over.
+# The parallel search is not deterministic, since the results depend on the timing of the processes
+
+# Width of the null windows of the principal variation search: the scores are multiples of 0.5
+NULL_WINDOW = 0.5
+
+# Raised inside the search when the time or node budget of the move is exhausted
+class SearchTimeout(Exception):
+    pass
+
 class MinMaxPlayer(Player):
-    def __init__(self, depth=3):
+    def __init__(self, depth=3, use_transposition_table=True, tt_memory_mb=16, tt_replacement='depth', time_limit=None, node_limit=None,
+                 opening_book=None, move_ordering=True, aspiration_window=5, workers=1):
         super().__init__()
+        if workers > 1 and not use_transposition_table:
+            raise ValueError("The parallel search of MinMaxPlayer needs the transposition table")
         self.depth = depth
         self.new_game = None
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.opening_book = opening_book        # file of the opening book (e.g. openingbook.BOOK_PATH), None to always search
+        self.move_ordering = move_ordering      # False searches the moves in raster order (after the TT and PV moves)
+        self.aspiration_window = aspiration_window      # None searches every iteration with the full window
+        self.workers = workers                  # processes of the parallel search (the player and workers - 1 helpers)
+        # search state: visited nodes, budget of the current iteration and principal variation (best line of moves)
+        self.nodes = 0
+        self._deadline = None
+        self._max_nodes = None
+        self._root_depth = depth
+        self._pv = {}
+        self._prev_pv = []
+        self._on_pv = False
+        self._root_player = 0       # the maximizer, i.e. the player that is searching its move
+        self.researches = 0
+        self.aspiration_researches = 0
+        self.last_search = {}
+        # move ordering: two killer moves for each ply and a history score for each player and move
+        self._killers = []
+        self._history = [[0] * len(bitboard.MOVES) for _ in range(2)]
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        # counters of all the searches of the player (see counters)
+        self.total_nodes = 0
+        self.simulated_moves = 0
+        self.board_copies = 0
+        self.book_hits = 0
+        self.book_misses = 0
+        # parallel search: pool of helper processes, event that stops them, and (in a helper) the event to check and
+        # the generator that shuffles the move ordering
+        self._executor = None
+        self._finalizer = None
+        self._stop_event = None
+        self._stop = None
+        self._shuffle = None
+        # Transposition table shared by all the searches of this player, so that positions already searched in
+        # a previous move (or reached with a different order of moves, or symmetric) are not searched again
+        self.tt_memory_mb = tt_memory_mb
+        self.tt_replacement = tt_replacement
+        self.tt = TranspositionTable(tt_memory_mb, tt_replacement, shared=workers > 1) if use_transposition_table else None
+        self.tt_player_id = None
     
     # Recursive function that implements the MinMax algorithm (tree generation, leaf evaluation, back propagation e move selection)
-    # maximazing is a flag that indicates if we are in the maximazing player or in the minimazing (we start as maximazier) 
-    def alphabeta(self, simgame: 'SimulatedGame', alpha, beta, depth, player_id, maximazing = True):
+    # in its negamax form: the value of a node is seen by the player to move, so the value of a child is the opposite of the
+    # value it has for the opponent and the same code serves both players (the maximizer is the root player)
+    # Principal variation search: the first move is searched with the full window (alpha, beta), the following ones with a
+    # null window that only tells whether they are better than alpha, and only the few that are get searched again
+    # hashes are the Zobrist hashes of the position (see transposition.py), updated incrementally along the tree
+    def negamax(self, simgame: 'SimulatedGame', alpha, beta, depth, player_id, hashes = None):
+        self.nodes += 1
+        # check the budget of the move (the clock is read only once every 128 nodes)
+        if self._max_nodes is not None and self.nodes >= self._max_nodes:
+            raise SearchTimeout()
+        if self._deadline is not None and self.nodes & 127 == 0 and time.perf_counter() >= self._deadline:
+            raise SearchTimeout()
+        if self._stop is not None and self.nodes & 127 == 0 and self._stop.is_set():
+            raise SearchTimeout()
+        ply = self._root_depth - depth
+        self._pv[ply] = []
+        on_pv = self._on_pv
+
         endGame = simgame.check_winner() != -1      # check if we arrived to a winning state of the board
         if endGame == True or depth == 0:
-            score = self.evaluate(simgame, depth)   # Leaf valutation 
-            return score, None
-        
+            score = self.evaluate(simgame, depth)   # Leaf valutation (seen by the maximizer)
+            return (score if player_id == self._root_player else -score), None
+
+        legal_moves = movegen.legal_move_indices(simgame.get_bitboards(), player_id)
+        if self._shuffle is not None:
+            # a helper of the parallel search breaks the ties of the ordering at random, to search other subtrees first
+            legal_moves = self._shuffle.sample(legal_moves, len(legal_moves))
+        first_moves = []        # indices of the moves of the transposition table and of the principal variation
+
+        # look for the canonical position in the transposition table: a deep enough result is used directly,
+        # otherwise the stored best move is searched first
+        if self.tt is not None:
+            if hashes is None:
+                hashes = transposition.hash_position(simgame.get_bitboards(), player_id)
+            key, symmetry = transposition.canonical_key(hashes)
+            entry = self.tt.probe(key)
+            if entry is not None:
+                tt_depth, tt_flag, tt_value, tt_move_index = entry
+                tt_move = None
+                if tt_move_index >= 0:
+                    # the move is stored for the canonical position, bring it back to the actual board
+                    tt_move_index = bitboard.INVERSE_MOVE_PERMUTATIONS[symmetry][tt_move_index]
+                    tt_move = movegen.BORDER_MOVES[tt_move_index]
+                if tt_depth >= depth and (tt_flag == transposition.EXACT
+                                          or (tt_flag == transposition.LOWER and tt_value >= beta)
+                                          or (tt_flag == transposition.UPPER and tt_value <= alpha)):
+                    self._pv[ply] = [tt_move] if tt_move is not None else []
+                    return tt_value, tt_move
+                if tt_move is not None and tt_move_index in legal_moves:
+                    first_moves.append(tt_move_index)
+            alpha_orig, beta_orig = alpha, beta
+
+        # along the principal variation of the previous iteration its move is searched first
+        pv_move = None
+        if on_pv and ply < len(self._prev_pv):
+            pv_index = bitboard.move_index(*self._prev_pv[ply])
+            if pv_index in legal_moves:
+                pv_move = self._prev_pv[ply]
+                if pv_index in first_moves:
+                    first_moves.remove(pv_index)
+                first_moves.insert(0, pv_index)
+
+        if self.move_ordering:
+            possible_moves = self.order_moves(simgame, player_id, ply, first_moves, legal_moves)
+        else:
+            possible_moves = first_moves + [index for index in legal_moves if index not in first_moves]
+
         bestMove = None
-        if maximazing:       # maximizer player
-            for _move in self.get_possible_moves(simgame):
-                s = SimulatedGame(simgame.get_board(), player_id)       # create a deepcopy version of the game to simulate the moves
-                sim_from_pos, sim_slide = _move
-                s.move((sim_from_pos[0], sim_from_pos[1]), sim_slide, player_id)        # make the move
-                val, _ = self.alphabeta(s, alpha, beta, depth-1, ((player_id + 1) % 2), False)
-                if val > alpha:     # back propagation
-                    alpha = val     
-                    bestMove = _move
-                if alpha >= beta:   # pruning
-                    break
-            return alpha, bestMove
-        else:               # minimazer player
-            for _move in self.get_possible_moves(simgame):
-                s = SimulatedGame(simgame.get_board(), player_id)       # create a deepcopy version of the game to simulate the moves
-                sim_from_pos, sim_slide = _move
-                s.move((sim_from_pos[0], sim_from_pos[1]), sim_slide, player_id)        # make the move
-                val, _ = self.alphabeta(s, alpha, beta, depth-1, ((player_id + 1) % 2), True)
-                if val < beta:      # back propagation
-                    beta = val
-                    bestMove = _move
-                if alpha >= beta:   # pruning
-                    break
-            return beta, bestMove
+        best_value = float('-inf')
+        opponent_id = 1 - player_id
+        for move_number, move_index in enumerate(possible_moves):
+            _move = movegen.BORDER_MOVES[move_index]
+            board_before = simgame.get_bitboards()
+            undo = simgame.apply_move_index(move_index, player_id)        # make the move in place on the shared board
+            self.simulated_moves += 1
+            child_hashes = None if self.tt is None else transposition.update_hash(hashes, board_before, simgame.get_bitboards())
+            self._on_pv = on_pv and _move == pv_move
+            if move_number == 0:
+                val = -self.negamax(simgame, -beta, -alpha, depth - 1, opponent_id, child_hashes)[0]
+            else:
+                # null window: the move is only proved to be worse than (or as good as) the best one found so far
+                val = -self.negamax(simgame, -alpha - NULL_WINDOW, -alpha, depth - 1, opponent_id, child_hashes)[0]
+                if alpha < val < beta:
+                    # the move is better, its exact value needs a search with the full window
+                    self.researches += 1
+                    self._on_pv = on_pv and _move == pv_move
+                    val = -self.negamax(simgame, -beta, -alpha, depth - 1, opponent_id, child_hashes)[0]
+            simgame.undo_move(undo)     # restore the board before trying the next move
+            if val > best_value:
+                best_value = val
+            if val > alpha:     # back propagation
+                alpha = val
+                bestMove = _move
+                self._pv[ply] = [_move] + self._pv.get(ply + 1, [])
+            if alpha >= beta:   # pruning
+                self.record_cutoff(ply, depth, player_id, move_index, move_number)
+                break
+        value = best_value      # fail-soft: a value outside the window is a tighter bound to store in the table
+
+        # store the result with its bound type: a value outside the original window is only a bound of the real one
+        if self.tt is not None:
+            if value <= alpha_orig:
+                flag = transposition.UPPER
+            elif value >= beta_orig:
+                flag = transposition.LOWER
+            else:
+                flag = transposition.EXACT
+            move_index = -1
+            if bestMove is not None:
+                move_index = bitboard.MOVE_PERMUTATIONS[symmetry][bitboard.move_index(*bestMove)]
+            self.tt.store(key, depth, flag, value, move_index)
+        return value, bestMove
+
+    # Search of the root with an aspiration window: the value of the previous iteration of iterative deepening is a good
+    # guess of the new one, so the root is searched with a narrow window around it, which prunes much more than the full
+    # window. If the value falls outside the window, the search is repeated with that side of the window opened
+    def aspiration_search(self, simgame: 'SimulatedGame', depth, player_id, guess):
+        if guess is None or self.aspiration_window is None:
+            return self.negamax(simgame, float('-inf'), float('inf'), depth, player_id)
+        alpha, beta = guess - self.aspiration_window, guess + self.aspiration_window
+        while True:
+            self._on_pv = True
+            value, move = self.negamax(simgame, alpha, beta, depth, player_id)
+            if value <= alpha:
+                alpha = float('-inf')
+            elif value >= beta:
+                beta = float('inf')
+            else:
+                return value, move
+            self.aspiration_researches += 1
+
+    # Order of the legal moves (indices in the move table) of player_id at the given ply: first_moves (the TT and PV moves)
+    # first, then the immediate wins, the moves that cross a line with 4 pieces of the opponent (the only ones that can
+    # block it), the killer moves of the ply and all the others by decreasing history score
+    def order_moves(self, simgame: 'SimulatedGame', player_id, ply, first_moves, legal_moves):
+        bitboards = simgame.get_bitboards()
+        ordered = list(first_moves)
+        candidates = tactics.winning_moves(bitboards, player_id, simgame.get_packed_line_counts(player_id)) \
+            + tactics.blocking_moves(bitboards, player_id, simgame.get_packed_line_counts(1 - player_id)) \
+            + [killer for killer in self._killers[ply] if killer in legal_moves]
+        for index in candidates:
+            if index not in ordered:
+                ordered.append(index)
+        # sorted is stable, so the moves with the same history score stay in raster order
+        history = self._history[player_id]
+        ordered += sorted((index for index in legal_moves if index not in ordered), key=history.__getitem__, reverse=True)
+        return ordered
+
+    # Bookkeeping of a cutoff made by the move_number-th move searched: it becomes the first killer of the ply and its
+    # history score grows with the square of the remaining depth, since cutoffs near the root save larger subtrees
+    def record_cutoff(self, ply, depth, player_id, move_index, move_number):
+        self.cutoffs += 1
+        if move_number == 0:
+            self.first_move_cutoffs += 1
+        if self.move_ordering:
+            killers = self._killers[ply]
+            if killers[0] != move_index:
+                killers[1] = killers[0]
+                killers[0] = move_index
+            self._history[player_id][move_index] += depth * depth
+
+    # Resets the statistics and the killer moves before the search of a move, the history scores of the previous
+    # searches are halved so that they still guide the first iterations without outweighing the new cutoffs
+    def start_search(self):
+        self.nodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.researches = 0
+        self.aspiration_researches = 0
+        self._killers = [[-1, -1] for _ in range(self.depth + 1)]
+        for history in self._history:
+            for index in range(len(history)):
+                history[index] >>= 1
+
+    # Statistics of the last search, reported in last_search
+    def search_stats(self, depth, start):
+        return {"depth": depth, "nodes": self.nodes, "time": time.perf_counter() - start, "cutoffs": self.cutoffs,
+                "cutoff_ratio": self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0,
+                "researches": self.researches, "aspiration_researches": self.aspiration_researches}
 
     # Adapting evaluate function from the optimalPlayer code
     # prioioritize the move that lead you to a state in which you have 4 consecutive pieces e no opponent piece in at least one row, colum or diagonal
     # increasing the score using the count variable (number of rows, columns, diagonal and anti diagonal in priority state) 
     def evaluate(self, simgame: 'SimulatedGame', depth):
         endGame = simgame.check_winner()
-        if endGame == 0:  # Maximizer won
+        if endGame == self._root_player:  # Maximizer won
             return 100 + depth
-        elif endGame == 1:  # Minimizer won
+        elif endGame == 1 - self._root_player:  # Minimizer won
             return -100 - depth
         else:
             score = 0                               
-            board = simgame.get_board()
             player_id = simgame.get_current_player()
 
-            results = self.check_board(board, player_id)        # count the pieces of the player_id
+            # count the pieces of the player_id: the simulated game keeps the counts of every line up to date,
+            # so there is no need to scan the board
+            results = simgame.get_line_counts(player_id)
 
             num_elements_rows, num_elements_columns, num_elements_diagonal, num_elements_anti_diagonal = results[0]
 
@@ -72,19 +299,19 @@ class MinMaxPlayer(Player):
 
             # count the number of rows, columns, diagonl and anti diagonal 
             # that are in a state in which we have 4 consecutive pieces of the player_id and no opponent piece
-            for i in range(board.shape[0]):
-                if num_elements_rows[i] == board.shape[0] - 1 and opponent_rows[i] == 0:
+            for i in range(BOARD_SIZE):
+                if num_elements_rows[i] == BOARD_SIZE - 1 and opponent_rows[i] == 0:
                     count += 1
-                if num_elements_columns[i] == board.shape[0] - 1 and opponent_columns[i] == 0:
+                if num_elements_columns[i] == BOARD_SIZE - 1 and opponent_columns[i] == 0:
                     count += 1
 
-            if num_elements_diagonal == board.shape[0] - 1 and opponent_diagonal == 0:
+            if num_elements_diagonal == BOARD_SIZE - 1 and opponent_diagonal == 0:
                 count += 1
-            if num_elements_anti_diagonal == board.shape[0] - 1 and opponent_anti_diagonal == 0:
+            if num_elements_anti_diagonal == BOARD_SIZE - 1 and opponent_anti_diagonal == 0:
                 count += 1
            
             # evaluate the score as the sum of the product of the element for each row, column, diagonal and anti diagonal
-            for i in range(board.shape[0]):
+            for i in range(BOARD_SIZE):
                 score += (num_elements_rows[i] * num_elements_rows[i])
                 score += (num_elements_columns[i] * num_elements_columns[i])
                 
@@ -98,45 +325,32 @@ class MinMaxPlayer(Player):
 
             return score
 
-    # function that count every piece of player_id along the board
-    def check_board(self, board, player_id):
-        opponent_id = (player_id + 1) % 2
-
-        num_elements_rows = [0] * board.shape[0]
-        opponent_rows = [0] * board.shape[0]
-        opponent_columns = [0] * board.shape[0]
-        num_elements_columns = [0] * board.shape[0]
-        num_elements_diagonal = 0
-        opponent_diagonal = 0
-        opponent_anti_diagonal = 0
-        num_elements_anti_diagonal = 0
-        
-        for i in range(board.shape[0]):
-            for j in range(board.shape[0]):
-                if board[i, j] == player_id:
-                    num_elements_rows[i] += 1
-                    num_elements_columns[j] += 1
-                    if i == j:
-                        num_elements_diagonal += 1
-                    if i + j == board.shape[0] - 1:
-                        num_elements_anti_diagonal += 1
-                elif board[i, j] == opponent_id:
-                    opponent_rows[i] += 1
-                    opponent_columns[j] += 1
-                    if i == j:
-                        opponent_diagonal += 1
-                    if i + j == board.shape[0] - 1:
-                        opponent_anti_diagonal += 1
-
-        results = []
-        results.append((num_elements_rows, num_elements_columns, num_elements_diagonal, num_elements_anti_diagonal))
-        results.append((opponent_rows, opponent_columns, opponent_diagonal, opponent_anti_diagonal))
-
-        return results
 
     def make_move(self, game: 'Game') -> 'tuple[tuple[int, int], Move]':
-        simulated = SimulatedGame(game.get_board(), game.get_current_player())
-        _, best_move = self.alphabeta(simulated, float('-inf'), float('inf'), self.depth, game.get_current_player())
+        # the positions of the opening book have already been searched offline (at least as deeply as this player would)
+        if self.opening_book is not None:
+            book_move = openingbook.lookup(game.get_bitboards(), game.get_current_player(), self.opening_book,
+                                           min_depth=self.depth)
+            if book_move >= 0:
+                self.book_hits += 1
+                self.last_search = {"depth": 0, "nodes": 0, "time": 0.0, "book": True}
+                return movegen.BORDER_MOVES[book_move]
+            self.book_misses += 1
+        # the whole search is made on this single board with apply_move/undo_move
+        simulated = SimulatedGame.from_bitboards(game.get_bitboards(), game.get_current_player())
+        self.board_copies += 1
+        if self.tt is not None:
+            # the stored values are relative to the maximizer, so they can't be reused if the player changes side
+            if self.tt_player_id != game.get_current_player():
+                self.tt.clear()
+                self.tt_player_id = game.get_current_player()
+            self.tt.new_search()
+        self.start_search()
+        helpers = self.start_helpers(game) if self.workers > 1 else []
+        best_move = self.search(simulated, game.get_current_player())
+        if helpers:
+            self.stop_helpers(helpers)
+        self.total_nodes += self.nodes + self.last_search.get("helper_nodes", 0)
         if best_move is not None:
             best_from_pos, best_direction = best_move
         else:
@@ -145,14 +359,144 @@ class MinMaxPlayer(Player):
 
         return best_from_pos, best_direction
 
-    # get the list of all the possible moves
-    def get_possible_moves(self, simgame: 'SimulatedGame'):
-        possible_moves = []
-        for x in range(5):
-            for y in range(5):
-                for direction in [Move.TOP, Move.BOTTOM, Move.LEFT, Move.RIGHT]:
-                    simulated = SimulatedGame(simgame.get_board(),simgame.get_current_player())
-                    ok = simulated.move((x, y), direction, simgame.get_current_player())
-                    if ok:
-                        possible_moves.append(((x, y), direction))
-        return possible_moves
\ No newline at end of file
+    # Counters of the work made by the player (see Player.counters): nodes (including the helpers of the parallel search),
+    # moves made on the simulated board, boards copied into a SimulatedGame, hits of the transposition table and of the
+    # opening book
+    def counters(self):
+        counters = {"nodes": self.total_nodes, "simulated_moves": self.simulated_moves, "board_copies": self.board_copies}
+        if self.tt is not None:
+            counters.update(tt_hits=self.tt.hits, tt_misses=self.tt.misses)
+        if self.opening_book is not None:
+            counters.update(book_hits=self.book_hits, book_misses=self.book_misses)
+        return counters
+
+    # Search of the best move of player_id: a single search of the given depth, or iterative deepening with a budget
+    def search(self, simgame: 'SimulatedGame', player_id):
+        self._root_player = player_id
+        if self.time_limit is None and self.node_limit is None:
+            self._root_depth = self.depth
+            self._on_pv = False
+            start = time.perf_counter()
+            value, best_move = self.negamax(simgame, float('-inf'), float('inf'), self.depth, player_id)
+            self.last_search = self.search_stats(self.depth, start)
+            self.last_search["value"] = value
+            return best_move
+        return self.iterative_deepening(simgame, player_id)
+
+    # Starts the searches of the helper processes on the position of the game, with the shared transposition table
+    def start_helpers(self, game: 'Game'):
+        if self._executor is None:
+            self._stop_event = multiprocessing.Event()
+            self._executor = ProcessPoolExecutor(self.workers - 1, initializer=_init_helper, initargs=(self._stop_event,))
+            # the helpers are stopped when the player is garbage collected or at exit, if close() isn't called
+            self._finalizer = weakref.finalize(self, self._executor.shutdown)
+        self._stop_event.clear()
+        settings = {"depth": self.depth, "tt_memory_mb": self.tt_memory_mb, "tt_replacement": self.tt_replacement,
+                    "time_limit": self.time_limit, "node_limit": self.node_limit, "move_ordering": self.move_ordering,
+                    "aspiration_window": self.aspiration_window}
+        return [self._executor.submit(_helper_search, settings, self.tt.name, self.tt.age, game.get_bitboards(),
+                                      game.get_current_player(), self.tt.age * self.workers + helper)
+                for helper in range(self.workers - 1)]
+
+    # Stops the helpers and adds their nodes to the statistics of the search
+    def stop_helpers(self, helpers):
+        self._stop_event.set()
+        helper_nodes = sum(helper.result() for helper in helpers)
+        self.last_search["helper_nodes"] = helper_nodes
+        self.last_search["nodes_per_second"] = (self.last_search["nodes"] + helper_nodes) / max(self.last_search["time"], 1e-9)
+
+    def close(self) -> None:
+        '''Stops the helper processes of the parallel search'''
+        if self._executor is not None:
+            self._finalizer()
+            self._executor = None
+            self._finalizer = None
+
+    def __enter__(self) -> 'MinMaxPlayer':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __getstate__(self):
+        # the pool of helpers is not sent to other processes (nor copied), a copy starts its own helpers
+        state = self.__dict__.copy()
+        state['_executor'] = None
+        state['_finalizer'] = None
+        state['_stop_event'] = None
+        return state
+
+    # Anytime search: iterative deepening from depth 1 up to self.depth that stops when the time or node budget is over.
+    # Every iteration searches first the principal variation of the previous one, and the best move of the last
+    # completed iteration is returned
+    def iterative_deepening(self, simgame: 'SimulatedGame', player_id):
+        start = time.perf_counter()
+        self._prev_pv = []
+        root = simgame.snapshot()
+        best_move = None
+        values = {}     # value of the root at each completed depth
+        completed_depth = 0
+        for depth in range(1, self.depth + 1):
+            # the first iteration is always completed, so that there is always a move to return
+            if depth > 1:
+                self._deadline = None if self.time_limit is None else start + self.time_limit
+                self._max_nodes = None if self.node_limit is None else self.node_limit
+            self._root_depth = depth
+            self._on_pv = True
+            try:
+                # the leaves are scored for the player that made the last move, so the values of consecutive depths
+                # swing between the two players: the window is centered on the value of the last depth of the same parity
+                value, move = self.aspiration_search(simgame, depth, player_id, values.get(depth - 2))
+            except SearchTimeout:
+                # the interrupted iteration left the board in the middle of the tree
+                simgame.undo_move(root)
+                break
+            if move is not None:
+                best_move = move
+            completed_depth = depth
+            values[depth] = value
+            self._prev_pv = self._pv.get(0, [])
+            # a won or lost game has been found, searching deeper won't change the result
+            if abs(value) >= 100:
+                break
+            # the next iteration takes several times longer than this one, don't start it if it can't finish
+            if self.time_limit is not None and time.perf_counter() - start > self.time_limit / 2:
+                break
+        self._deadline = None
+        self._max_nodes = None
+        self.last_search = self.search_stats(completed_depth, start)
+        self.last_search["value"] = values.get(completed_depth)
+        return best_move
+
+    # get the list of all the possible moves of player_id (by default the current player of the simulated game)
+    def get_possible_moves(self, simgame: 'SimulatedGame', player_id=None):
+        return movegen.get_possible_moves(simgame, player_id)
+
+
+# Helper processes of the parallel search: the event set when the search of the player is over, and the searcher of this
+# process with the shared transposition table it is attached to
+_helper_stop = None
+_helper = None
+
+
+def _init_helper(stop_event):
+    global _helper_stop
+    _helper_stop = stop_event
+
+
+def _helper_search(settings, tt_name, tt_age, bitboards, player_id, seed):
+    # searches the position with the shared table and returns the number of visited nodes
+    global _helper
+    if _helper is None or _helper.tt.name != tt_name:
+        _helper = MinMaxPlayer(use_transposition_table=False, **settings)
+        _helper.tt = TranspositionTable(settings["tt_memory_mb"], settings["tt_replacement"], name=tt_name)
+    _helper.tt.age = tt_age
+    _helper._stop = _helper_stop
+    _helper._shuffle = random.Random(seed)
+    _helper.start_search()
+    try:
+        _helper.search(SimulatedGame.from_bitboards(bitboards, player_id), player_id)
+    except SearchTimeout:
+        # a fixed depth search is stopped in the middle, its results are already in the table
+        pass
+    return _helper.nodes
@@ -1,7 +1,14 @@
 import random
 from game import Game, Move, Player
-from simulatedgame import SimulatedGame
+import movegen
+import bitboard
+import openingbook
+import tactics
 import sys
+import logging
+
+# the moves are reported with logging instead of print, so that bulk games don't format them to stdout
+logger = logging.getLogger(__name__)
 
 # Just the rappresentation of a human (so optimal) player that makes the best possible moves based on 3 factors:
 # 1) if there is a move that lead you to the victory, done it
@@ -11,14 +18,29 @@ import sys
 # Among all these moves, select the one that has more rows, columns or diagonal with that state
 # Otherwise choose the move with highest score among all the possible moves that are not in the black list (#Rule 2)
 # Pretty similar to the minMaxPlayer but it doesn't require any training or tree generation
+# The winning and losing moves (rules 1 and 2) are found by the tactical analysis of tactics.py, which only simulates the
+# few moves that can complete a line with 4 pieces, and the moves are scored on the bitboards, so no board is copied
+# If the file of an opening book is given (see openingbook.py), in the first plies of the game the move is taken from it
 class OptimalPlayer(Player):
+    def __init__(self, opening_book=None) -> None:
+        super().__init__()
+        self.opening_book = opening_book        # file of the opening book (e.g. openingbook.BOOK_PATH), None to always use the rules
+        self.candidates = 0                     # moves scored by evaluate_move
+        self.book_hits = 0
+        self.book_misses = 0
 
     def make_move(self, game: Game) -> "tuple[tuple[int, int], Move]":
-        # Get the current state of the board
-        board = game.get_board()
         player_id = game.get_current_player()
         # print("Player_id: ", player_id)
 
+        # the positions of the opening book have already been searched offline
+        if self.opening_book is not None:
+            book_move = openingbook.lookup(game.get_bitboards(), player_id, self.opening_book)
+            if book_move >= 0:
+                self.book_hits += 1
+                return movegen.BORDER_MOVES[book_move]
+            self.book_misses += 1
+
         # Rule 1: Check for a winning move
         winning_move = self.find_winning_move(game, player_id)
         if winning_move:     # if there's a winning move, do it
@@ -30,97 +52,46 @@ class OptimalPlayer(Player):
         losing_moves = []
         losing_moves = self.find_losing_moves(game, player_id)
         if len(losing_moves) != 0:
-            print("Losing moves: ", losing_moves)
+            logger.debug("Losing moves: %s", losing_moves)
 
         # Rule 3: Make a move that improves the player's position and hinders the opponent
         best_moves = []
         best_moves = self.find_best_move(game, player_id, losing_moves)     
         if len(best_moves) != 0:
             best_move = random.choice(best_moves)       # select randomly one of the best_moves, if there are more than one,
-            print("Selected_move: ", best_move)         # otherwise you will select the only move present in the list
+            logger.debug("Selected_move: %s", best_move)    # otherwise you will select the only move present in the list
             return best_move    
         else: 
-            selected_move = random.choiche(self.get_possible_moves(game, player_id))     # if there are no possible moves it means that
-            print("Selected_move: ", best_move)                                          # every move bring you to a losing position so select
+            selected_move = random.choice(self.get_possible_moves(game, player_id))      # if there are no possible moves it means that
+            logger.debug("Selected_move: %s", selected_move)                             # every move bring you to a losing position so select
             return selected_move                                                         # randomly one of the possible_move because you are gonna lose (o7 GG WP)
 
+    # counters of the work made by the player (see Player.counters)
+    def counters(self):
+        counters = {"candidates": self.candidates}
+        if self.opening_book is not None:
+            counters.update(book_hits=self.book_hits, book_misses=self.book_misses)
+        return counters
+
     # check if among all the possible moves there's one that bring you to the victory
     def find_winning_move(self, game, player_id):
-        possible_moves = self.get_possible_moves(game, player_id)
-        
-        for moves in possible_moves:
-            x, y = moves[0]
-            direction = moves[1]
-            if self.is_winning_move(game, x, y, direction, player_id):
-                return moves
-
-        return None
+        # only the moves that cross a line with 4 pieces of the player can complete it (see tactics.py)
+        index = tactics.first_winning_move(game.get_bitboards(), player_id)
+        return movegen.BORDER_MOVES[index] if index >= 0 else None
 
 
     # check if among all the possible moves there's at least one that leads to a state in which the opponent can make a winning_move
     def find_losing_moves(self, game, player_id):
-        possible_moves = self.get_possible_moves(game, player_id)
-        opponent_id = (player_id + 1) % 2
-        losing_moves = []
-
-        for moves in possible_moves:
-            x, y = moves[0]
-            direction = moves[1]
-            simulated = SimulatedGame(game.get_board(), player_id)      # create a simulatedGame to check the state of the move
-            ok = simulated.move((x, y), direction, player_id)           # make the move with the simulated board (deepcopy)
-            if ok: 
-                opponent_winning_move = self.find_winning_move(simulated, opponent_id)
-                if opponent_winning_move:
-                    losing_moves.append(moves)
-
-        return losing_moves
+        # the answers of the opponent are looked for only after the moves that leave it a line with 4 pieces
+        return [movegen.BORDER_MOVES[index] for index in tactics.losing_moves(game.get_bitboards(), player_id)]
 
     # check if the move is the one that leads you to the win
     def is_winning_move(self, game, x, y, direction, player_id):
         # Check if the move creates a winning position for the player
-        winning_move = False
-        simulated = SimulatedGame(game.get_board(), player_id)
-        ok = simulated.move((x, y), direction, player_id)
-        if ok:
-            if simulated.check_winner() == player_id:
-                winning_move = True
-        return winning_move
-    
-    # function that count every piece of player_id along the board
-    def check_board(self, board, player_id):
-        opponent_id = (player_id + 1) % 2
-
-        num_elements_rows = [0] * board.shape[0]
-        opponent_rows = [0] * board.shape[0]
-        opponent_columns = [0] * board.shape[0]
-        num_elements_columns = [0] * board.shape[0]
-        num_elements_diagonal = 0
-        opponent_diagonal = 0
-        opponent_anti_diagonal = 0
-        num_elements_anti_diagonal = 0
-        
-        for i in range(board.shape[0]):
-            for j in range(board.shape[0]):
-                if board[i, j] == player_id:
-                    num_elements_rows[i] += 1
-                    num_elements_columns[j] += 1
-                    if i == j:
-                        num_elements_diagonal += 1
-                    if i + j == board.shape[0] - 1:
-                        num_elements_anti_diagonal += 1
-                elif board[i, j] == opponent_id:
-                    opponent_rows[i] += 1
-                    opponent_columns[j] += 1
-                    if i == j:
-                        opponent_diagonal += 1
-                    if i + j == board.shape[0] - 1:
-                        opponent_anti_diagonal += 1
-
-        results = []
-        results.append((num_elements_rows, num_elements_columns, num_elements_diagonal, num_elements_anti_diagonal))
-        results.append((opponent_rows, opponent_columns, opponent_diagonal, opponent_anti_diagonal))
-
-        return results
+        index = bitboard.move_index((x, y), direction)
+        if index < 0 or not bitboard.is_legal(game.get_bitboards(), index, player_id):
+            return False
+        return bitboard.check_winner(bitboard.apply_move(game.get_bitboards(), index, player_id)) == player_id
 
     # Find the best possible moves based on the Score
     # the moves that leads you to a state in which you have at least one row/column/diagonal/anti diagonal with 4 equal pieces in sequence
@@ -136,11 +107,13 @@ class OptimalPlayer(Player):
         best_count = 0
         best_moves = []
 
+        losing_moves = set(losing_moves)
         for move in possible_moves:
             if move in losing_moves:    # if the considerated move is in the black list of moves, jump to the next iteration of the for 
                 continue                # and don't consider the move as a "possible" move
             x, y = move[0]
             direction = move[1]
+            self.candidates += 1
             score, count = self.evaluate_move(game, x, y, direction, player_id)
             # print("Score, count: ", score, count)
             if score >= best_score:         
@@ -176,9 +149,11 @@ class OptimalPlayer(Player):
             for elem in best_moves:
                 m.append(elem[0])                   # append the move to the list of moves
             return m                # return the list of moves
-        else:
+        elif best_move is not None:
             m.append(best_move)             # otherwise select the best move
             return m
+        else:
+            return m                # every move is in the black list: no best move
 
     # function to evaluate the score associated with each move
     # Among all the possible moves that are not the winning ones and that are not in the black list,
@@ -188,55 +163,17 @@ class OptimalPlayer(Player):
     # Otherwise choose the move with highest score among all the possible moves that are not in the black list (#Rule 2)
     def evaluate_move(self, game, x, y, direction, player_id):
         # Evaluate a move based on proximity to victory and hindrance to opponent
-        score = 0
-
-        simulated = SimulatedGame(game.get_board(), player_id)      # simulate the move
-        ok = simulated.move((x, y), direction, player_id)
-        board = simulated.get_board()                               # get the updated board
-
-        results = self.check_board(simulated.get_board(), player_id)    # count the pieces of the player_id
-
-        num_elements_rows, num_elements_columns, num_elements_diagonal, num_elements_anti_diagonal = results[0]
-
-        opponent_rows, opponent_columns, opponent_diagonal, opponent_anti_diagonal = results[1]
-    
-        count = 0       # count indicates the number of rows, columns, diagonl and anti diagonal 
-                        # that are in a state in which we have 4 consecutive pieces of the player_id and no opponent piece
-
-        # count the number of rows, columns, diagonl and anti diagonal 
-        # that are in a state in which we have 4 consecutive pieces of the player_id and no opponent piece
-        for i in range(board.shape[0]):
-            if num_elements_rows[i] == board.shape[0] - 1 and opponent_rows[i] == 0:
-                count += 1      
-            if num_elements_columns[i] == board.shape[0] - 1 and opponent_columns[i] == 0:
-                count += 1
-
-        if num_elements_diagonal == board.shape[0] - 1 and opponent_diagonal == 0:
-            count += 1
-        if num_elements_anti_diagonal == board.shape[0] - 1 and opponent_anti_diagonal == 0:
-            count += 1
-            
+        # the move is applied to the bitboards (the moves given by find_best_move are always legal)
+        bitboards = bitboard.apply_move(game.get_bitboards(), bitboard.move_index((x, y), direction), player_id)
+
+        # score: sum of the product of the elements of the player_id for each row, column, diagonal and anti diagonal
+        # count: number of rows, columns, diagonal and anti diagonal in which we have 4 pieces of the player_id and no opponent piece
+        score, count = tactics.line_scores(bitboards, player_id)
+
         if count != 0:
             return sys.float_info.max, count     # assign the maximun value possible to give priority to this move
-        else:
-            # evaluate the score as the sum of the product of the element for each row, column, diagonal and anti diagonal
-            for i in range(board.shape[0]):     
-                score += (num_elements_rows[i] * num_elements_rows[i])
-                score += (num_elements_columns[i] * num_elements_columns[i])
-                
-            score += (num_elements_diagonal * num_elements_diagonal)
-            score += (num_elements_anti_diagonal * num_elements_anti_diagonal)
-
         return score, count
 
     # get the list of all the possible moves
     def get_possible_moves(self, game, player_id):
-        possible_moves = []
-        for x in range(5):
-            for y in range(5):
-                for direction in [Move.TOP, Move.BOTTOM, Move.LEFT, Move.RIGHT]:
-                    simulated = SimulatedGame(game.get_board(), player_id)
-                    ok = simulated.move((x, y), direction, player_id)
-                    if ok:
-                        possible_moves.append(((x, y), direction))
-        return possible_moves
\ No newline at end of file
+        return movegen.get_possible_moves(game, player_id)
\ No newline at end of file
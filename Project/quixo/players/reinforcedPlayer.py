@@ -1,8 +1,13 @@
 import random
+import os
+import json
+import multiprocessing
 import numpy as np
 from game import Game, Move, Player
 from simulatedgame import SimulatedGame
-from players.randomPlayer import RandomPlayer
+import bitboard
+import movegen
+from qtable import QTable, load_q_table, save_q_table
 
 """
 The ReinforcedPlayer class, inheriting from Player, is an AI agent designed for a board game environment. 
@@ -13,109 +18,329 @@ The agent undergoes a training phase against either a random player or another i
 its strategy based on the outcomes of these games. Post-training, it relies on the learned Q-values to make 
 decisions, significantly reducing exploration. This approach allows the agent to adaptively improve its gameplay, 
 aiming to increase its chances of winning in the simulated game environment.
+States are keyed by an integer built from the two bitboards of the board, and the 8 symmetric versions of a board share
+the same (canonical) key, so whatever is learned on a position is used on all its rotations and reflections.
+With compact=True the Q-table is an open-addressing QTable backed by NumPy arrays instead of a dict.
+The training games are played directly on the bitboards, and can be spread over training_workers processes: every
+worker plays sync_interval games with its own copy of the Q-table and sends back the trajectories and rewards of those
+games, which the coordinator merges into the master Q-table and broadcasts to all the workers.
+A Q-table can also be trained offline (see train_reinforced.py) and saved to a binary file: a player created with
+q_table_path memory-maps it on its first move instead of training, so it is ready at once and all the processes of a
+tournament share a single copy of the table.
 """
 
 # Training matches constant for the ReinforcedPlayer
 TRAINING_MATCHES = 1000
 
+# Reward of a won training game (a lost one gets 0)
+WIN_REWARD = 10
+
+# Default file of the Q-table trained offline for each player_id
+POLICY_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache', 'reinforced', 'qtable_p{player_id}.npy')
+
+# For every move ((x, y), direction) of the move table of bitboard.py, the cell (y, x) used by get_possible_move_indices
+_CLASSIFICATION_MASKS = tuple(bitboard.cell_mask(y, x) for (x, y), _ in bitboard.MOVES)
+
+
+def apply_reward(q_table, trajectory, reward, alpha):
+    # Update the Q-values of the states of a trajectory based on the reward received,
+    # returns the sum of the absolute changes of the values (used to measure the convergence of the training)
+    change = 0.0
+    for state in trajectory:
+        value = q_table.get(state, 0)           # Unseen states have a Q-value of 0
+        delta = alpha * (reward - value)
+        q_table[state] = value + delta
+        change += abs(delta)
+    return change
+
 class ReinforcedPlayer(Player):
-    def __init__(self, trained = False):
+    def __init__(self, trained = False, compact = False, training_matches = TRAINING_MATCHES, training_workers = 1,
+                 sync_interval = 100, seed = None, q_table_path = None):
         super().__init__()                      # Calls the constructor of the base class Player
         self.epsilon = 0.3                      # Sets the exploration rate for the epsilon-greedy strategy
         self.alpha = 0.3                        # Sets the learning rate for Q-learning updates
         self.trajectory = []                    # Initializes the trajectory list to store state sequences
-        self.q_table = {}                       # Initializes the Q-table as an empty dictionary
+        self.compact = compact                  # Indicates whether the Q-table is a compact QTable instead of a dict
+        self.q_table = QTable() if compact else {}  # Initializes the Q-table as an empty table
         self.trained = trained                  # Indicates whether the player is already trained
+        self.training_matches = training_matches    # Number of games played to train the player
+        self.training_workers = training_workers    # Number of processes that play the training games
+        self.sync_interval = sync_interval      # Games played by each worker between two merges of the Q-tables
+        self.seed = seed                        # Seed of the training games (random if None)
+        self.q_table_path = q_table_path        # File of the Q-table trained offline (may contain {player_id}), None to train
+        self.candidates = 0                     # Moves scored with the Q-table (and simulated on the bitboards)
+        self.q_table_misses = 0                 # Resulting states that weren't in the Q-table
 
     def updateReward(self, reward):
         # Update Q-values based on the reward received
-        for state in self.trajectory:
-            if self.q_table.get(state) is None:
-                self.q_table[state] = 0          # Initialize unseen state's Q-value to 0
-            # Update the Q-value for the state based on the received reward
-            self.q_table[state] += self.alpha * (reward - self.q_table[state])
+        return apply_reward(self.q_table, self.trajectory, reward, self.alpha)
+
+    def counters(self):
+        # Work made to choose the moves (including the training games, if the player trains in its first move)
+        return {"candidates": self.candidates, "simulated_moves": self.candidates,
+                "q_table_hits": self.candidates - self.q_table_misses, "q_table_misses": self.q_table_misses}
 
     def reset(self):
         # Resets the trajectory list for a new game
         self.trajectory = []
 
-    def get_hash(self, state):
-        # Converts the game state into a hashable representation
-        hash = []
-        for row in state:
-            for cell in row:
-                hash.append(cell)
-        return str(hash)
+    def get_hash(self, bitboards):
+        # Converts the game state (its pair of bitboards) into the integer key of its canonical symmetric version
+        return bitboard.canonical_position_key(bitboards)
 
     def get_possible_moves(self, simgame: 'SimulatedGame'):
         # Generates all possible moves from the current state
+        my_pos, free_pos = self.get_possible_move_indices(simgame.get_bitboards(), simgame.get_current_player())
+        return [movegen.BORDER_MOVES[i] for i in my_pos], [movegen.BORDER_MOVES[i] for i in free_pos]
+
+    def get_possible_move_indices(self, bitboards, player_id):
+        # Generates the indices (in the move table of bitboard.py) of all the possible moves from the current state
         my_pos = []   # Stores the player's own positions
         free_pos = [] # Stores the free positions on the board
-        for x in range(5):
-            for y in range(5):
-                for direction in [Move.TOP, Move.BOTTOM, Move.LEFT, Move.RIGHT]:
-                    simulated = SimulatedGame(simgame.get_board(),simgame.get_current_player())
-                    ok = simulated.move((x, y), direction, simgame.get_current_player())
-                    # Check if the move is valid
-                    if ok:
-                        # Classify the move based on whether it's taking a free spot or not
-                        if simulated.get_board()[x][y] == simulated.get_current_player():
-                            my_pos.append(((x, y), direction))
-                        else:
-                            free_pos.append(((x, y), direction))
+        for i in movegen.legal_move_indices(bitboards, player_id):
+            # Classify the move based on the owner of the piece found at board[x][y] after the move, as the board
+            # array is indexed by row this is the cell (y, x). The greedy choice keeps the first of the moves with
+            # the same Q-value and my_pos is tried first, so this classification decides the move when they are all unknown
+            if bitboard.apply_move(bitboards, i, player_id)[player_id] & _CLASSIFICATION_MASKS[i]:
+                my_pos.append(i)
+            else:
+                free_pos.append(i)
         return my_pos,free_pos
     
     def make_move(self, game: 'Game') -> 'tuple[tuple[int, int], Move]':
         # Decides on the best move to make, based on Q-learning
+        self.prepare(game.get_current_player())
+        move, best_hash = self.choose_move(game.get_bitboards(), game.get_current_player())
+
+        # Add the chosen state to the trajectory
+        self.trajectory.append(best_hash)
+        return movegen.BORDER_MOVES[move]
+
+    def prepare(self, player_id):
+        # If not trained, load the Q-table trained offline for player_id or undergo training as player_id
         if not self.trained:
-            # If not trained, undergo training
-            self.q_table = self.training(game.get_current_player())
+            if self.q_table_path is not None:
+                self.q_table = load_q_table(self.q_table_path.format(player_id=player_id))
+            else:
+                self.q_table = self.training(player_id)
             self.trained = True
             self.epsilon = 0.0    # Set exploration rate to 0 after training
-        simulated = SimulatedGame(game.get_board(), game.get_current_player())
-        my_pos,free_pos = self.get_possible_moves(simulated)
-    
+
+    def choose_move(self, bitboards, player_id):
+        # Returns the index of the chosen move and the key of the state added to the trajectory
+        my_pos,free_pos = self.get_possible_move_indices(bitboards, player_id)
+
         if np.random.uniform(0, 1) > self.epsilon:
             # Choosing the best move based on Q-values if not exploring
             value_max = float('-inf')
 
-            for possible_move in my_pos + free_pos:
-                simulated = SimulatedGame(game.get_board(), game.get_current_player())
-                ok = simulated.move(possible_move[0],possible_move[1],simulated.get_current_player())
-                next_board_hash = self.get_hash(simulated.get_board())
-                # Get the Q-value of the resulting state
-                value = 0 if self.q_table.get(next_board_hash) is None else self.q_table.get(next_board_hash)
+            candidates = my_pos + free_pos
+            self.candidates += len(candidates)
+            for possible_move in candidates:
+                # The resulting state is computed on the bitboards, without copying the board
+                next_board_hash = self.get_hash(bitboard.apply_move(bitboards, possible_move, player_id))
+                # Get the Q-value of the resulting state (0 if it is unknown)
+                value = self.q_table.get(next_board_hash)
+                if value is None:
+                    value = 0
+                    self.q_table_misses += 1
                 # Update the best move if this move has a higher Q-value
                 if value > value_max:
                     value_max = value
                     best_hash = next_board_hash
-                    from_pos = possible_move[0]
-                    slide = possible_move[1]
-         
+                    move = possible_move
+
         else: 
             # If exploring, choose a random move
-            from_pos, slide = random.choice(free_pos) if len(free_pos)>0 else random.choice(my_pos)
-            best_hash = self.get_hash(simulated.get_board())
+            move = random.choice(free_pos) if len(free_pos)>0 else random.choice(my_pos)
+            best_hash = self.get_hash(bitboards)
+        return move, best_hash
 
-        # Add the chosen state to the trajectory
-        self.trajectory.append(best_hash)
-        return from_pos, slide
+    def play_training_game(self, player_id):
+        # Plays a training game against a random player directly on the bitboards, as Game.play would do, and
+        # returns the winner. The states chosen by this player are added to its trajectory
+        bitboards = bitboard.EMPTY
+        current_player = 0
+        winner = -1
+        while winner < 0:
+            if current_player == player_id:
+                move, state = self.choose_move(bitboards, current_player)
+                self.trajectory.append(state)
+            else:
+                # same choice of RandomPlayer.make_move
+                move = random.choice(movegen.legal_move_indices(bitboards, current_player))
+            bitboards = bitboard.apply_move(bitboards, move, current_player)
+            winner = bitboard.check_winner(bitboards)
+            current_player = 1 - current_player
+        return winner
 
     def training(self, player_id):
-        # Training the agent by playing games against a random or reinforced player
-        # Decide opponent based on player_id
-        player0 = RandomPlayer() if player_id==1 else ReinforcedPlayer(trained=True)
-        player1 = ReinforcedPlayer(trained=True) if player_id==1 else RandomPlayer()
-
-        for match in range(TRAINING_MATCHES):
-            g = Game()
-            winner = g.play(player0, player1)
-            # Update rewards based on the outcome of the game
-            if winner == player_id:
-                player1.updateReward(10) if player_id==1 else player0.updateReward(10)
+        # Training the agent by playing games against a random player, the learner plays with the given player_id
+        q_table, _ = train_q_table(player_id, self.training_matches, self.training_workers, self.sync_interval, self.compact,
+                                   self.seed, self.alpha)
+        return q_table
+
+
+def _new_q_table(compact, path=None):
+    # empty Q-table, or a modifiable copy of the one saved in path
+    q_table = QTable() if compact else {}
+    if path is not None:
+        for key, value in load_q_table(path).items():
+            q_table[key] = value
+    return q_table
+
+
+def _seed_generators(seed):
+    state = np.random.SeedSequence(seed).generate_state(2)
+    random.seed(int(state[0]))
+    np.random.seed(int(state[1]))
+
+
+def _play_games(learner, player_id, games, previous_values=None):
+    # Plays and learns the training games, returns their (trajectory, reward) updates, the sum of the absolute changes
+    # of the Q-values and the number of wins. previous_values collects the values of the states before their first update
+    updates, change, wins = [], 0.0, 0
+    for _ in range(games):
+        winner = learner.play_training_game(player_id)
+        trajectory = tuple(learner.trajectory)
+        if previous_values is not None:
+            for state in trajectory:
+                if state not in previous_values:
+                    previous_values[state] = learner.q_table.get(state, 0)
+        reward = WIN_REWARD if winner == player_id else 0
+        change += learner.updateReward(reward)
+        wins += winner == player_id
+        learner.reset()
+        updates.append((trajectory, reward))
+    return updates, change, wins
+
+
+def _training_worker(connection, player_id, compact, initial_path):
+    # Worker process of train_q_table. It keeps a copy of the master Q-table: the games of each round are played
+    # and learned on the copy, then at the merge the updates of this worker are undone and all the updates of the round
+    # are applied in the same order used by the coordinator, so that the copy is again identical to the master table
+    learner = ReinforcedPlayer(trained=True)
+    learner.q_table = _new_q_table(compact, initial_path)
+    while True:
+        command, argument = connection.recv()
+        if command == 'play':
+            games, seed, learner.alpha = argument
+            _seed_generators(seed)
+            previous_values = {}
+            updates, _, wins = _play_games(learner, player_id, games, previous_values)
+            connection.send((updates, wins))
+        elif command == 'merge':
+            # a state missing from the master table has value 0, which is the same as being absent for the updates
+            for state, value in previous_values.items():
+                learner.q_table[state] = value
+            for trajectory, reward in argument:
+                apply_reward(learner.q_table, trajectory, reward, learner.alpha)
+        else:
+            connection.close()
+            return
+
+
+def _load_checkpoint(path, compact):
+    with open(path + '.json') as file:
+        progress = json.load(file)
+    return _new_q_table(compact, path), progress['games'], progress['history']
+
+
+def _save_checkpoint(path, q_table, games, history):
+    save_q_table(q_table, path)
+    with open(path + '.json', 'w') as file:
+        json.dump({'games': games, 'history': history}, file)
+
+
+def round_alpha(alpha, alpha_decay, played):
+    '''Learning rate of a training round that starts after played games: alpha / (1 + played / alpha_decay), or alpha if alpha_decay is None'''
+    return alpha if alpha_decay is None else alpha / (1 + played / alpha_decay)
+
+
+def train_q_table(player_id, matches=TRAINING_MATCHES, workers=1, sync_interval=100, compact=False, seed=None, alpha=0.3,
+                  tolerance=None, patience=3, checkpoint_path=None, progress=None, alpha_decay=None):
+    '''
+    Trains a Q-table by playing up to matches games against a random player and returns it with the training statistics.
+    The games are played in rounds of sync_interval games for each worker. With workers > 1 every worker process plays
+    its games on its own copy of the Q-table, then the trajectories and rewards of the round are merged into the master
+    Q-table (worker by worker, in the order in which they were played) and sent to all the workers.
+    With alpha_decay the learning rate of each round decreases with the games already played (see round_alpha).
+    After each round:
+    - the convergence metric, i.e. the mean absolute change of the Q-values updated in the round, is added to the
+      history; training stops early when it stays below tolerance for patience rounds in a row. The rewards of the games
+      against a random player are noisy, so with a constant alpha the Q-values keep moving by about alpha times the
+      reward and the metric never gets small: the tolerance is meant to be used together with alpha_decay
+    - the Q-table is saved in checkpoint_path (if given), from which an interrupted training is resumed
+    - progress (if given) is called with the entry of the history
+    '''
+    q_table, played, history = _new_q_table(compact), 0, []
+    resumed = checkpoint_path is not None and os.path.exists(checkpoint_path) and os.path.exists(checkpoint_path + '.json')
+    if resumed:
+        q_table, played, history = _load_checkpoint(checkpoint_path, compact)
+    if workers > 1 and seed is None:
+        seed = np.random.randint(0, 2 ** 31)
+
+    learner = ReinforcedPlayer(trained=True)
+    learner.q_table = q_table
+    connections, processes = [], []
+    try:
+        for worker in range(workers if workers > 1 else 0):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_training_worker, daemon=True,
+                                              args=(child, player_id, compact, checkpoint_path if resumed else None))
+            process.start()
+            child.close()
+            connections.append(parent)
+            processes.append(process)
+
+        # a resumed training keeps counting the rounds below the tolerance that preceded the interruption
+        quiet_rounds = 0
+        for entry in history:
+            quiet_rounds = quiet_rounds + 1 if tolerance is not None and entry['mean_change'] < tolerance else 0
+        while played < matches and quiet_rounds < patience:
+            round_matches = min(matches - played, max(1, workers) * sync_interval)
+            learner.alpha = round_alpha(alpha, alpha_decay, played)
+            # with a seed, the generators are seeded at the start of every round (from the seed, the games already
+            # played and the worker), so a training resumed from a checkpoint gives the same result as an uninterrupted one
+            if workers <= 1:
+                if seed is not None:
+                    _seed_generators([seed, played])
+                updates, change, wins = _play_games(learner, player_id, round_matches)
             else:
-                player1.updateReward(0) if player_id==1 else player0.updateReward(0)
+                # split the games of this round among the workers, then merge their updates
+                shares = [round_matches // workers + (1 if worker < round_matches % workers else 0) for worker in range(workers)]
+                for worker, (connection, share) in enumerate(zip(connections, shares)):
+                    connection.send(('play', (share, [seed, played, worker], learner.alpha)))
+                updates, change, wins = [], 0.0, 0
+                for connection in connections:
+                    worker_updates, worker_wins = connection.recv()
+                    updates.extend(worker_updates)
+                    wins += worker_wins
+                for trajectory, reward in updates:
+                    change += apply_reward(q_table, trajectory, reward, learner.alpha)
+            played += round_matches
+
+            # convergence metric of the round
+            num_updates = sum(len(trajectory) for trajectory, _ in updates)
+            entry = {'games': played, 'mean_change': change / num_updates if num_updates else 0.0, 'win_rate': wins / round_matches,
+                     'alpha': learner.alpha}
+            history.append(entry)
+            if checkpoint_path is not None:
+                _save_checkpoint(checkpoint_path, q_table, played, history)
+            if progress is not None:
+                progress(entry)
+            quiet_rounds = quiet_rounds + 1 if tolerance is not None and entry['mean_change'] < tolerance else 0
+            if quiet_rounds >= patience:
+                break
 
-            # Reset the players for the next game
-            player1.reset() if player_id==1 else player0.reset()
-        return player1.q_table if player_id==1 else player0.q_table
+            if played < matches:
+                for connection in connections:
+                    connection.send(('merge', updates))
+    finally:
+        for connection in connections:
+            connection.send(('stop', None))
+        for process in processes:
+            process.join()
+    stats = {'games': played, 'states': len(q_table), 'converged': tolerance is not None and quiet_rounds >= patience,
+             'history': history}
+    return q_table, stats
@@ -0,0 +1,149 @@
+import os
+import numpy as np
+
+# Compact Q-table for the learning players.
+# Positions are identified by integer keys (see bitboard.position_key and bitboard.canonical_position_key, at most 50 bits),
+# so the table doesn't need Python objects for its entries: keys and values are stored in two NumPy arrays and the slot of
+# a key is found by open addressing with linear probing. An entry takes 16 bytes (plus the free slots kept to make the
+# probes short), against the hundreds of bytes of a dict entry with a string key.
+# The table has the subset of the dict interface used by the players (get, [], in, len, items), so it can replace one.
+# Trained tables are saved in a binary .npy file of (key, value) records sorted by key: load_q_table memory-maps it and
+# looks keys up by binary search, so loading is instantaneous and the processes that load the same file share its pages.
+
+# Marks a free slot: valid keys never have all the 64 bits set
+_FREE = 2 ** 64 - 1
+_MULTIPLIER = 0x9E3779B97F4A7C15        # Fibonacci hashing: 2^64 / golden ratio
+_MASK_64 = (1 << 64) - 1
+
+
+class QTable(object):
+    def __init__(self, capacity=1024, max_load=0.5) -> None:
+        '''
+        capacity: initial number of slots (rounded up to a power of 2), the table doubles when it gets fuller than max_load
+        '''
+        self.max_load = max_load
+        self._allocate(max(8, 1 << (int(capacity) - 1).bit_length()))
+
+    def _allocate(self, capacity) -> None:
+        self.capacity = capacity
+        self._shift = 64 - (capacity.bit_length() - 1)
+        self._keys = np.full(capacity, _FREE, dtype=np.uint64)
+        self._values = np.zeros(capacity, dtype=np.float64)
+        self._count = 0
+
+    def _slot(self, key) -> int:
+        # the slot of the key, or the free slot in which it has to be inserted
+        slot = ((key * _MULTIPLIER) & _MASK_64) >> self._shift
+        keys = self._keys
+        while True:
+            stored = keys.item(slot)
+            if stored == key or stored == _FREE:
+                return slot
+            slot = (slot + 1) & (self.capacity - 1)
+
+    def _grow(self) -> None:
+        keys, values = self._keys, self._values
+        used = keys != _FREE
+        self._allocate(self.capacity * 2)
+        for key, value in zip(keys[used].tolist(), values[used].tolist()):
+            self[key] = value
+
+    def get(self, key, default=None):
+        slot = self._slot(key)
+        if self._keys.item(slot) == key:
+            return self._values.item(slot)
+        return default
+
+    def __getitem__(self, key) -> float:
+        slot = self._slot(key)
+        if self._keys.item(slot) != key:
+            raise KeyError(key)
+        return self._values.item(slot)
+
+    def __setitem__(self, key, value) -> None:
+        slot = self._slot(key)
+        if self._keys.item(slot) != key:
+            if self._count + 1 > self.capacity * self.max_load:
+                self._grow()
+                slot = self._slot(key)
+            self._keys[slot] = key
+            self._count += 1
+        self._values[slot] = value
+
+    def __contains__(self, key) -> bool:
+        return self._keys.item(self._slot(key)) == key
+
+    def __len__(self) -> int:
+        return self._count
+
+    def items(self):
+        '''Yields the (key, value) pairs of the table'''
+        used = self._keys != _FREE
+        return zip(self._keys[used].tolist(), self._values[used].tolist())
+
+    def nbytes(self) -> int:
+        '''Returns the memory used by the arrays of the table'''
+        return self._keys.nbytes + self._values.nbytes
+
+
+# Record of a saved Q-table
+RECORD_DTYPE = np.dtype([('key', '<u8'), ('value', '<f8')])
+
+
+class FrozenQTable(object):
+    '''Read-only Q-table on an array of records sorted by key (usually memory-mapped from a file)'''
+
+    def __init__(self, records) -> None:
+        self._records = records
+        self._keys = records['key']
+        self._values = records['value']
+
+    def _index(self, key) -> int:
+        # index of the key, or -1 if it isn't in the table
+        index = int(np.searchsorted(self._keys, key))
+        if index < len(self._keys) and self._keys.item(index) == key:
+            return index
+        return -1
+
+    def get(self, key, default=None):
+        index = self._index(key)
+        return self._values.item(index) if index >= 0 else default
+
+    def __getitem__(self, key) -> float:
+        index = self._index(key)
+        if index < 0:
+            raise KeyError(key)
+        return self._values.item(index)
+
+    def __contains__(self, key) -> bool:
+        return self._index(key) >= 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def items(self):
+        '''Yields the (key, value) pairs of the table'''
+        return zip(self._keys.tolist(), self._values.tolist())
+
+    def __deepcopy__(self, memo) -> 'FrozenQTable':
+        # the table is read-only, so its copies share it (and the memory-mapped file) instead of loading it into memory
+        return self
+
+
+def save_q_table(q_table, path) -> None:
+    '''Saves a Q-table (a dict, a QTable or a FrozenQTable with integer keys) in the binary format read by load_q_table'''
+    records = np.fromiter(q_table.items(), dtype=RECORD_DTYPE, count=len(q_table))
+    records.sort(order='key')
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # the file is written next to the final one and then renamed, so that readers never see a partial file
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as file:
+        np.save(file, records)
+    os.replace(temporary, path)
+
+
+def load_q_table(path, mmap=True) -> FrozenQTable:
+    '''Loads a Q-table saved by save_q_table, memory-mapped (read-only) unless mmap is False'''
+    return FrozenQTable(np.load(path, mmap_mode='r' if mmap else None))
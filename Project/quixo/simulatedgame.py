@@ -1,7 +1,7 @@
 from abc import ABC, abstractmethod
-from copy import deepcopy
 from enum import Enum
 import numpy as np
+import bitboard
 
 # This is a copy of the actual Game class used to simulate the game in different scenarios
 
@@ -33,14 +33,63 @@ class Player(ABC):
 
 class SimulatedGame(object):
     def __init__(self, board, player_id) -> None:
-        self._board = board 
+        # the board is kept as a pair of bitboards (see bitboard.py), the NumPy board is only used at the boundaries
+        self._bitboards = bitboard.from_array(board)
         self.current_player_idx = player_id
-    
+        # number of pieces of each player in every row, column and diagonal, kept up to date move after move
+        self._reset_line_counts()
+
+    @classmethod
+    def from_bitboards(cls, bitboards, player_id) -> 'SimulatedGame':
+        '''
+        Creates a simulated game directly from a pair of bitboards, skipping the conversion from the NumPy board
+        '''
+        simgame = cls.__new__(cls)
+        simgame._bitboards = bitboards
+        simgame.current_player_idx = player_id
+        simgame._reset_line_counts()
+        return simgame
+
+    @property
+    def _board(self) -> np.ndarray:
+        '''5x5 NumPy version of the board, built from the bitboards'''
+        return bitboard.to_array(self._bitboards)
+
+    @_board.setter
+    def _board(self, board: np.ndarray) -> None:
+        self._bitboards = bitboard.from_array(board)
+        self._reset_line_counts()
+
+    def _reset_line_counts(self) -> None:
+        self._line_counts = (bitboard.line_counts(self._bitboards[0]), bitboard.line_counts(self._bitboards[1]))
+
+    def _set_bitboards(self, bitboards) -> None:
+        # the line counts are updated only for the rows changed by the move
+        old0, old1 = self._bitboards
+        count0, count1 = self._line_counts
+        self._line_counts = (bitboard.update_line_counts(count0, old0, bitboards[0]),
+                             bitboard.update_line_counts(count1, old1, bitboards[1]))
+        self._bitboards = bitboards
+
+    def get_line_counts(self, player_id: int):
+        '''
+        Returns the number of pieces of player_id and of the opponent in each row, column, diagonal and anti diagonal,
+        as [(rows, columns, diagonal, anti_diagonal) of player_id, (...) of the opponent], where rows and columns are lists of
+        5 counts indexed by y and x (see bitboard.unpack_line_counts)
+        '''
+        return [bitboard.unpack_line_counts(self._line_counts[player_id]),
+                bitboard.unpack_line_counts(self._line_counts[1 - player_id])]
+
+    def get_packed_line_counts(self, player_id: int) -> int:
+        '''Returns the per-line counts of the pieces of player_id packed in a single int (see bitboard.line_counts)'''
+        return self._line_counts[player_id]
+
     def get_current_player(self) -> int:
         '''
         Returns the current player
         '''
-        return deepcopy(self.current_player_idx)
+        # the index is an immutable int, there is no need to copy it
+        return self.current_player_idx
     
     def print(self):
         '''Prints the board. -1 are neutral pieces, 0 are pieces of player 0, 1 pieces of player 1'''
@@ -50,37 +99,23 @@ class SimulatedGame(object):
         '''
         Returns the board
         '''
-        return deepcopy(self._board)
+        # the NumPy board is built from the bitboards on every call, so it is already a copy that can be freely modified
+        return self._board
+
+    def get_bitboards(self) -> 'tuple[int, int]':
+        '''
+        Returns the board as the pair of bitboards of player 0 and player 1
+        '''
+        return self._bitboards
     
     def check_winner(self) -> int:
         '''Check the winner. Returns the player ID of the winner if any, otherwise returns -1'''
-        # for each row
-        for x in range(self._board.shape[0]):
-            # if a player has completed an entire row
-            if self._board[x, 0] != -1 and all(self._board[x, :] == self._board[x, 0]):
-                # return the relative id
-                return self._board[x, 0]
-        # for each column
-        for y in range(self._board.shape[1]):
-            # if a player has completed an entire column
-            if self._board[0, y] != -1 and all(self._board[:, y] == self._board[0, y]):
-                # return the relative id
-                return self._board[0, y]
-        # if a player has completed the principal diagonal
-        if self._board[0, 0] != -1 and all(
-            [self._board[x, x]
-                for x in range(self._board.shape[0])] == self._board[0, 0]
-        ):
-            # return the relative id
-            return self._board[0, 0]
-        # if a player has completed the secondary diagonal
-        if self._board[0, -1] != -1 and all(
-            [self._board[x, -(x + 1)]
-             for x in range(self._board.shape[0])] == self._board[0, -1]
-        ):
-            # return the relative id
-            return self._board[0, -1]
-        return -1
+        # nobody can have won if no line counter of the two players has reached 5
+        count0, count1 = self._line_counts
+        if not bitboard.has_full_line(count0) and not bitboard.has_full_line(count1):
+            return -1
+        # rows, columns, principal and secondary diagonal are checked (in this order) with one mask for each line
+        return bitboard.check_winner(self._bitboards)
 
 
     def play(self, player1: Player, player2: Player) -> int:
@@ -100,112 +135,74 @@ class SimulatedGame(object):
 
     def move(self, from_pos: 'tuple[int, int]', slide: Move, player_id: int) -> bool:
         '''Perform a move'''
-        if player_id > 2:
+        if player_id not in (0, 1):
             return False
-        # Oh God, Numpy arrays
-        prev_value = deepcopy(self._board[(from_pos[1], from_pos[0])])
-        acceptable = self.take((from_pos[1], from_pos[0]), player_id)
-        if acceptable:
-            acceptable = self.slideF((from_pos[1], from_pos[0]), slide)
-            if not acceptable:
-                self._board[(from_pos[1], from_pos[0])] = deepcopy(prev_value)
-            #self.print()
-        return acceptable
+        # the move is acceptable only if the piece is on the border, it can be inserted on the chosen side
+        # (i.e. the pair is in the table of the 44 legal moves) and it is neutral or belongs to the current player
+        index = bitboard.move_index(from_pos, slide)
+        if index < 0 or not bitboard.is_legal(self._bitboards, index, player_id):
+            return False
+        # take the piece and slide the other ones
+        self._set_bitboards(bitboard.apply_move(self._bitboards, index, player_id))
+        return True
+
+    def apply_move(self, from_pos: 'tuple[int, int]', slide: Move, player_id: int = None):
+        '''
+        Perform a move in place, so that a search can walk the whole tree on a single board.
+        Returns the undo record to pass to undo_move, or None if the move is not acceptable.
+        After the move the current player is the one that made it, as in a SimulatedGame created for the mover.
+        '''
+        if player_id is None:
+            player_id = self.current_player_idx
+        if player_id not in (0, 1):
+            return None
+        index = bitboard.move_index(from_pos, slide)
+        if index < 0 or not bitboard.is_legal(self._bitboards, index, player_id):
+            return None
+        return self.apply_move_index(index, player_id)
+
+    def apply_move_index(self, index: int, player_id: int):
+        '''
+        Same as apply_move for a legal move given by its index in the move table of bitboard.py (no checks are made)
+        '''
+        # the board and the line counts are tuples of ints, so the previous state is a compact undo record that never needs to be copied
+        undo = (self._bitboards, self.current_player_idx, self._line_counts)
+        self._set_bitboards(bitboard.apply_move(self._bitboards, index, player_id))
+        self.current_player_idx = player_id
+        return undo
+
+    def snapshot(self):
+        '''Returns an undo record of the current state, that undo_move can restore after any number of moves'''
+        return (self._bitboards, self.current_player_idx, self._line_counts)
+
+    def undo_move(self, undo) -> None:
+        '''Restore the board, the current player and the line counts saved by apply_move'''
+        self._bitboards, self.current_player_idx, self._line_counts = undo
 
     def take(self, from_pos: 'tuple[int, int]', player_id: int) -> bool:
         '''Take piece'''
-        # acceptable only if in border
-        acceptable: bool = (
-            # check if it is in the first row
-            (from_pos[0] == 0 and from_pos[1] < 5)
-            # check if it is in the last row
-            or (from_pos[0] == 4 and from_pos[1] < 5)
-            # check if it is in the first column
-            or (from_pos[1] == 0 and from_pos[0] < 5)
-            # check if it is in the last column
-            or (from_pos[1] == 4 and from_pos[0] < 5)
-            # and check if the piece can be moved by the current player
-        ) and (self._board[from_pos] < 0 or self._board[from_pos] == player_id)
+        # from_pos is expressed as (row, column), as in the original implementation on the NumPy board
+        row, column = from_pos
+        if player_id not in (0, 1) or not (0 <= row < 5 and 0 <= column < 5):
+            return False
+        mask = bitboard.cell_mask(column, row)
+        # acceptable only if in border and if the piece can be moved by the current player
+        acceptable: bool = bool(mask & bitboard.BORDER_MASK) and not self._bitboards[1 - player_id] & mask
         if acceptable:
-            self._board[from_pos] = player_id
+            board0, board1 = self._bitboards
+            self._set_bitboards((board0 | mask, board1) if player_id == 0 else (board0, board1 | mask))
         return acceptable
 
     def slideF(self, from_pos: 'tuple[int, int]', slide: Move) -> bool:
         '''Slide the other pieces'''
-        # define the corners
-        SIDES = [(0, 0), (0, 4), (4, 0), (4, 4)]
-        # if the piece position is not in a corner
-        if from_pos not in SIDES:
-            # if it is at the TOP, it can be moved down, left or right
-            acceptable_top: bool = from_pos[0] == 0 and (
-                slide.name == 'BOTTOM' or slide.name == 'LEFT' or slide.name == 'RIGHT'
-            )
-            # if it is at the BOTTOM, it can be moved up, left or right
-            acceptable_bottom: bool = from_pos[0] == 4 and (
-                slide.name == 'TOP' or slide.name == 'LEFT' or slide.name == 'RIGHT'
-            )
-            # if it is on the LEFT, it can be moved up, down or right
-            acceptable_left: bool = from_pos[1] == 0 and (
-                slide.name == 'BOTTOM' or slide.name == 'TOP' or slide.name == 'RIGHT'
-            )
-            # if it is on the RIGHT, it can be moved up, down or left
-            acceptable_right: bool = from_pos[1] == 4 and (
-                slide.name == 'BOTTOM' or slide.name == 'TOP' or slide.name == 'LEFT'
-            )
-        # if the piece position is in a corner
-        else:
-            # if it is in the upper left corner, it can be moved to the right and down
-            acceptable_top: bool = from_pos == (0, 0) and (
-                slide.name == 'BOTTOM' or slide.name == 'RIGHT')
-            # if it is in the lower left corner, it can be moved to the right and up
-            acceptable_left: bool = from_pos == (4, 0) and (
-                slide.name == 'TOP' or slide.name == 'RIGHT')
-            # if it is in the upper right corner, it can be moved to the left and down
-            acceptable_right: bool = from_pos == (0, 4) and (
-                slide.name == 'BOTTOM' or slide.name == 'LEFT')
-            # if it is in the lower right corner, it can be moved to the left and up
-            acceptable_bottom: bool = from_pos == (4, 4) and (
-                slide.name == 'TOP' or slide.name == 'LEFT')
-        # check if the move is acceptable
-        acceptable: bool = acceptable_top or acceptable_bottom or acceptable_left or acceptable_right
-        # if it is
+        # from_pos is expressed as (row, column), as in the original implementation on the NumPy board
+        index = bitboard.move_index((from_pos[1], from_pos[0]), slide)
+        # the direction is acceptable only if the (position, direction) pair is one of the 44 legal moves
+        acceptable: bool = index >= 0
         if acceptable:
-            # take the piece
-            piece = self._board[from_pos]
-            # if the player wants to slide it to the left
-            if slide.name == 'LEFT':
-                # for each column starting from the column of the piece and moving to the left
-                for i in range(from_pos[1], 0, -1):
-                    # copy the value contained in the same row and the previous column
-                    self._board[(from_pos[0], i)] = self._board[(
-                        from_pos[0], i - 1)]
-                # move the piece to the left
-                self._board[(from_pos[0], 0)] = piece
-            # if the player wants to slide it to the right
-            elif slide.name == 'RIGHT':
-                # for each column starting from the column of the piece and moving to the right
-                for i in range(from_pos[1], self._board.shape[1] - 1, 1):
-                    # copy the value contained in the same row and the following column
-                    self._board[(from_pos[0], i)] = self._board[(
-                        from_pos[0], i + 1)]
-                # move the piece to the right
-                self._board[(from_pos[0], self._board.shape[1] - 1)] = piece
-            # if the player wants to slide it upward
-            elif slide.name == 'TOP':
-                # for each row starting from the row of the piece and going upward
-                for i in range(from_pos[0], 0, -1):
-                    # copy the value contained in the same column and the previous row
-                    self._board[(i, from_pos[1])] = self._board[(
-                        i - 1, from_pos[1])]
-                # move the piece up
-                self._board[(0, from_pos[1])] = piece
-            # if the player wants to slide it downward
-            elif slide.name == 'BOTTOM':
-                # for each row starting from the row of the piece and going downward
-                for i in range(from_pos[0], self._board.shape[0] - 1, 1):
-                    # copy the value contained in the same column and the following row
-                    self._board[(i, from_pos[1])] = self._board[(
-                        i + 1, from_pos[1])]
-                # move the piece down
-                self._board[(self._board.shape[0] - 1, from_pos[1])] = piece
-        return acceptable
\ No newline at end of file
+            # the piece keeps its owner while it is moved
+            board0, board1 = self._bitboards
+            mask = bitboard.FROM_MASKS[index]
+            piece = 0 if board0 & mask else 1 if board1 & mask else -1
+            self._set_bitboards(bitboard.apply_move(self._bitboards, index, piece))
+        return acceptable
@@ -0,0 +1,117 @@
+import bitboard
+from bitboard import LINE_COUNT_BITS, LINE_MASKS
+import movegen
+
+# Tactical analysis of a position: immediate wins of a player and moves that give the opponent an immediate win.
+# A move only changes the cells of its span (from the taken piece up to the side on which it is inserted), and each line
+# crossing the span gains at most one piece of the mover, so a move can complete a line of a player only if that line
+# already has 4 of its pieces and crosses the span of the move. The lines with 4 pieces of a player (its threats) are read
+# in a single operation from the packed per-line counts of bitboard.py, and the lines crossed by each move are
+# precomputed in the same packed format: most of the moves are discarded with an AND of two ints, and only the few that
+# can complete a threatened line are applied to the bitboards and checked.
+# The results are the same of simulating every move (and every answer of the opponent) on a copy of the board, in the
+# same raster order of the moves.
+
+# Bit 2 of every packed counter: it is set when the line has 4 or 5 pieces of the player
+_THREAT_BITS = sum(4 << (LINE_COUNT_BITS * i) for i in range(len(LINE_MASKS)))
+
+# Bit 0 of every packed counter, and the value 4 in every counter
+_FIELD_ONES = sum(1 << (LINE_COUNT_BITS * i) for i in range(len(LINE_MASKS)))
+_FIELD_FOURS = 4 * _FIELD_ONES
+
+# Sum of the squares of the 4 counters packed in every 16 bit chunk of the per-line counts
+_SQUARES_CHUNK_BITS = 16
+_SQUARES_CHUNK_MASK = (1 << _SQUARES_CHUNK_BITS) - 1
+_CHUNK_SQUARES = tuple(sum(((chunk >> (LINE_COUNT_BITS * i)) & 15) ** 2 for i in range(4))
+                       for chunk in range(1 << _SQUARES_CHUNK_BITS))
+
+# For each move of the move table, the bit 2 of the counters of the lines crossed by its span
+_MOVE_LINE_BITS = tuple(sum(4 << (LINE_COUNT_BITS * i) for i, line in enumerate(LINE_MASKS) if line & span)
+                        for span in bitboard.SPAN_MASKS)
+
+
+def threats(counts) -> int:
+    '''Returns the bit 2 of the packed counters of the lines with at least 4 pieces (0 if the player has no threat)'''
+    return counts & _THREAT_BITS
+
+
+def winning_moves(bitboards, player_id, counts=None) -> 'list[int]':
+    '''Returns the indices (in the move table) of the legal moves after which player_id wins, in raster order'''
+    if counts is None:
+        counts = bitboard.line_counts(bitboards[player_id])
+    lines = threats(counts)
+    if not lines:
+        return []
+    return [index for index in movegen.legal_move_indices(bitboards, player_id)
+            if lines & _MOVE_LINE_BITS[index] and bitboard.check_winner(bitboard.apply_move(bitboards, index, player_id)) == player_id]
+
+
+def first_winning_move(bitboards, player_id, counts=None) -> int:
+    '''Returns the index of the first legal move (in raster order) after which player_id wins, or -1 if there is none'''
+    if counts is None:
+        counts = bitboard.line_counts(bitboards[player_id])
+    lines = threats(counts)
+    if lines:
+        for index in movegen.legal_move_indices(bitboards, player_id):
+            if lines & _MOVE_LINE_BITS[index] \
+                    and bitboard.check_winner(bitboard.apply_move(bitboards, index, player_id)) == player_id:
+                return index
+    return -1
+
+
+def blocking_moves(bitboards, player_id, opponent_counts=None) -> 'list[int]':
+    '''
+    Returns the indices of the legal moves of player_id that cross a line with 4 pieces of the opponent, in raster order:
+    the other moves leave those lines as they are, so only these moves can break the threats of the opponent
+    '''
+    if opponent_counts is None:
+        opponent_counts = bitboard.line_counts(bitboards[1 - player_id])
+    lines = threats(opponent_counts)
+    if not lines:
+        return []
+    return [index for index in movegen.legal_move_indices(bitboards, player_id) if lines & _MOVE_LINE_BITS[index]]
+
+
+def _has_winning_answer(bitboards, player_id) -> bool:
+    # True if player_id has a legal move after which it wins (the position may already have a completed line)
+    counts = bitboard.line_counts(bitboards[player_id])
+    if not bitboard.has_full_line(counts):
+        return first_winning_move(bitboards, player_id, counts) >= 0
+    # a line of the player is already complete: it stays complete after any move that doesn't cross it, so every move
+    # is checked (this only happens after a move that completed a line of the opponent, i.e. at the end of the game)
+    return any(bitboard.check_winner(bitboard.apply_move(bitboards, index, player_id)) == player_id
+               for index in movegen.legal_move_indices(bitboards, player_id))
+
+
+def losing_moves(bitboards, player_id) -> 'list[int]':
+    '''Returns the indices of the legal moves of player_id after which the opponent has a winning move, in raster order'''
+    opponent_id = 1 - player_id
+    losing = []
+    for index in movegen.legal_move_indices(bitboards, player_id):
+        new_bitboards = bitboard.apply_move(bitboards, index, player_id)
+        # without a line with 4 of its pieces the opponent can't win with its next move
+        if threats(bitboard.line_counts(new_bitboards[opponent_id])) and _has_winning_answer(new_bitboards, opponent_id):
+            losing.append(index)
+    return losing
+
+
+def line_score(counts) -> int:
+    '''Returns the sum of the squares of the packed per-line counts (the line score of a player)'''
+    return _CHUNK_SQUARES[counts & _SQUARES_CHUNK_MASK] + _CHUNK_SQUARES[(counts >> 16) & _SQUARES_CHUNK_MASK] \
+        + _CHUNK_SQUARES[counts >> 32]
+
+
+def _zero_fields(counts) -> int:
+    # bit 0 of the packed counters that are 0 (the bits of each counter are ORed into its bit 0)
+    return _FIELD_ONES ^ ((counts | counts >> 1 | counts >> 2 | counts >> 3) & _FIELD_ONES)
+
+
+def line_scores(bitboards, player_id):
+    '''
+    Returns the sum of the squared counts of the pieces of player_id on every line and the number of lines with 4 pieces
+    of player_id and none of the opponent
+    '''
+    counts = bitboard.line_counts(bitboards[player_id])
+    opponent_counts = bitboard.line_counts(bitboards[1 - player_id])
+    open_fours = _zero_fields(counts ^ _FIELD_FOURS) & _zero_fields(opponent_counts)
+    return line_score(counts), open_fours.bit_count()
@@ -1,10 +1,13 @@
 # Import necessary classes from other modules
-from game import Game
+import os
+from game import PlayerStats
 from players.randomPlayer import RandomPlayer
 from players.minMaxPlayer import MinMaxPlayer
 from players.geneticPlayer import GeneticPlayer
-from players.reinforcedPlayer import ReinforcedPlayer
+from players.reinforcedPlayer import POLICY_PATH, ReinforcedPlayer
 from players.optimalPlayer import OptimalPlayer
+from tournament.parallel import player_spec, run_matches, schedule
+from tournament.round_robin import run_round_robin, print_round_robin
 
 """
 This code comprises a function run_final_tournament() that orchestrates a tournament 
@@ -20,53 +23,77 @@ Overall, run_final_tournament() serves as an extensive framework for evaluating
 and comparing different player types or AI strategies in a simulated competitive environment.
 """
 
-# Function definition for running the final tournament among different player types
-def run_final_tournament():
-    # Initialize the list of player instances
-    players = [
-        RandomPlayer(),
-        MinMaxPlayer(),
-        GeneticPlayer(None, True, 50, 10, 0.15, 'roulette_wheel', 'two_points', 'random_reset'),
-        ReinforcedPlayer(),
-        OptimalPlayer()
+# List of the player specifications of the final tournament: each worker builds (and trains) every player only once
+# ReinforcedPlayer uses the Q-tables trained offline by train_reinforced.py when they exist, otherwise it trains itself
+# GeneticPlayer is trained with a fixed seed, so its genotype is saved in the cache and reused by the next runs
+def final_players(seed=0):
+    policy_saved = all(os.path.exists(POLICY_PATH.format(player_id=player_id)) for player_id in (0, 1))
+    return [
+        player_spec("RandomPlayer", RandomPlayer),
+        player_spec("MinMaxPlayer", MinMaxPlayer),
+        player_spec("GeneticPlayer", GeneticPlayer, None, True, 50, 10, 0.15, 'roulette_wheel', 'two_points', 'random_reset', seed=seed),
+        player_spec("ReinforcedPlayer", ReinforcedPlayer, q_table_path=POLICY_PATH if policy_saved else None),
+        player_spec("OptimalPlayer", OptimalPlayer)
     ]
 
+# Prints the measures of the moves of a player: time per move, the counters of its work per move and the hit rates of its caches
+def print_player_stats(stats: PlayerStats):
+    summary = stats.summary()
+    print(f"Moves: {summary['moves']}, Time per Move: {summary['time_per_move'] * 1000:.3f} ms "
+          f"(max {summary['max_time_per_move'] * 1000:.3f} ms)")
+    for name in sorted(stats.totals):
+        print(f"{name}: {summary[name]} ({summary[name + '_per_move']:.1f} per move)")
+    for name in sorted(summary):
+        if name.endswith("_hit_rate"):
+            print(f"{name}: {summary[name] * 100:.1f}%")
+
+# Function definition for running the final tournament among different player types
+# The games are played in parallel by a pool of workers (see tournament/parallel.py); with workers=1 they are played here
+def run_final_tournament(workers=None, seed=0):
+    # Initialize the list of player specifications
+    players = final_players(seed)
+    # The opponent of every player
+    random_player = player_spec("RandomOpponent", RandomPlayer)
+
     # Initialize a dictionary to keep track of tournament statistics for each player
-    tournament_stats = {player: {"total_wins": 0, "total_games": 0, "wins_as_player1": 0, "wins_as_player2": 0} for player in players}
+    tournament_stats = {player.name: {"total_wins": 0, "total_games": 0, "wins_as_player1": 0, "wins_as_player2": 0} for player in players}
+    # and the measures of its moves (time, nodes, cache hits...) summed over all its games
+    player_stats = {player.name: PlayerStats() for player in players}
 
     # Define the number of games to be played in each matchup
     num_games_per_matchup = 10
 
-    # Loop through each player as player1
+    # Schedule, for each player, the specified number of games with the player moving first against the random player
+    # and the same number of games with the random player starting as first player
+    matches = []
     for player in players:
-            # Create a RandomPlayer instance
-            random_player = RandomPlayer()
-            # Play the specified number of games with player and random player
-            for _ in range(num_games_per_matchup):
-                game1 = Game()
-                winner1 = game1.play(player, random_player)
-                tournament_stats[player]["total_games"] += 1
-                tournament_stats[player]["wins_as_player1"] += 1 if winner1 == 0 else 0
-                if winner1 == 0:
-                    tournament_stats[player]["total_wins"] += 1
+        matches += schedule(player, random_player, num_games_per_matchup, len(matches))
+        matches += schedule(random_player, player, num_games_per_matchup, len(matches))
 
-                # Play the specified number of games with random player starting as first player
-                game2 = Game()
-                winner2 = game2.play(random_player, player)
-                tournament_stats[player]["total_games"] += 1
-                tournament_stats[player]["wins_as_player2"] += 1 if winner2 == 1 else 0
-                if winner2 == 1:
-                    tournament_stats[player]["total_wins"] += 1
+    # Collect the results as the games finish
+    for result in run_matches(matches, workers, seed, instrument=True):
+        if result.first != random_player.name:
+            player, won_as_player1, won_as_player2 = result.first, result.winner == 0, False
+            player_stats[player].merge(result.stats[0])
+        else:
+            player, won_as_player1, won_as_player2 = result.second, False, result.winner == 1
+            player_stats[player].merge(result.stats[1])
+        tournament_stats[player]["total_games"] += 1
+        tournament_stats[player]["wins_as_player1"] += 1 if won_as_player1 else 0
+        tournament_stats[player]["wins_as_player2"] += 1 if won_as_player2 else 0
+        if won_as_player1 or won_as_player2:
+            tournament_stats[player]["total_wins"] += 1
 
     # Print the statistics of the tournament
     print("\nTournament Statistics:")
-    for player in players:
+    for player in tournament_stats:
         print(f"\nPlayer: {player}")
         print(f"Total Wins: {tournament_stats[player]['total_wins']}")
         print(f"Total Games: {tournament_stats[player]['total_games']}")
         print(f"Wins as Player1: {tournament_stats[player]['wins_as_player1']}")
         print(f"Wins as Player2: {tournament_stats[player]['wins_as_player2']}")
         print(f"Win Percentage: {tournament_stats[player]['total_wins'] / tournament_stats[player]['total_games'] * 100}%")
+        print_player_stats(player_stats[player])
 
     # Determine the player(s) with the highest number of total wins
     best_player = max(tournament_stats, key=lambda player: tournament_stats[player]["total_wins"])
@@ -88,3 +115,11 @@ def run_final_tournament():
             i += 1
         
         print("\nPlayers with highest total number of victories: ", best_players)
+
+
+# Round robin among all the players of the final tournament, with Elo ratings (see tournament/round_robin.py)
+# Every pairing plays up to max_games games and stops as soon as the SPRT tells which player is stronger
+def run_final_round_robin(workers=None, seed=0, max_games=50):
+    results = run_round_robin(final_players(seed), max_games=max_games, workers=workers, seed=seed)
+    print_round_robin(results)
+    return results
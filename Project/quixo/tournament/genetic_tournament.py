@@ -12,6 +12,8 @@ from itertools import product
 # population_size = from 10 to 100 (closer to 50)
 # number_of_generations = from 2 to 20 (closer to 10)
 # mutation_rate from 0.1 to 0.5 (closer to 0.15)
+# Each combination is trained once, with the given seed, and the same player plays all its games: the trained genotype
+# is also saved in the cache of GeneticPlayer, so running the tournament again doesn't retrain the players.
 
 
 # Function to generate combinations of selection, crossover, and mutation strategies
@@ -24,7 +26,7 @@ def strategies_combinations():
 
     return combinations
 
-def run_genetic_tournament():
+def run_genetic_tournament(seed=0):
     # Get all possible strategy combinations for GeneticPlayer
     genetic_strategies = strategies_combinations()
 
@@ -47,13 +49,16 @@ def run_genetic_tournament():
         tournament_stats[strategy_combination] = {"total_wins": 0, "total_games": 0}
         # tournament_stats[strategy_combination][parameter_combination] = {"total_wins": 0, "total_games": 0}
 
+        # Train the GeneticPlayer of this strategy combination (or load it from the cache)
+        genetic_player = GeneticPlayer(None, True, 50, 10, 0.15, *strategy_combination, seed=seed)
+
         # Play num_games_per_matchup games against the RandomPlayer
         for _ in range(num_games_per_matchup):
             # Create a new game
             game = Game()
 
             # Play the game with GeneticPlayer as Player1 and RandomPlayer as Player2
-            winner = game.play(GeneticPlayer(None, True, 50, 10, 0.15, *strategy_combination), random_player)
+            winner = game.play(genetic_player, random_player)
             # winner = game.play(GeneticPlayer(None, True, *parameter_combination, *strategy_combination), random_player)
 
             # Update tournament statistics
@@ -69,7 +74,7 @@ def run_genetic_tournament():
             game = Game()
 
             # Play the game with RandomPlayer as Player1 and GeneticPlayer as Player2
-            winner = game.play(random_player, GeneticPlayer(None, True, 50, 10, 0.15, *strategy_combination))
+            winner = game.play(random_player, genetic_player)
             # winner = game.play(GeneticPlayer(None, True, *parameter_combination, *strategy_combination), random_player)
 
             # Update tournament statistics
@@ -0,0 +1,135 @@
+import contextlib
+import copy
+import io
+import os
+import random
+import zlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from game import Game
+from observers import GameTooLong, PlyLimitObserver
+
+"""
+Parallel match runner used by main.py and by the tournaments.
+Matches are spread over a pool of worker processes and their results are streamed back as soon as each game finishes.
+Players are not sent to the workers: every match carries the specifications of its two players (a name, a factory and
+its arguments) and each worker builds a player the first time it needs it, so players that train on construction
+(GeneticPlayer) are trained once per worker. Players that train for the seat of their first game (ReinforcedPlayer) have a
+prepare(player_id) method, which is called once per seat when the player is built instead of during whichever match the
+worker happens to play first.
+Everything random is reproducible: before building a player the RNGs are seeded from the tournament seed and the name of
+the player, before preparing it for a seat from the seed, the name and the seat, and before each game from the seed and
+the id of the match. Every game is played by fresh copies of the prepared players, so what a player remembers from a game
+(transposition tables, search trees, private RNGs) can't leak into the next one, and the results don't depend on how the
+matches are scheduled on the workers.
+Matches played with instrument=True also return the measures of the two players (time per move, nodes, cache hit
+rates...), which the tournaments aggregate per player.
+"""
+
+# name identifies the player inside a worker, so two specs with the same name must build the same player
+PlayerSpec = namedtuple('PlayerSpec', ['name', 'factory', 'args', 'kwargs'])
+
+# id of the match, specs of the player moving first and of the one moving second
+Match = namedtuple('Match', ['match_id', 'first', 'second'])
+
+# winner is the index of the winning seat (0 if the first player won, 1 if the second did, -1 if the game was stopped
+# by the limit of plies), stats are the PlayerStats of the two players if the match was instrumented (see Player in game.py)
+MatchResult = namedtuple('MatchResult', ['match_id', 'first', 'second', 'winner', 'stats'], defaults=(None,))
+
+
+def player_spec(name, factory, *args, **kwargs) -> PlayerSpec:
+    '''Describes how a worker has to build a player'''
+    return PlayerSpec(name, factory, args, kwargs)
+
+
+# players already built by this process, by name, and prepared for a seat, by (name, seat)
+_worker_players = {}
+_prepared_players = {}
+
+
+def _seed_everything(seed, *key):
+    # independent and reproducible stream for each (seed, key), for both the random module and NumPy
+    state = np.random.SeedSequence(seed, spawn_key=key).generate_state(2)
+    random.seed(int(state[0]))
+    np.random.seed(int(state[1]))
+
+
+def _get_player(spec: PlayerSpec, seed, seat):
+    # returns a fresh copy of the player built from spec and prepared to play in seat
+    name_key = zlib.crc32(spec.name.encode())
+    prepared = _prepared_players.get((spec.name, seat))
+    if prepared is None:
+        player = _worker_players.get(spec.name)
+        if player is None:
+            _seed_everything(seed, 0, name_key)
+            player = spec.factory(*spec.args, **spec.kwargs)
+            _worker_players[spec.name] = player
+        prepared = copy.deepcopy(player)
+        if hasattr(prepared, 'prepare'):
+            _seed_everything(seed, 2, name_key, seat)
+            prepared.prepare(seat)
+        _prepared_players[(spec.name, seat)] = prepared
+    return copy.deepcopy(prepared)
+
+
+def play_match(match: Match, seed=0, quiet=True, max_plies=None, instrument=False) -> MatchResult:
+    '''
+    Plays a single match in the current process, a game longer than max_plies plies is stopped and has no winner.
+    With instrument the result contains the measures of the two players
+    '''
+    output = contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext()
+    observers = [PlyLimitObserver(max_plies)] if max_plies is not None else []
+    with output:
+        first = _get_player(match.first, seed, 0)
+        second = _get_player(match.second, seed, 1)
+        stats = (first.enable_instrumentation(), second.enable_instrumentation()) if instrument else None
+        _seed_everything(seed, 1, match.match_id)
+        try:
+            winner = Game(observers).play(first, second)
+        except GameTooLong:
+            winner = -1
+    return MatchResult(match.match_id, match.first.name, match.second.name, int(winner), stats)
+
+
+def _play_chunk(matches, seed, quiet, max_plies, instrument):
+    return [play_match(match, seed, quiet, max_plies, instrument) for match in matches]
+
+
+def run_matches(matches, workers=None, seed=0, quiet=True, chunk_size=1, max_plies=None, instrument=False, executor=None):
+    '''
+    Plays all the matches and yields their MatchResult as soon as they finish (not in the order of the matches).
+    workers: number of processes (by default one for each CPU), with 1 the matches are played in this process.
+    quiet: hides what the games and the players print.
+    chunk_size: matches sent to a worker at once, larger chunks reduce the overhead of very short games.
+    max_plies: games longer than this are stopped without a winner (None means no limit).
+    instrument: measure the players (see play_match).
+    executor: pool of workers to play the matches on (its own number of workers replaces workers); by default a new pool
+    is created and closed with the last match. Passing the same pool to several calls keeps the players already built and
+    prepared by its workers, which would otherwise be built (and trained) again by every call.
+    '''
+    matches = list(matches)
+    if executor is not None:
+        yield from _run_on_executor(executor, matches, seed, quiet, chunk_size, max_plies, instrument)
+        return
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        for match in matches:
+            yield play_match(match, seed, quiet, max_plies, instrument)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from _run_on_executor(executor, matches, seed, quiet, chunk_size, max_plies, instrument)
+
+
+def _run_on_executor(executor, matches, seed, quiet, chunk_size, max_plies, instrument):
+    chunks = [matches[i:i + chunk_size] for i in range(0, len(matches), chunk_size)]
+    futures = [executor.submit(_play_chunk, chunk, seed, quiet, max_plies, instrument) for chunk in chunks]
+    for future in as_completed(futures):
+        for result in future.result():
+            yield result
+
+
+def schedule(first: PlayerSpec, second: PlayerSpec, num_games, start_id=0):
+    '''Creates num_games matches between first and second, with first moving first'''
+    return [Match(start_id + i, first, second) for i in range(num_games)]
@@ -0,0 +1,195 @@
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import combinations
+import numpy as np
+from tournament.parallel import Match, run_matches
+
+"""
+Round-robin tournament with Elo ratings and sequential probability ratio tests.
+Every pair of players plays a match of games with alternating colours: the games are scheduled in rounds, a few games
+for each pairing at a time, and after every round each pairing runs a sequential probability ratio test (SPRT) on its
+score. As soon as the test tells which of the two players is stronger the pairing stops, so clear matchups (e.g. any
+player against RandomPlayer) take a handful of games and the budget of max_games is spent only on the close ones.
+The test compares H0: the first player of the pairing is elo_margin points weaker, with H1: it is elo_margin points
+stronger. A pairing whose players are closer than the margin usually plays all its max_games games and stays undecided.
+At the end the Elo ratings of all the players are fitted together to all the games played (Bradley-Terry model, by
+maximum likelihood), with confidence intervals from the curvature of the likelihood. The ratings are relative to the
+average player of the tournament, which is rated 0.
+Games stopped by the limit of plies (see parallel.run_matches) count as draws, half a point for each player.
+The rounds are played with the parallel runner, and a pairing is tested only on whole rounds, so the results don't
+depend on the number of workers.
+"""
+
+# Elo difference between two players whose expected score is 10 times larger than the other's
+ELO_SCALE = 400
+# each pairing starts with one virtual draw, so that a player that wins every game has a finite rating
+PRIOR_DRAWS = 1
+
+
+def expected_score(elo_difference):
+    '''Expected score of a player that is elo_difference points stronger than its opponent'''
+    return 1 / (1 + 10 ** (-elo_difference / ELO_SCALE))
+
+
+def sprt_bounds(alpha=0.05, beta=0.05) -> 'tuple[float, float]':
+    '''Lower and upper bounds of the log-likelihood ratio, for the error rates alpha (of H1) and beta (of H0)'''
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+class Pairing(object):
+    '''Games between two players, with the score seen by the first one'''
+
+    def __init__(self, player, opponent) -> None:
+        self.player = player
+        self.opponent = opponent
+        self.games = 0
+        self.wins = 0
+        self.losses = 0
+        self.draws = 0
+        self.wins_as_player1 = 0        # wins of player when it moved first
+        self.wins_as_player2 = 0        # wins of player when it moved second
+        self.winner = None              # stronger player, once the test is decided
+
+    def add_result(self, first, winner) -> None:
+        '''Adds a game given the name of its first player and the winning seat (-1 for a draw)'''
+        self.games += 1
+        if winner < 0:
+            self.draws += 1
+        elif (winner == 0) == (first == self.player):
+            self.wins += 1
+            if first == self.player:
+                self.wins_as_player1 += 1
+            else:
+                self.wins_as_player2 += 1
+        else:
+            self.losses += 1
+
+    def score(self) -> float:
+        '''Points of player (1 for a win, 0.5 for a draw)'''
+        return self.wins + 0.5 * self.draws
+
+    def llr(self, elo_margin) -> float:
+        '''Log-likelihood ratio of H1 (player is elo_margin points stronger) over H0 (it is elo_margin points weaker)'''
+        # a draw is counted as half a win and half a loss
+        p0, p1 = expected_score(-elo_margin), expected_score(elo_margin)
+        points = self.score()
+        return points * math.log(p1 / p0) + (self.games - points) * math.log((1 - p1) / (1 - p0))
+
+    def test(self, elo_margin, bounds) -> bool:
+        '''Runs the SPRT on the games played so far: returns True and sets winner if the pairing is decided'''
+        llr = self.llr(elo_margin)
+        if llr >= bounds[1]:
+            self.winner = self.player
+        elif llr <= bounds[0]:
+            self.winner = self.opponent
+        return self.winner is not None
+
+
+def elo_ratings(names, pairings, confidence=0.95, iterations=100) -> 'dict[str, tuple[float, float]]':
+    '''
+    Fits the Elo ratings of the players to the games of the pairings and returns, for each name, its rating and the
+    half-width of its confidence interval. The ratings have mean 0.
+    '''
+    index = {name: i for i, name in enumerate(names)}
+    size = len(names)
+    games = np.zeros((size, size))
+    points = np.zeros((size, size))
+    for pairing in pairings:
+        if pairing.games == 0:
+            continue
+        i, j = index[pairing.player], index[pairing.opponent]
+        games[i, j] += pairing.games + PRIOR_DRAWS
+        games[j, i] += pairing.games + PRIOR_DRAWS
+        points[i, j] += pairing.score() + 0.5 * PRIOR_DRAWS
+        points[j, i] += pairing.games - pairing.score() + 0.5 * PRIOR_DRAWS
+
+    # Newton's method on the log-likelihood, which is concave: the ratings are only defined up to a constant, so the
+    # pseudo-inverse of the Hessian keeps the steps (and the ratings) with mean 0
+    c = math.log(10) / ELO_SCALE
+    ratings = np.zeros(size)
+    hessian = np.zeros((size, size))
+    for _ in range(iterations):
+        expected = expected_score(ratings[:, None] - ratings[None, :])
+        gradient = c * (points - games * expected).sum(axis=1)
+        weights = c * c * games * expected * (1 - expected)
+        hessian = weights - np.diag(weights.sum(axis=1))
+        step = -np.linalg.pinv(hessian) @ gradient
+        # the steps are bounded while the ratings are far from the optimum
+        ratings += np.clip(step, -ELO_SCALE, ELO_SCALE)
+        if np.abs(step).max() < 1e-6:
+            break
+
+    # the covariance of the ratings is the inverse of the Fisher information (minus the Hessian)
+    covariance = np.linalg.pinv(-hessian)
+    z = math.sqrt(2) * _erfinv(confidence)
+    return {name: (float(ratings[i]), float(z * math.sqrt(max(covariance[i, i], 0.0)))) for name, i in index.items()}
+
+
+def _erfinv(y):
+    # inverse of math.erf, by Newton's method (the confidence is at most a few digits)
+    x = 0.0
+    for _ in range(50):
+        error = math.erf(x) - y
+        if abs(error) < 1e-12:
+            break
+        x -= error / (2 / math.sqrt(math.pi) * math.exp(-x * x))
+    return x
+
+
+def run_round_robin(players, max_games=50, games_per_round=2, elo_margin=100, alpha=0.05, beta=0.05, workers=None,
+                    seed=0, max_plies=1000, progress=None) -> dict:
+    '''
+    Plays a round robin among the players (specs made by parallel.player_spec) and returns its results:
+    "pairings", the list of Pairing, and "ratings", the Elo rating and confidence interval of each player.
+    max_games: games of a pairing that is never decided, games_per_round: games added to every undecided pairing in
+    each round (an even number gives the same number of games with each colour).
+    elo_margin, alpha, beta: hypotheses and error rates of the SPRT (see the description of the module).
+    progress: called after every round with the round number and the list of pairings.
+    All the rounds are played on the same pool of workers, so each worker builds and trains every player only once.
+    '''
+    if workers is None:
+        workers = os.cpu_count() or 1
+    specs = {player.name: player for player in players}
+    pairings = [Pairing(player.name, opponent.name) for player, opponent in combinations(players, 2)]
+    bounds = sprt_bounds(alpha, beta)
+    undecided = list(pairings)
+    match_id = 0
+    rounds = 0
+    with ProcessPoolExecutor(max_workers=workers) if workers > 1 else nullcontext() as executor:
+        while undecided:
+            matches, owners = [], {}
+            for pairing in undecided:
+                for game in range(pairing.games, min(pairing.games + games_per_round, max_games)):
+                    # the colours alternate, player moves first in the even games of the pairing
+                    if game % 2 == 0:
+                        first, second = specs[pairing.player], specs[pairing.opponent]
+                    else:
+                        first, second = specs[pairing.opponent], specs[pairing.player]
+                    matches.append(Match(match_id, first, second))
+                    owners[match_id] = pairing
+                    match_id += 1
+            for result in run_matches(matches, workers, seed, max_plies=max_plies, executor=executor):
+                owners[result.match_id].add_result(result.first, result.winner)
+            rounds += 1
+            undecided = [pairing for pairing in undecided
+                         if not pairing.test(elo_margin, bounds) and pairing.games < max_games]
+            if progress is not None:
+                progress(rounds, pairings)
+    return {"pairings": pairings, "ratings": elo_ratings(list(specs), pairings)}
+
+
+def print_round_robin(results) -> None:
+    '''Prints the pairings and the ratings of a round robin'''
+    print("\nPairings:")
+    for pairing in results["pairings"]:
+        decision = f"{pairing.winner} is stronger" if pairing.winner is not None else "undecided"
+        print(f"{pairing.player} - {pairing.opponent}: {pairing.score():g}-{pairing.games - pairing.score():g} "
+              f"in {pairing.games} games, {pairing.wins_as_player1}+{pairing.wins_as_player2} wins of {pairing.player} "
+              f"moving first+second ({decision})")
+    print("\nElo ratings:")
+    ratings = results["ratings"]
+    for rank, name in enumerate(sorted(ratings, key=lambda name: ratings[name][0], reverse=True), 1):
+        rating, interval = ratings[name]
+        print(f"{rank}) {name}: {rating:+.0f} +/- {interval:.0f}")
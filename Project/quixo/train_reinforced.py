@@ -0,0 +1,58 @@
+import argparse
+import os
+import time
+from players.reinforcedPlayer import POLICY_PATH, TRAINING_MATCHES, train_q_table
+from qtable import save_q_table
+
+"""
+Offline training of the ReinforcedPlayer.
+Run from Project/quixo with:    python train_reinforced.py [--matches N] [--workers W] [--alpha-decay D --tolerance T] [--player 0|1]
+A Q-table is trained for each seat (the player moving first and the one moving second) and saved in the binary format
+of qtable.py, by default where ReinforcedPlayer(q_table_path=POLICY_PATH) looks for it. The training is checkpointed
+after every round, so running the same command again after an interruption resumes it; the checkpoint is removed once
+the Q-table is saved.
+"""
+
+
+def train(player_id, output, matches=TRAINING_MATCHES, workers=1, sync_interval=100, tolerance=None, patience=3, seed=0,
+          compact=False, alpha_decay=None):
+    '''Trains the Q-table of player_id and saves it in output, returns the training statistics'''
+    checkpoint_path = output + '.checkpoint.npy'
+    start = time.perf_counter()
+
+    def progress(entry):
+        print(f"player {player_id}: {entry['games']} games, alpha {entry['alpha']:.4f}, mean Q-value change {entry['mean_change']:.5f}, "
+              f"win rate {entry['win_rate']:.3f}, {time.perf_counter() - start:.1f}s")
+
+    q_table, stats = train_q_table(player_id, matches, workers, sync_interval, compact, seed, tolerance=tolerance,
+                                   patience=patience, checkpoint_path=checkpoint_path, progress=progress,
+                                   alpha_decay=alpha_decay)
+    save_q_table(q_table, output)
+    for path in (checkpoint_path, checkpoint_path + '.json'):
+        if os.path.exists(path):
+            os.remove(path)
+    print(f"player {player_id}: {stats['states']} states saved in {output}" + (" (converged)" if stats['converged'] else ""))
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline training of the ReinforcedPlayer Q-tables")
+    parser.add_argument("--player", type=int, choices=(0, 1), nargs="+", default=[0, 1], help="seats to train (both by default)")
+    parser.add_argument("--matches", type=int, default=TRAINING_MATCHES, help="maximum number of training games")
+    parser.add_argument("--workers", type=int, default=1, help="processes that play the training games")
+    parser.add_argument("--sync-interval", type=int, default=100, help="games per worker between two merges of the Q-tables")
+    parser.add_argument("--alpha-decay", type=float, help="games after which the learning rate is halved (constant if not given)")
+    parser.add_argument("--tolerance", type=float, help="stop when the mean Q-value change of a round stays below this "
+                                                         "(it only gets small with --alpha-decay)")
+    parser.add_argument("--patience", type=int, default=3, help="rounds below the tolerance needed to stop")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--compact", action="store_true", help="train on the compact QTable instead of a dict")
+    parser.add_argument("--output", default=POLICY_PATH, help="file of the Q-tables, {player_id} is replaced by the seat")
+    args = parser.parse_args(argv)
+    for player_id in args.player:
+        train(player_id, args.output.format(player_id=player_id), args.matches, args.workers, args.sync_interval,
+              args.tolerance, args.patience, args.seed, args.compact, args.alpha_decay)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+import random
+import struct
+import weakref
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+import bitboard
+
+# Transposition table for the search players.
+# A position is hashed with Zobrist keys: every (player, cell) pair has a random 64 bit key and the hash of a board is the
+# XOR of the keys of its pieces, so after a move it can be updated by XORing only the keys of the cells that changed.
+# Quixo positions have 8-fold symmetry, so instead of a single hash we keep the hashes of the 8 symmetric versions of the
+# board packed in one Python int (64 bits each): the table is keyed by the smallest of them, which is the same for all the
+# symmetric positions. The symmetry that produced the key tells how to bring the stored best move back to the actual board.
+# A table can be allocated in shared memory and used at the same time by the processes of a parallel search. There are no
+# locks: an entry is written field by field, so a reader could see the fields of two different writes. In a shared table
+# the stored key is XORed with the other fields of the entry, and an entry whose fields don't give back the key
+# is treated as missing (lockless hashing).
+
+# Bound types of the stored values
+EXACT, LOWER, UPPER = 0, 1, 2
+
+# Replacement policies: 'depth' keeps the deeper entry unless the stored one comes from an older search,
+# 'always' overwrites the slot with the most recent result
+REPLACEMENT_POLICIES = ('depth', 'always')
+
+# bytes of an entry: key (8), value (8), depth, bound type, move and age (1 each)
+ENTRY_BYTES = 20
+
+_HASH_BITS = 64
+_HASH_MASK = (1 << _HASH_BITS) - 1
+_NUM_SYMMETRIES = len(bitboard.SYMMETRIES)
+_CELLS = bitboard.BOARD_SIZE * bitboard.BOARD_SIZE
+_ROW_BITS = bitboard.BOARD_SIZE
+_ROW_MASK = (1 << _ROW_BITS) - 1
+
+# fixed seed, so that the keys are the same in every process and tables can be shared or saved
+_rng = random.Random(0x51C5)
+ZOBRIST = tuple(tuple(_rng.getrandbits(_HASH_BITS) for _ in range(_CELLS)) for _ in range(2))
+SIDE_KEY = _rng.getrandbits(_HASH_BITS)
+
+
+def _pack(values):
+    packed = 0
+    for symmetry, value in enumerate(values):
+        packed |= value << (_HASH_BITS * symmetry)
+    return packed
+
+
+# the player to move is symmetric, so its key is the same in all the 8 hashes
+_PACKED_SIDE_KEY = _pack([SIDE_KEY] * _NUM_SYMMETRIES)
+
+
+def _build_row_deltas():
+    # for every row and every pair of 5 bit patterns (cells of player 0, cells of player 1) in that row, the packed XOR
+    # of the keys of those cells in the 8 symmetric boards: a hash is updated with one lookup for each changed row
+    deltas = []
+    for row in range(bitboard.BOARD_SIZE):
+        row_deltas = []
+        for pattern in range(1 << (2 * _ROW_BITS)):
+            patterns = (pattern >> _ROW_BITS, pattern & _ROW_MASK)
+            values = []
+            for permutation in bitboard.CELL_PERMUTATIONS:
+                value = 0
+                for player in (0, 1):
+                    for column in range(_ROW_BITS):
+                        if patterns[player] >> column & 1:
+                            value ^= ZOBRIST[player][permutation[row * _ROW_BITS + column]]
+                values.append(value)
+            row_deltas.append(_pack(values))
+        deltas.append(tuple(row_deltas))
+    return tuple(deltas)
+
+
+_ROW_DELTAS = _build_row_deltas()
+_ROW_SHIFTS = tuple(range(0, _CELLS, _ROW_BITS))
+
+
+def _board_delta(board0, board1):
+    delta = 0
+    for row, shift in enumerate(_ROW_SHIFTS):
+        pattern = (((board0 >> shift) & _ROW_MASK) << _ROW_BITS) | ((board1 >> shift) & _ROW_MASK)
+        if pattern:
+            delta ^= _ROW_DELTAS[row][pattern]
+    return delta
+
+
+def hash_position(bitboards, player_id):
+    '''Returns the 8 packed Zobrist hashes of the position with player_id to move'''
+    hashes = _board_delta(*bitboards)
+    return hashes ^ _PACKED_SIDE_KEY if player_id == 1 else hashes
+
+
+def update_hash(hashes, old_bitboards, new_bitboards):
+    '''Incrementally updates the packed hashes after a move (the player to move changes too)'''
+    return hashes ^ _board_delta(old_bitboards[0] ^ new_bitboards[0], old_bitboards[1] ^ new_bitboards[1]) ^ _PACKED_SIDE_KEY
+
+
+def canonical_key(hashes):
+    '''Returns the key of the canonical position (the smallest of the 8 hashes) and the symmetry that produced it'''
+    values = [(hashes >> (_HASH_BITS * symmetry)) & _HASH_MASK for symmetry in range(_NUM_SYMMETRIES)]
+    key = min(values)
+    return key, values.index(key)
+
+
+def _release_shared_memory(memory, unlink):
+    try:
+        memory.close()
+    except BufferError:
+        # some arrays still use the memory (e.g. at exit): it is released with the process
+        pass
+    if unlink:
+        memory.unlink()
+
+
+def _check_bits(value, depth, flag, move_index):
+    # the fields of an entry (except the age) packed in 64 bits, XORed with the key in a shared table
+    value_bits = struct.unpack('<Q', struct.pack('<d', value))[0]
+    return value_bits ^ (depth & 0xFF) ^ (flag & 0xFF) << 8 ^ (move_index & 0xFF) << 16
+
+
+# arrays of the entries of a table
+_ARRAYS = ('_keys', '_values', '_depths', '_flags', '_moves', '_ages')
+
+
+class TranspositionTable(object):
+    def __init__(self, memory_mb=16, replacement='depth', shared=False, name=None):
+        '''
+        shared: allocate the table in shared memory, other processes can use it by its name (see the name attribute)
+        name: use the shared table with this name, created by another process with the same memory_mb
+        '''
+        if replacement not in REPLACEMENT_POLICIES:
+            raise ValueError(f"Unknown replacement policy: {replacement}")
+        self.replacement = replacement
+        self.size = max(1, int(memory_mb * 2 ** 20) // ENTRY_BYTES)
+        self.shared = shared or name is not None
+        self.name = None
+        self._finalizer = None
+        if self.shared:
+            self._allocate_shared(name)
+        else:
+            self._keys = np.zeros(self.size, dtype=np.uint64)
+            self._values = np.zeros(self.size, dtype=np.float64)
+            self._depths = np.full(self.size, -1, dtype=np.int8)      # -1 marks an empty slot
+            self._flags = np.zeros(self.size, dtype=np.int8)
+            self._moves = np.full(self.size, -1, dtype=np.int8)       # index of the best move in the canonical position
+            self._ages = np.zeros(self.size, dtype=np.uint8)
+        self.age = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def _allocate_shared(self, name):
+        # the arrays of the table are views of a single block of shared memory, created if name is None
+        memory = SharedMemory(name=name, create=name is None, size=self.size * ENTRY_BYTES)
+        self.name = memory.name
+        # the process that created the memory frees it when the table is garbage collected or at exit
+        self._finalizer = weakref.finalize(self, _release_shared_memory, memory, name is None)
+        buffer = memory.buf
+        self._keys = np.ndarray(self.size, dtype=np.uint64, buffer=buffer)
+        self._values = np.ndarray(self.size, dtype=np.float64, buffer=buffer, offset=8 * self.size)
+        self._depths = np.ndarray(self.size, dtype=np.int8, buffer=buffer, offset=16 * self.size)
+        self._flags = np.ndarray(self.size, dtype=np.int8, buffer=buffer, offset=17 * self.size)
+        self._moves = np.ndarray(self.size, dtype=np.int8, buffer=buffer, offset=18 * self.size)
+        self._ages = np.ndarray(self.size, dtype=np.uint8, buffer=buffer, offset=19 * self.size)
+        if name is None:
+            self.clear()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self.shared:
+            # a copy of a shared table gets its own block of shared memory, with the same entries
+            for attribute in _ARRAYS:
+                state[attribute] = np.array(state[attribute])
+            state['name'] = None
+            state['_finalizer'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.shared:
+            self._allocate_shared(None)
+            for attribute in _ARRAYS:
+                getattr(self, attribute)[:] = state[attribute]
+
+    def new_search(self):
+        '''Marks the start of a new search, so that the entries of the previous ones can be replaced'''
+        self.age = (self.age + 1) % 256
+
+    def clear(self):
+        self._depths.fill(-1)
+        self._moves.fill(-1)
+
+    def _stored_key(self, slot):
+        # key of the entry in the slot (in a shared table, a torn entry gives a key that matches no position)
+        if not self.shared:
+            return self._keys.item(slot)
+        return self._keys.item(slot) ^ _check_bits(self._values.item(slot), self._depths.item(slot), self._flags.item(slot),
+                                                   self._moves.item(slot))
+
+    def probe(self, key):
+        '''Returns (depth, bound type, value, move index) of the stored position, or None if it isn't in the table'''
+        slot = key % self.size
+        depth = self._depths.item(slot)
+        if depth >= 0:
+            if not self.shared:
+                if self._keys.item(slot) == key:
+                    self.hits += 1
+                    return depth, self._flags.item(slot), self._values.item(slot), self._moves.item(slot)
+            else:
+                # every field is read once, and they are returned only if they all come from the same write
+                flag, value, move_index = self._flags.item(slot), self._values.item(slot), self._moves.item(slot)
+                if self._keys.item(slot) ^ _check_bits(value, depth, flag, move_index) == key:
+                    self.hits += 1
+                    return depth, flag, value, move_index
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, flag, value, move_index=-1):
+        '''Stores the result of a search of the given depth according to the replacement policy'''
+        slot = key % self.size
+        stored_depth = self._depths.item(slot)
+        if stored_depth >= 0:
+            stored_key = self._stored_key(slot)
+            if self.replacement == 'depth' and stored_key != key and self._ages.item(slot) == self.age \
+                    and stored_depth > depth:
+                # a deeper result of the current search is more valuable than this one
+                return
+            if stored_key != key:
+                self.overwrites += 1
+            elif move_index < 0:
+                # keep the best move found by a previous search of the same position
+                move_index = self._moves.item(slot)
+        self._keys[slot] = key ^ _check_bits(value, depth, flag, move_index) if self.shared else key
+        self._values[slot] = value
+        self._depths[slot] = depth
+        self._flags[slot] = flag
+        self._moves[slot] = move_index
+        self._ages[slot] = self.age
+        self.stores += 1
+
+    def stats(self) -> dict:
+        '''Returns the hit/miss statistics of the table'''
+        probes = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / probes if probes else 0.0,
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+            "filled": int(np.count_nonzero(self._depths >= 0)),
+            "size": self.size,
+        }